@@ -0,0 +1,277 @@
+"""
+Benchmarks of the data and model hot paths on synthetic snap data.
+
+    python -m src.benchmarks.harness --plays 200000 --output bench.json
+    python -m src.benchmarks.harness --plays 200000 --output bench_new.json --compare bench.json
+
+Every stage is timed `--repeats` times (the minimum is reported) while a sampler thread records the
+peak resident memory of the process. Results are written as JSON together with the git commit and
+machine details, and `--compare` prints the speedup of every stage against an earlier results file.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from src.benchmarks.synthetic import generate_reduced_data
+from src.data_pipeline.feature_store import load_features, write_feature_store
+from src.data_pipeline.geometry import canonicalize_rows
+from src.data_pipeline.play_container import PlayContainer
+from src.data_pipeline.play_features import build_play_tensor, play_feature_frame
+
+STAGES = ['generate', 'csv_write', 'csv_load', 'feature_store_write', 'feature_store_load', 'container_write',
+          'container_load', 'canonicalize', 'play_tensor', 'play_features', 'render_batch', 'render_per_figure',
+          'predict_single', 'predict_batch']
+
+
+class PeakMemory:
+    """Samples the resident set size of this process every `interval` seconds while active."""
+
+    def __init__(self, interval=0.005):
+        import psutil
+
+        self.process = psutil.Process()
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def rss(self):
+        return self.process.memory_info().rss
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.start = self.peak = self.rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.rss())
+
+
+def time_stage(name, fn, items, repeats=3):
+    """Runs `fn` `repeats` times, returns its timing and memory record and the result of the last run."""
+    times = []
+    peak = 0
+    start_rss = None
+    result = None
+    for _ in range(repeats):
+        with PeakMemory() as memory:
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+        peak = max(peak, memory.peak)
+        start_rss = memory.start if start_rss is None else start_rss
+
+    best = min(times)
+    record = {
+        'stage': name,
+        'seconds': best,
+        'mean_seconds': float(np.mean(times)),
+        'repeats': repeats,
+        'items': items,
+        'items_per_second': items / best if best > 0 else None,
+        'peak_rss_mb': peak / 2 ** 20,
+        'rss_increase_mb': (peak - start_rss) / 2 ** 20,
+    }
+    print(f"{name:>20}: {best * 1000:10.1f} ms  {record['items_per_second'] or 0:14,.0f} items/s  "
+          f"peak {record['peak_rss_mb']:8.1f} MB")
+    return record, result
+
+
+def _latency_record(name, latencies, items):
+    latencies = np.array(latencies)
+    record = {
+        'stage': name,
+        'seconds': float(np.percentile(latencies, 50)),
+        'p99_seconds': float(np.percentile(latencies, 99)),
+        'repeats': len(latencies),
+        'items': items,
+        'items_per_second': items / float(np.percentile(latencies, 50)),
+    }
+    print(f"{name:>20}: {record['seconds'] * 1000:10.3f} ms p50, {record['p99_seconds'] * 1000:.3f} ms p99")
+    return record
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _default_model(features: pd.DataFrame):
+    # kNN needs no training run and no external model files, so the benchmark is self-contained
+    from src.models.neighbors.formation_index import FormationIndex, KNNFormationModel
+    return KNNFormationModel(FormationIndex(features), k=15)
+
+
+def run_benchmarks(n_plays=100_000, stages=STAGES, repeats=3, seed=0, model_path=None, render_plays=100,
+                   single_queries=200, batch_plays=10_000, work_dir=None) -> dict:
+    """Runs the selected stages on `n_plays` synthetic plays and returns the results document."""
+    import matplotlib
+    matplotlib.use("Agg")
+
+    work_dir = work_dir or tempfile.mkdtemp(prefix="formation_bench_")
+    csv_path = os.path.join(work_dir, "reduced_data.csv")
+    store_path = os.path.join(work_dir, "reduced_data")
+    n_rows = n_plays * 11
+    results = []
+
+    def run(name, fn, items, stage_repeats=repeats):
+        if name not in stages:
+            return None
+        record, result = time_stage(name, fn, items, stage_repeats)
+        results.append(record)
+        return result
+
+    df = run('generate', lambda: generate_reduced_data(n_plays, seed=seed), n_plays, 1)
+    if df is None:
+        df = generate_reduced_data(n_plays, seed=seed)
+
+    run('csv_write', lambda: df.to_csv(csv_path, index=False), n_rows, 1)
+    if 'csv_load' in stages:
+        if not os.path.exists(csv_path):
+            df.to_csv(csv_path, index=False)
+        run('csv_load', lambda: pd.read_csv(csv_path), n_rows)
+
+    run('feature_store_write', lambda: write_feature_store(df, store_path), n_rows, 1)
+    if 'feature_store_load' in stages:
+        if not os.path.exists(store_path):
+            write_feature_store(df, store_path)
+        run('feature_store_load', lambda: load_features(store_path), n_rows)
+
+    container_path = os.path.join(work_dir, "plays_compact")
+    run('container_write', lambda: PlayContainer.from_frame(df).save(container_path), n_rows, 1)
+    if 'container_load' in stages:
+        if not os.path.exists(container_path):
+            PlayContainer.from_frame(df).save(container_path)
+        # Mapping alone is lazy, so the stage also reads every coordinate once
+        run('container_load', lambda: float(PlayContainer.load(container_path).arrays['x'].sum()), n_rows)
+
+    run('canonicalize', lambda: canonicalize_rows(df), n_rows)
+    run('play_tensor', lambda: build_play_tensor(df, canonical=True), n_plays)
+    # The shared replacement of the aggregate_play pivot and the AutoGluon iterrows reshape
+    features = run('play_features', lambda: play_feature_frame(df), n_plays)
+
+    if 'render_batch' in stages or 'render_per_figure' in stages:
+        import matplotlib.pyplot as plt
+        from src.formation_gui.batch_render import FormationRenderer
+        from src.formation_gui.field import Field
+
+        sample = df[df['uniquePlayId'].isin(df['uniquePlayId'].unique()[:render_plays])]
+        tensor = build_play_tensor(sample, features=('x', 'y'), canonical=True)
+        plays = [play for _, play in sample.groupby('uniquePlayId', sort=False)]
+
+        def render_batch():
+            renderer = FormationRenderer()
+            for xy, play_id in zip(tensor.values, tensor.play_ids):
+                renderer.save(xy, play_id, os.path.join(work_dir, "batch.png"))
+            renderer.close()
+
+        def render_per_figure():
+            field = Field()
+            for play in plays:
+                fig = field.zoomed_formation(play)
+                fig.savefig(os.path.join(work_dir, "single.png"))
+                plt.close(fig)
+
+        run('render_batch', render_batch, len(tensor), 1)
+        run('render_per_figure', render_per_figure, len(plays), 1)
+
+    if 'predict_single' in stages or 'predict_batch' in stages:
+        if features is None:
+            features = play_feature_frame(df)
+        # The last plays are the queries, the kNN default model indexes the plays before them
+        n_queries = min(batch_plays, max(len(features) // 5, 1))
+        inputs = features.iloc[-n_queries:].drop(columns=['uniquePlayId', 'playDirection', 'offenseFormation'])
+        if model_path:
+            from src.serving.models import load_formation_model
+            model = load_formation_model(model_path)
+        else:
+            model = _default_model(features.iloc[:-n_queries])
+
+        if 'predict_single' in stages:
+            latencies = []
+            for i in range(min(single_queries, len(inputs))):
+                play = inputs.iloc[i:i + 1]
+                start = time.perf_counter()
+                model.predict_proba(play)
+                latencies.append(time.perf_counter() - start)
+            results.append(_latency_record('predict_single', latencies, 1))
+        run('predict_batch', lambda: model.predict_proba(inputs), len(inputs))
+
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'plays': n_plays,
+            'seed': seed,
+            'repeats': repeats,
+            'model': model_path or 'knn',
+        },
+        'results': results,
+    }
+
+
+def compare_results(baseline: dict, current: dict) -> pd.DataFrame:
+    """Per stage seconds of both runs and the speedup of `current` (> 1 is faster)."""
+    old = pd.DataFrame(baseline['results']).set_index('stage')
+    new = pd.DataFrame(current['results']).set_index('stage')
+    table = pd.DataFrame({'baseline_seconds': old['seconds'], 'seconds': new['seconds']}).dropna()
+    table['speedup'] = table['baseline_seconds'] / table['seconds']
+    if 'peak_rss_mb' in old and 'peak_rss_mb' in new:
+        table['baseline_peak_rss_mb'] = old['peak_rss_mb']
+        table['peak_rss_mb'] = new['peak_rss_mb']
+    return table.reindex([stage for stage in STAGES if stage in table.index])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the data and model hot paths on synthetic plays")
+    parser.add_argument("--plays", type=int, default=100_000)
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--model", default=None, help="Portable .npz export or saved H2O model, default a kNN model")
+    parser.add_argument("--render-plays", type=int, default=100)
+    parser.add_argument("--single-queries", type=int, default=200)
+    parser.add_argument("--batch-plays", type=int, default=10_000, help="Plays per batch prediction")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", default=None, help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="formation_bench_") as work_dir:
+        document = run_benchmarks(args.plays, args.stages, args.repeats, args.seed, args.model,
+                                  args.render_plays, args.single_queries, args.batch_plays, work_dir)
+
+    with open(args.output, "w") as f:
+        json.dump(document, f, indent=2)
+    print(f"Results saved to: {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(compare_results(baseline, document).to_string(float_format=lambda v: f"{v:.3f}"))
+
+
+if __name__ == "__main__":
+    main()
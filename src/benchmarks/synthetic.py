@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.feature_store import FEATURE_COLUMNS
+
+# Personnel of each synthetic formation, 11 offensive players in the order of the template rows below
+FORMATION_PERSONNEL = {
+    'SHOTGUN': ['C', 'G', 'G', 'T', 'T', 'TE', 'WR', 'WR', 'WR', 'QB', 'RB'],
+    'SINGLEBACK': ['C', 'G', 'G', 'T', 'T', 'TE', 'TE', 'WR', 'WR', 'QB', 'RB'],
+    'EMPTY': ['C', 'G', 'G', 'T', 'T', 'TE', 'WR', 'WR', 'WR', 'WR', 'QB'],
+    'I_FORM': ['C', 'G', 'G', 'T', 'T', 'TE', 'WR', 'WR', 'FB', 'QB', 'RB'],
+    'PISTOL': ['C', 'G', 'G', 'T', 'T', 'TE', 'WR', 'WR', 'WR', 'QB', 'RB'],
+    'JUMBO': ['C', 'G', 'G', 'T', 'T', 'TE', 'TE', 'TE', 'FB', 'QB', 'RB'],
+    'WILDCAT': ['C', 'G', 'G', 'T', 'T', 'TE', 'WR', 'WR', 'WR', 'RB', 'RB'],
+}
+
+# Share of plays per formation, roughly the real distribution
+FORMATION_WEIGHTS = {'SHOTGUN': 0.55, 'SINGLEBACK': 0.2, 'EMPTY': 0.08, 'I_FORM': 0.07, 'PISTOL': 0.07,
+                     'JUMBO': 0.02, 'WILDCAT': 0.01}
+
+# Yards behind the C the QB lines up, under center otherwise
+QB_DEPTH = {'SHOTGUN': 5.0, 'EMPTY': 5.0, 'PISTOL': 4.0}
+
+PLAYS_PER_GAME = 150
+GAMES_PER_WEEK = 16
+
+
+def _templates(rng):
+    """Mean (x, y) offset from the C of every player of every formation, as if the offense moves right."""
+    templates = {}
+    for formation, personnel in FORMATION_PERSONNEL.items():
+        offsets = np.zeros((len(personnel), 2))
+        for i, position in enumerate(personnel):
+            if position in ('G', 'T'):
+                side = -1 if i % 2 else 1
+                offsets[i] = (-0.5, side * (1.3 if position == 'G' else 2.6))
+            elif position == 'TE':
+                offsets[i] = (-1.0, rng.choice([-1, 1]) * rng.uniform(3.5, 8))
+            elif position == 'WR':
+                offsets[i] = (rng.uniform(-1.5, -0.5), rng.choice([-1, 1]) * rng.uniform(8, 22))
+            elif position == 'QB':
+                offsets[i] = (-QB_DEPTH.get(formation, 1.0), 0.0)
+            elif position == 'RB':
+                offsets[i] = (-7.0, rng.uniform(-3, 3))
+            elif position == 'FB':
+                offsets[i] = (-4.0, 0.0)
+        templates[formation] = offsets
+    return templates
+
+
+def generate_reduced_data(n_plays: int, seed=0, noise=1.5) -> pd.DataFrame:
+    """
+    Synthetic snap data with the reduced_data / feature store columns: 11 offensive players per play,
+    positions C/G/T/TE/WR/RB/FB/QB, formation templates with Gaussian noise, random field position and
+    direction. Fully vectorized, so millions of plays are generated in seconds.
+    """
+    rng = np.random.default_rng(seed)
+    templates = _templates(rng)
+    formations = np.array(list(FORMATION_PERSONNEL))
+    weights = np.array([FORMATION_WEIGHTS[f] for f in formations])
+
+    play_formation = rng.choice(len(formations), size=n_plays, p=weights / weights.sum())
+    offsets = np.stack([templates[f] for f in formations])[play_formation]             # (n, 11, 2)
+    positions = np.array([FORMATION_PERSONNEL[f] for f in formations])[play_formation]  # (n, 11)
+    offsets = offsets + rng.normal(0, noise, offsets.shape)
+    offsets[:, 0] = 0.0
+
+    left = rng.random(n_plays) < 0.5
+    offsets[left] *= -1
+    center = np.column_stack([rng.uniform(20, 100, n_plays), rng.uniform(18, 35, n_plays)])
+    xy = offsets + center[:, None, :]
+    orientation = np.where(left, 270.0, 90.0)[:, None] + rng.normal(0, 20, (n_plays, 11))
+
+    play_index = np.arange(n_plays)
+    game_index = play_index // PLAYS_PER_GAME
+    game_ids = 2022090000 + game_index
+    play_ids = 56 + 25 * (play_index % PLAYS_PER_GAME)
+    unique_ids = pd.Series(game_ids).astype(str) + '-' + pd.Series(play_ids).astype(str)
+
+    def per_player(values):
+        return np.repeat(values, 11)
+
+    return pd.DataFrame({
+        'uniquePlayId': per_player(unique_ids.to_numpy()),
+        'gameId': per_player(game_ids).astype(np.int32),
+        'playId': per_player(play_ids).astype(np.int16),
+        'week': per_player(1 + (game_index // GAMES_PER_WEEK) % 18).astype(np.int8),
+        'nflId': (40000 + rng.integers(0, 2000, n_plays * 11)).astype(np.int32),
+        'playDirection': per_player(np.where(left, 'left', 'right')),
+        'x': xy[:, :, 0].ravel().astype(np.float32),
+        'y': xy[:, :, 1].ravel().astype(np.float32),
+        'o': np.mod(orientation, 360).ravel().astype(np.float32),
+        'position': positions.ravel(),
+        'offenseFormation': per_player(formations[play_formation]),
+    })[FEATURE_COLUMNS]
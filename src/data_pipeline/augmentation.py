@@ -0,0 +1,146 @@
+"""
+Augmented training batches of canonical plays, produced on the fly instead of as copies of the dataset.
+
+The plays live once in a shared (n_plays, n_slots, k) float32 slot array, the layout behind
+play_feature_frame(). Every batch gathers its plays from it and applies the augmentations to that batch only:
+
+    mirror:  reflection across the line through the C along the offense's direction (y -> -y,
+             o -> 180 - o), which swaps the strong and weak side but not the formation.
+    jitter:  Gaussian noise on x and y (yards) and on the angles (degrees).
+    permute: shuffles the players of the receiver positions between their slots.
+
+Slots are re-ordered after mirroring so the players of a position stay sorted by y, as in a PlayTensor. A
+batch is a function of (seed, epoch, batch number) only, so an iterator can be replayed, as XGBoost does
+while building a QuantileDMatrix. PlayBatches feeds PlayBatchIter (src/models/training/augmented_xgboost.py)
+and AugmentedTokens (src/models/deepsets/formation_net.py).
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.play_features import POSITION_SLOTS, POSITIONS, slot_names
+
+SEED = 3245
+
+ANGLE_FEATURES = ('o', 'dir')
+
+
+def slot_columns(features=('x', 'y', 'o'), slots=POSITION_SLOTS) -> list:
+    """play_feature_frame() columns of `features`, in the order flatten_slots() produces them."""
+    return [f"{feature}_{name}" for feature in features for name in slot_names(slots)]
+
+
+def slot_array(frame: pd.DataFrame, features=('x', 'y', 'o'), slots=POSITION_SLOTS) -> np.ndarray:
+    """The (n_plays, n_slots, k) float32 slot array of play_feature_frame() columns."""
+    n_slots = sum(slots.values())
+    wide = frame.reindex(columns=slot_columns(features, slots)).to_numpy(dtype=np.float32)
+    return np.ascontiguousarray(wide.reshape(len(frame), len(features), n_slots).transpose(0, 2, 1))
+
+
+def flatten_slots(batch: np.ndarray) -> np.ndarray:
+    """(n, n_slots, k) -> (n, k * n_slots) rows with the columns of slot_columns()."""
+    return batch.transpose(0, 2, 1).reshape(len(batch), -1)
+
+
+class Augmentation:
+    """
+    Random mirroring, jitter and receiver permutation of slot array batches. Probabilities are per play,
+    `permute_probability` per play and position.
+    """
+
+    def __init__(self, features=('x', 'y', 'o'), mirror=0.5, jitter=0.0, angle_jitter=0.0, permute=('WR',),
+                 permute_probability=0.5, slots=POSITION_SLOTS):
+        features = tuple(features)
+        if 'x' not in features or 'y' not in features:
+            raise ValueError(f"Augmentation needs the x and y features, got {features}")
+        self.features = features
+        self.mirror = mirror
+        self.jitter = jitter
+        self.angle_jitter = angle_jitter
+        self.permute_probability = permute_probability
+        self.x, self.y = features.index('x'), features.index('y')
+        self.angles = [features.index(name) for name in ANGLE_FEATURES if name in features]
+
+        sizes = np.array([slots[position] for position in POSITIONS])
+        self.block_starts = np.r_[0, np.cumsum(sizes)[:-1]]
+        self.slot_codes = np.repeat(np.arange(len(POSITIONS)), sizes)
+        self.slot_rank = np.arange(sizes.sum()) - self.block_starts[self.slot_codes]
+        self.permutable = np.isin(POSITIONS, list(permute))
+
+    def __call__(self, batch: np.ndarray, rng: np.random.Generator, mask=None) -> np.ndarray:
+        """Augments the plays of `batch` selected by `mask` (all when None) in place and returns it."""
+        n, n_slots = batch.shape[:2]
+        eligible = np.ones(n, dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+        mirrored = eligible & (rng.random(n) < self.mirror)
+        permuted = eligible[:, None] & self.permutable & (rng.random((n, len(POSITIONS))) < self.permute_probability)
+
+        if mirrored.any() or permuted.any():
+            # Filled slots are the first ones of their position, so a new order is a sort by (position, new rank)
+            filled = ~np.isnan(batch[:, :, self.x])
+            counts = np.add.reduceat(filled.astype(np.int16), self.block_starts, axis=1)[:, self.slot_codes]
+            rank = np.where(mirrored[:, None], counts - 1 - self.slot_rank, self.slot_rank)
+            key = np.where(permuted[:, self.slot_codes], rng.random((n, n_slots)) * n_slots, rank)
+            key = np.where(filled, key, n_slots)
+            order = np.argsort(self.slot_codes * (n_slots + 1) + key, axis=1, kind='stable')
+            batch[:] = np.take_along_axis(batch, order[:, :, None], axis=1)
+
+        if mirrored.any():
+            batch[mirrored, :, self.y] *= -1
+            for angle in self.angles:
+                batch[mirrored, :, angle] = np.mod(180.0 - batch[mirrored, :, angle], 360.0)
+
+        if self.jitter:
+            for coordinate in (self.x, self.y):
+                batch[eligible, :, coordinate] += rng.normal(0.0, self.jitter, (eligible.sum(), n_slots))
+        if self.angle_jitter:
+            for angle in self.angles:
+                noisy = batch[eligible, :, angle] + rng.normal(0.0, self.angle_jitter, (eligible.sum(), n_slots))
+                batch[eligible, :, angle] = np.mod(noisy, 360.0)
+        return batch
+
+
+class PlayBatches:
+    """
+    Shuffled batches over `passes` passes of a slot array, each (batch, labels). With `original` the first
+    pass is left as is and only the others are augmented. Only a batch is ever copied out of `slots`;
+    batches[i] can be read in any order, and set_epoch() draws a new shuffle and new augmentations.
+    """
+
+    def __init__(self, slots: np.ndarray, labels, batch_size=1024, augmentation=None, passes=1, original=True,
+                 shuffle=True, seed=SEED):
+        self.slots = slots
+        self.labels = None if labels is None else np.asarray(labels)
+        self.batch_size = batch_size
+        self.augmentation = augmentation
+        self.passes = passes
+        self.original = original
+        self.shuffle = shuffle
+        self.seed = seed
+        self.set_epoch(0)
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+        total = len(self.slots) * self.passes
+        if self.shuffle:
+            self._order = np.random.default_rng((self.seed, epoch)).permutation(total)
+        else:
+            self._order = np.arange(total)
+
+    def __len__(self):
+        return math.ceil(len(self._order) / self.batch_size)
+
+    def __getitem__(self, i: int):
+        if not 0 <= i < len(self):
+            raise IndexError(f"Batch {i} out of range for {len(self)} batches")
+        entries = self._order[i * self.batch_size:(i + 1) * self.batch_size]
+        plays = entries % len(self.slots)
+        batch = self.slots[plays]
+        if self.augmentation is not None:
+            augmented = entries >= len(self.slots) if self.original else None
+            self.augmentation(batch, np.random.default_rng((self.seed, self.epoch, i)), mask=augmented)
+        return batch, None if self.labels is None else self.labels[plays]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
@@ -0,0 +1,102 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.feature_store import FEATURE_COLUMNS, FEATURE_STORE_PATH, stored_weeks, write_feature_store
+from src.data_pipeline.ingestion import ingest_tracking_weeks, tracking_file_path
+from src.data_pipeline.play_container import pack_play_keys
+from src.instrumentation.spans import traced
+from src.data_pipeline.play_features import POSITIONS
+
+
+def _play_lookup(plays: pd.DataFrame):
+    """Sorted packed (gameId, playId) keys of plays.csv and the plays row of every key."""
+    keys = pack_play_keys(plays['gameId'], plays['playId'])
+    order = np.argsort(keys, kind='stable')
+    return keys[order], order
+
+
+def _player_lookup(players: pd.DataFrame) -> np.ndarray:
+    """
+    Direct address table nflId -> players.csv row of the offensive players, -1 for everyone else.
+    The position filter is applied here, before any snap row is touched.
+    """
+    offensive = np.flatnonzero(players['position'].isin(POSITIONS).to_numpy())
+    nfl_ids = players['nflId'].to_numpy(dtype=np.int64)
+    table = np.full(int(nfl_ids.max()) + 1 if len(nfl_ids) else 1, -1, dtype=np.int64)
+    # Reversed so the first row of a duplicated nflId wins
+    table[nfl_ids[offensive][::-1]] = offensive[::-1]
+    return table
+
+
+@traced("consolidate_snaps", rows=len)
+def consolidate_snaps(snap_data: pd.DataFrame, plays: pd.DataFrame, players: pd.DataFrame) -> pd.DataFrame:
+    """
+    Joins the snap frames with plays.csv and players.csv and keeps the offensive players,
+    one row per player with the feature store columns (see data_consolidation.ipynb).
+
+    Both joins are integer lookups into index arrays built once: packed (gameId, playId) keys are
+    binary searched in the sorted plays keys and nflIds index a direct address table of the offensive
+    players. The possession and position filters run on those lookups, so only the kept rows are ever
+    gathered, and duplicates are dropped on the (play, player, frame) key instead of on every column.
+    """
+    play_keys, play_rows = _play_lookup(plays)
+    player_table = _player_lookup(players)
+
+    snap_keys = pack_play_keys(snap_data['gameId'], snap_data['playId'])
+    found = np.searchsorted(play_keys, snap_keys).clip(max=max(len(play_keys) - 1, 0))
+    play_row = np.where(play_keys[found] == snap_keys, play_rows[found], -1) if len(play_keys) \
+        else np.full(len(snap_data), -1)
+
+    nfl_ids = snap_data['nflId'].to_numpy(dtype=np.int64)
+    known = (nfl_ids >= 0) & (nfl_ids < len(player_table))
+    player_row = np.where(known, player_table[nfl_ids.clip(0, len(player_table) - 1)], -1)
+
+    # Possession is compared on the category codes of the snap clubs, not on strings per row
+    clubs = pd.Categorical(snap_data['club'])
+    possession = pd.Categorical(plays['possessionTeam'], categories=clubs.categories).codes
+    keep = (play_row >= 0) & (player_row >= 0)
+    keep[keep] = (clubs.codes[keep] >= 0) & (clubs.codes[keep] == possession[play_row[keep]])
+
+    rows = np.flatnonzero(keep)
+    key_columns = ['gameId', 'playId', 'nflId'] + (['frameId'] if 'frameId' in snap_data.columns else [])
+    rows = rows[~snap_data[key_columns].iloc[rows].duplicated().to_numpy()]
+    play_row, player_row = play_row[rows], player_row[rows]
+
+    snaps = snap_data.iloc[rows].reset_index(drop=True)
+    offensive_data = pd.DataFrame({
+        'uniquePlayId': snaps['gameId'].astype(str) + '-' + snaps['playId'].astype(str),
+        'gameId': snaps['gameId'],
+        'playId': snaps['playId'],
+        'week': snaps['week'],
+        'nflId': snaps['nflId'],
+        'playDirection': snaps['playDirection'],
+        'x': snaps['x'],
+        'y': snaps['y'],
+        'o': snaps['o'],
+        'position': players['position'].to_numpy()[player_row],
+        'offenseFormation': plays['offenseFormation'].to_numpy()[play_row],
+    })
+    return offensive_data[FEATURE_COLUMNS]
+
+
+def append_new_weeks(data_dir: str, plays: pd.DataFrame, players: pd.DataFrame, path=FEATURE_STORE_PATH,
+                     weeks=None) -> list:
+    """
+    Consolidates only the tracking weeks in `data_dir` that are not in the feature store yet and
+    appends them as new week partitions; the stored weeks are not read or rewritten.
+    `weeks` forces a list of weeks to (re)consolidate. Returns the weeks that were written.
+    """
+    if weeks is None:
+        stored = set(stored_weeks(path))
+        weeks = [week for week in range(1, 19)
+                 if week not in stored and os.path.exists(tracking_file_path(data_dir, week))]
+    if not weeks:
+        print(f"No new tracking weeks in {data_dir}")
+        return []
+
+    snap_data = ingest_tracking_weeks(data_dir, weeks=weeks, events=("ball_snap",))
+    write_feature_store(consolidate_snaps(snap_data, plays, players), path)
+    print(f"Added weeks {weeks} to {path}")
+    return list(weeks)
@@ -0,0 +1,89 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.instrumentation.spans import traced
+
+# Location of the consolidated snap data, relative to the repository root.
+FEATURE_STORE_PATH = os.path.join("resources", "reduced_data")
+
+FEATURE_COLUMNS = ['uniquePlayId', 'gameId', 'playId', 'week', 'nflId', 'playDirection',
+                   'x', 'y', 'o', 'position', 'offenseFormation']
+
+# Low cardinality string columns, stored as Parquet dictionaries and loaded back as pandas categoricals
+CATEGORICAL_COLUMNS = ['position', 'offenseFormation', 'playDirection']
+
+PARTITION_COLUMNS = ['week', 'gameId']
+
+FEATURE_DTYPES = {
+    'uniquePlayId': 'string',
+    'gameId': 'int32',
+    'playId': 'int16',
+    'week': 'int8',
+    'nflId': 'int32',
+    'x': 'float32',
+    'y': 'float32',
+    'o': 'float32',
+}
+
+
+def _to_store_schema(df: pd.DataFrame) -> pd.DataFrame:
+    df = df[[col for col in FEATURE_COLUMNS if col in df.columns]]
+    df = df.astype({col: dtype for col, dtype in FEATURE_DTYPES.items() if col in df.columns})
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+
+@traced("write_feature_store")
+def write_feature_store(df: pd.DataFrame, path: str = FEATURE_STORE_PATH, partition_cols=PARTITION_COLUMNS):
+    """
+    Writes the consolidated snap data as a hive partitioned Parquet dataset (week=/gameId=/...).
+
+    Partitions present in `df` replace any existing files for the same partition, partitions that are
+    not in `df` are left alone, so a single week can be rewritten without touching the others.
+    """
+    table = pa.Table.from_pandas(_to_store_schema(df), preserve_index=False)
+    partition_cols = [col for col in partition_cols if col in table.column_names]
+
+    ds.write_dataset(
+        table,
+        path,
+        format="parquet",
+        partitioning=partition_cols,
+        partitioning_flavor="hive",
+        existing_data_behavior="delete_matching",
+    )
+    return path
+
+
+@traced("load_features", rows=len)
+def load_features(path: str = FEATURE_STORE_PATH, columns=None, filters=None) -> pd.DataFrame:
+    """
+    Loads the consolidated snap data from the Parquet feature store.
+
+    columns: only these columns are read from disk (partition columns are allowed too).
+    filters: predicates pushed down to the reader, in the same DNF format as pandas.read_parquet,
+             e.g. [("week", "in", [1, 2]), ("offenseFormation", "==", "SHOTGUN")].
+             Filters on week/gameId skip whole partitions without opening them.
+    """
+    dataset = ds.dataset(path, format="parquet", partitioning="hive")
+    expression = pq.filters_to_expression(filters) if filters else None
+
+    table = dataset.to_table(columns=columns, filter=expression)
+    df = table.to_pandas()
+
+    # Hive partition values are inferred as int32, narrow them back to the stored dtypes
+    return df.astype({col: FEATURE_DTYPES[col] for col in PARTITION_COLUMNS if col in df.columns})
+
+
+def stored_weeks(path: str = FEATURE_STORE_PATH) -> list:
+    """Weeks that have a partition in the feature store, read from the directory names only."""
+    if not os.path.isdir(path):
+        return []
+    prefix = "week="
+    return sorted(int(name[len(prefix):]) for name in os.listdir(path) if name.startswith(prefix))
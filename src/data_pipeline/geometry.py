@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+ANGLE_COLUMNS = ('o', 'dir')
+
+
+def center_offsets(play_codes: np.ndarray, is_center: np.ndarray, x: np.ndarray, y: np.ndarray, n_plays: int):
+    """
+    Per play (x, y) of the center (C), computed for all plays at once.
+    Plays without a tracked center fall back to the centroid of their players.
+    """
+    center_x = np.full(n_plays, np.nan)
+    center_y = np.full(n_plays, np.nan)
+    # Assign in reverse so the first C of a play wins when a play lists two
+    rows = np.flatnonzero(is_center)[::-1]
+    center_x[play_codes[rows]] = x[rows]
+    center_y[play_codes[rows]] = y[rows]
+
+    counts = np.bincount(play_codes, minlength=n_plays)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x = np.bincount(play_codes, weights=x, minlength=n_plays) / counts
+        mean_y = np.bincount(play_codes, weights=y, minlength=n_plays) / counts
+
+    missing = np.isnan(center_x)
+    center_x[missing] = mean_x[missing]
+    center_y[missing] = mean_y[missing]
+    return center_x, center_y
+
+
+def _mirror_inplace(df: pd.DataFrame, flip: np.ndarray):
+    for col in ('x', 'y'):
+        values = df[col].to_numpy(dtype=np.float64)
+        df[col] = np.where(flip, -values, values).astype(df[col].dtype)
+    for col in ANGLE_COLUMNS:
+        if col in df.columns:
+            values = df[col].to_numpy(dtype=np.float64)
+            df[col] = np.where(flip, np.mod(values + 180.0, 360.0), values).astype(df[col].dtype)
+
+
+def mirror_rows(df: pd.DataFrame, mask=None) -> pd.DataFrame:
+    """
+    Point-reflects the rows in `mask` (all rows when None): x and y are negated and the o/dir angles
+    turned by 180 degrees. Applied after centering, this turns a left-moving formation into a right-moving one.
+    """
+    df = df.copy()
+    _mirror_inplace(df, np.ones(len(df), dtype=bool) if mask is None else np.asarray(mask, dtype=bool))
+    return df
+
+
+def canonicalize_rows(df: pd.DataFrame, key='uniquePlayId', center=True, mirror=True) -> pd.DataFrame:
+    """
+    Canonical geometry for one row per player data, for every play in a single vectorized pass:
+
+    center: coordinates become relative to the play's center (C), which ends up at (0, 0).
+    mirror: plays with playDirection 'left' are point-reflected so every offense moves towards +x.
+
+    Returns a copy, the input frame is not modified. Rows without a playDirection column are not mirrored.
+    """
+    df = df.copy()
+    x = df['x'].to_numpy(dtype=np.float64)
+    y = df['y'].to_numpy(dtype=np.float64)
+
+    if center:
+        play_codes, play_ids = pd.factorize(df[key])
+        is_center = (df['position'] == 'C').to_numpy()
+        center_x, center_y = center_offsets(play_codes, is_center, x, y, len(play_ids))
+        df['x'] = (x - center_x[play_codes]).astype(df['x'].dtype)
+        df['y'] = (y - center_y[play_codes]).astype(df['y'].dtype)
+
+    if mirror and 'playDirection' in df.columns:
+        _mirror_inplace(df, (df['playDirection'].astype(str) == 'left').to_numpy())
+    return df
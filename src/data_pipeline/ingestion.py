@@ -0,0 +1,206 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from src.instrumentation.spans import span, traced
+
+# Columns of tracking_week_{i}.csv that the rest of the pipeline actually uses,
+# with the narrowest dtype that holds them.
+TRACKING_DTYPES = {
+    "gameId": "int32",
+    "playId": "int16",
+    "nflId": "float32",  # Football rows have no nflId, so this has to allow NaN
+    "displayName": "string",
+    "frameId": "int16",
+    "frameType": "string",
+    "club": "category",
+    "playDirection": "category",
+    "x": "float32",
+    "y": "float32",
+    "s": "float32",
+    "a": "float32",
+    "dis": "float32",
+    "o": "float32",
+    "dir": "float32",
+    "event": "string",
+}
+
+TRACKING_COLUMNS = list(TRACKING_DTYPES)
+
+DEFAULT_CHUNKSIZE = 500_000
+
+
+def tracking_file_path(data_dir: str, week: int) -> str:
+    return os.path.join(data_dir, f"tracking_week_{week}.csv")
+
+
+def _clean_snap_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Applies the same row cleaning the consolidation notebook did with tracking.dropna(),
+    which drops the football and any player missing a coordinate or orientation.
+    """
+    df = df.dropna(subset=["nflId", "x", "y", "o", "dir"])
+    df = df.astype({"nflId": "int32"})
+    return df
+
+
+def _read_with_pandas(path, filter_column, values, columns, chunksize):
+    dtypes = {col: TRACKING_DTYPES[col] for col in columns}
+    reader = pd.read_csv(
+        path,
+        usecols=columns,
+        dtype=dtypes,
+        engine="c",
+        chunksize=chunksize,
+        on_bad_lines="skip",
+    )
+
+    kept = []
+    for chunk in reader:
+        snap = chunk[chunk[filter_column].isin(values)]
+        if len(snap):
+            kept.append(snap)
+    return kept
+
+
+def _read_with_pyarrow(path, filter_column, values, columns, chunksize):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pv
+
+    # Approximate the pandas chunk size in bytes, tracking rows are ~100 bytes of text.
+    read_options = pv.ReadOptions(block_size=max(chunksize * 100, 1 << 20))
+    convert_options = pv.ConvertOptions(
+        include_columns=columns,
+        column_types={col: pa.string() for col in ("displayName", "frameType", "club", "playDirection", "event")},
+    )
+    parse_options = pv.ParseOptions(invalid_row_handler=lambda row: "skip")
+
+    value_set = pa.array(list(values), type=pa.string())
+    kept = []
+    with pv.open_csv(path, read_options=read_options, parse_options=parse_options,
+                     convert_options=convert_options) as reader:
+        for batch in reader:
+            mask = pc.is_in(batch.column(filter_column), value_set=value_set)
+            snap = batch.filter(pc.fill_null(mask, False))
+            if snap.num_rows:
+                kept.append(snap.to_pandas().astype({col: TRACKING_DTYPES[col] for col in columns}))
+    return kept
+
+
+def _stream_rows(path, filter_column, values, columns, chunksize, engine):
+    columns = list(columns or TRACKING_COLUMNS)
+    for required in (filter_column, "event", "nflId", "x", "y", "o", "dir"):
+        if required not in columns:
+            columns.append(required)
+
+    if engine == "pyarrow":
+        kept = _read_with_pyarrow(path, filter_column, values, columns, chunksize)
+    elif engine == "c":
+        kept = _read_with_pandas(path, filter_column, values, columns, chunksize)
+    else:
+        raise ValueError(f"Unknown engine '{engine}', expected 'c' or 'pyarrow'")
+
+    if not kept:
+        empty = pd.DataFrame({col: pd.Series(dtype=TRACKING_DTYPES[col]) for col in columns})
+        return _clean_snap_rows(empty)
+
+    rows = pd.concat(kept, ignore_index=True)
+    return _clean_snap_rows(rows)
+
+
+def read_snap_frames(path: str, events=("ball_snap",), columns=None, chunksize=DEFAULT_CHUNKSIZE, engine="c"):
+    """
+    Streams a single tracking CSV in chunks and keeps only the rows whose event is in `events`.
+    Peak memory is bounded by `chunksize` rather than by the size of the file.
+
+    engine: "c" uses the pandas C parser, "pyarrow" uses the pyarrow streaming CSV reader.
+    """
+    return _stream_rows(path, "event", events, columns, chunksize, engine)
+
+
+def read_presnap_frames(path: str, columns=None, chunksize=DEFAULT_CHUNKSIZE, engine="c"):
+    """
+    Streams a single tracking CSV and keeps every frame up to and including the snap
+    (frameType BEFORE_SNAP or SNAP). Use presnap_window() to cut them down to line_set..ball_snap.
+    """
+    return _stream_rows(path, "frameType", ("BEFORE_SNAP", "SNAP"), columns, chunksize, engine)
+
+
+def presnap_window(frames: pd.DataFrame, start_event="line_set", end_event="ball_snap") -> pd.DataFrame:
+    """
+    Keeps the frames of every play from `start_event` to `end_event`, inclusive.
+    Plays without a `start_event` start at their first frame, plays without an `end_event` are dropped.
+    """
+    keys = ["gameId", "playId"]
+    events = frames.loc[frames["event"].isin([start_event, end_event]), keys + ["event", "frameId"]]
+    bounds = events.pivot_table(index=keys, columns="event", values="frameId", aggfunc="min", observed=True)
+    bounds = bounds.reindex(columns=[start_event, end_event])
+
+    first_frame = frames.groupby(keys, observed=True)["frameId"].min()
+    bounds[start_event] = bounds[start_event].fillna(first_frame.reindex(bounds.index))
+    bounds = bounds.dropna(subset=[end_event]).rename(columns={start_event: "startFrame", end_event: "endFrame"})
+
+    frames = frames.merge(bounds.reset_index(), on=keys)
+    in_window = (frames["frameId"] >= frames["startFrame"]) & (frames["frameId"] <= frames["endFrame"])
+    return frames[in_window].drop(columns=["startFrame", "endFrame"]).reset_index(drop=True)
+
+
+def _read_week(args):
+    path, week, events, columns, chunksize, engine = args
+    print(f"Starting processing for {os.path.basename(path)}...")
+    with span("read_tracking_week", week=week, bytes=os.path.getsize(path)) as current:
+        snap = read_snap_frames(path, events=events, columns=columns, chunksize=chunksize, engine=engine)
+        snap["week"] = pd.Series(week, index=snap.index, dtype="int8")
+        current.set(rows=len(snap))
+    return snap
+
+
+@traced("ingest_tracking_weeks", rows=len)
+def ingest_tracking_weeks(data_dir: str, weeks=range(1, 10), events=("ball_snap",), columns=None,
+                          chunksize=DEFAULT_CHUNKSIZE, engine="c", processes=None, failed=None):
+    """
+    Reads the snap frames from every tracking_week_{i}.csv in `data_dir` and returns them as one DataFrame,
+    with a `week` column recording which file each row came from.
+
+    Each week is streamed independently, so they are handed to a pool of `processes` worker processes
+    (defaults to one per week, capped at the CPU count). Pass processes=1 to read them serially.
+    Weeks whose file is missing or unreadable are reported, skipped and appended to `failed` when given.
+    """
+    jobs = [(tracking_file_path(data_dir, week), week, tuple(events), columns, chunksize, engine) for week in weeks]
+
+    if processes is None:
+        processes = min(len(jobs), os.cpu_count() or 1)
+
+    frames = []
+    if processes <= 1:
+        for job in jobs:
+            try:
+                frames.append(_read_week(job))
+            except Exception as e:
+                print(f"Error reading {job[0]}: {e}")
+                if failed is not None:
+                    failed.append(job[1])
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [(job, pool.submit(_read_week, job)) for job in jobs]
+            for job, future in futures:
+                try:
+                    frames.append(future.result())
+                except Exception as e:
+                    print(f"Error reading {job[0]}: {e}")
+                    if failed is not None:
+                        failed.append(job[1])
+
+    if not frames:
+        raise FileNotFoundError(f"No tracking weeks could be read from {data_dir}")
+
+    snap_data = pd.concat(frames, ignore_index=True)
+
+    # Categories differ per week, so re-establish them over the combined frame
+    for col in ("club", "playDirection"):
+        if col in snap_data.columns:
+            snap_data[col] = snap_data[col].astype("category")
+
+    return snap_data
@@ -0,0 +1,200 @@
+"""
+Compact columnar storage of the snap data: one NumPy array per column, rows sorted by play.
+
+Plays are keyed by a single int64 (gameId * 10000 + playId) instead of the "gameId-playId" string,
+strings are int8 codes and coordinates float32. Saved as one .npy file per array, so a whole season
+is memory-mapped in milliseconds and a play is a view of a few rows, never a copy.
+
+    python -m src.data_pipeline.play_container resources/reduced_data resources/plays_compact
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.feature_store import FEATURE_STORE_PATH, load_features
+from src.data_pipeline.play_features import POSITIONS
+
+# playId is below 10000 in every season, so the packed key is unique and sorts by game, then play
+PLAY_KEY_MULTIPLIER = 10_000
+
+# Per play arrays, then per player row arrays
+PLAY_ARRAYS = {'keys': np.int64, 'offsets': np.int64, 'week': np.int8, 'formation': np.int8, 'direction': np.int8}
+ROW_ARRAYS = {'nflId': np.int32, 'position': np.int8, 'x': np.float32, 'y': np.float32, 'o': np.float32}
+
+
+def pack_play_keys(game_ids, play_ids) -> np.ndarray:
+    return np.asarray(game_ids, dtype=np.int64) * PLAY_KEY_MULTIPLIER + np.asarray(play_ids, dtype=np.int64)
+
+
+def unpack_play_keys(keys) -> tuple:
+    """gameId and playId arrays of packed play keys."""
+    game_ids, play_ids = np.divmod(np.asarray(keys, dtype=np.int64), PLAY_KEY_MULTIPLIER)
+    return game_ids.astype(np.int32), play_ids.astype(np.int16)
+
+
+def play_keys_from_ids(unique_play_ids) -> np.ndarray:
+    """Packed keys of "gameId-playId" strings."""
+    parts = pd.Series(unique_play_ids).astype(str).str.partition('-')
+    return pack_play_keys(parts[0].astype(np.int64), parts[2].astype(np.int64))
+
+
+def play_ids_from_keys(keys) -> np.ndarray:
+    """The "gameId-playId" strings of packed play keys."""
+    game_ids, play_ids = unpack_play_keys(keys)
+    return (pd.Series(game_ids).astype(str) + '-' + pd.Series(play_ids).astype(str)).to_numpy()
+
+
+def _codes(values, categories) -> np.ndarray:
+    return pd.Categorical(values, categories=categories).codes.astype(np.int8)
+
+
+class PlayContainer:
+    """
+    Snap data as typed NumPy arrays. Play i covers rows offsets[i]:offsets[i + 1] of the row arrays;
+    formation and direction are codes into `formations` and `directions`, position codes follow
+    POSITIONS. Missing values are code -1.
+    """
+
+    def __init__(self, arrays: dict, formations, directions):
+        self.arrays = arrays
+        self.formations = list(formations)
+        self.directions = list(directions)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame):
+        if 'gameId' in df.columns and 'playId' in df.columns:
+            row_keys = pack_play_keys(df['gameId'], df['playId'])
+        else:
+            row_keys = play_keys_from_ids(df['uniquePlayId'])
+        order = np.argsort(row_keys, kind='stable')
+        row_keys = row_keys[order]
+        starts = np.flatnonzero(np.r_[True, row_keys[1:] != row_keys[:-1]])
+        first_rows = order[starts]
+
+        def play_codes(column, categories):
+            if column not in df.columns:
+                return np.full(len(starts), -1, dtype=np.int8)
+            return _codes(df[column].to_numpy()[first_rows], categories)
+
+        formations = sorted(df['offenseFormation'].dropna().astype(str).unique()) \
+            if 'offenseFormation' in df.columns else []
+        directions = ['left', 'right']
+        arrays = {
+            'keys': row_keys[starts],
+            'offsets': np.r_[starts, len(row_keys)].astype(np.int64),
+            'week': df['week'].to_numpy()[first_rows].astype(np.int8) if 'week' in df.columns
+            else np.full(len(starts), -1, dtype=np.int8),
+            'formation': play_codes('offenseFormation', formations),
+            'direction': play_codes('playDirection', directions),
+            'nflId': df['nflId'].to_numpy()[order].astype(np.int32) if 'nflId' in df.columns
+            else np.full(len(order), -1, dtype=np.int32),
+            'position': _codes(df['position'].to_numpy()[order], POSITIONS),
+        }
+        for col in ('x', 'y', 'o'):
+            arrays[col] = df[col].to_numpy(dtype=np.float32)[order]
+        return cls(arrays, formations, directions)
+
+    @classmethod
+    def from_feature_store(cls, path=FEATURE_STORE_PATH, filters=None):
+        return cls.from_frame(load_features(path, filters=filters))
+
+    def save(self, path: str):
+        """Writes every array to <path>/<name>.npy and the category names to <path>/meta.json."""
+        os.makedirs(path, exist_ok=True)
+        for name, values in self.arrays.items():
+            np.save(os.path.join(path, f"{name}.npy"), values)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({'formations': self.formations, 'directions': self.directions, 'positions': POSITIONS,
+                       'play_key_multiplier': PLAY_KEY_MULTIPLIER}, f, indent=2)
+        return path
+
+    @classmethod
+    def load(cls, path: str, mmap=True):
+        """Opens a saved container. With `mmap` the arrays are memory-mapped read-only, not read into memory."""
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta['positions'] != POSITIONS:
+            raise ValueError(f"Container {path} was written with positions {meta['positions']}, expected {POSITIONS}")
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r' if mmap else None)
+                  for name in {**PLAY_ARRAYS, **ROW_ARRAYS}}
+        return cls(arrays, meta['formations'], meta['directions'])
+
+    def __len__(self):
+        return len(self.arrays['keys'])
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.arrays['offsets'][-1])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(values.nbytes for values in self.arrays.values())
+
+    def index_of(self, game_id, play_id) -> int:
+        """Position of a play, by binary search over the sorted keys."""
+        key = pack_play_keys(game_id, play_id)
+        i = int(np.searchsorted(self.arrays['keys'], key))
+        if i == len(self) or self.arrays['keys'][i] != key:
+            raise KeyError(f"Play {game_id}-{play_id} is not in the container")
+        return i
+
+    def rows(self, start: int, stop: int = None) -> dict:
+        """Row arrays of plays start..stop-1 (just `start` by default) as views, without copying."""
+        stop = start + 1 if stop is None else stop
+        offsets = self.arrays['offsets']
+        return {name: self.arrays[name][offsets[start]:offsets[stop]] for name in ROW_ARRAYS}
+
+    def play(self, game_id, play_id) -> dict:
+        return self.rows(self.index_of(game_id, play_id))
+
+    def to_frame(self, plays=None) -> pd.DataFrame:
+        """
+        The rows of `plays` (positions, a slice or None for all) as a frame with the feature store
+        columns, strings as categoricals, for the pandas based code.
+        """
+        plays = np.arange(len(self))[plays if plays is not None else slice(None)]
+        offsets = self.arrays['offsets']
+        counts = offsets[plays + 1] - offsets[plays]
+        rows = np.repeat(offsets[plays] - np.r_[0, np.cumsum(counts)[:-1]], counts) + np.arange(counts.sum())
+        play_of_row = np.repeat(plays, counts)
+
+        keys = self.arrays['keys'][plays]
+        game_ids, play_ids = unpack_play_keys(keys)
+        return pd.DataFrame({
+            'uniquePlayId': np.repeat(play_ids_from_keys(keys), counts),
+            'gameId': np.repeat(game_ids, counts),
+            'playId': np.repeat(play_ids, counts),
+            'week': self.arrays['week'][play_of_row],
+            'nflId': self.arrays['nflId'][rows],
+            'playDirection': pd.Categorical.from_codes(self.arrays['direction'][play_of_row], self.directions),
+            'x': self.arrays['x'][rows],
+            'y': self.arrays['y'][rows],
+            'o': self.arrays['o'][rows],
+            'position': pd.Categorical.from_codes(self.arrays['position'][rows], POSITIONS),
+            'offenseFormation': pd.Categorical.from_codes(self.arrays['formation'][play_of_row], self.formations),
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the feature store into a memory-mappable play container")
+    parser.add_argument("features_path", nargs="?", default=FEATURE_STORE_PATH)
+    parser.add_argument("output", nargs="?", default=os.path.join("resources", "plays_compact"))
+    args = parser.parse_args()
+
+    df = load_features(args.features_path)
+    container = PlayContainer.from_frame(df)
+    container.save(args.output)
+
+    start = time.perf_counter()
+    loaded = PlayContainer.load(args.output)
+    load_ms = (time.perf_counter() - start) * 1000
+    print(f"{len(loaded)} plays, {loaded.n_rows} rows: {container.nbytes / 2 ** 20:.1f} MB as arrays, "
+          f"{df.memory_usage(deep=True).sum() / 2 ** 20:.1f} MB as a DataFrame, mapped in {load_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.geometry import canonicalize_rows
+from src.instrumentation.spans import traced
+
+# Offensive positions kept by the consolidation step, in slot order.
+POSITIONS = ['C', 'G', 'T', 'TE', 'WR', 'RB', 'FB', 'QB']
+POSITION_CODES = {position: code for code, position in enumerate(POSITIONS)}
+
+# Number of wide-frame slots per position. Generous enough for jumbo and empty personnel,
+# so every player of a play gets its own columns instead of being averaged with the others.
+POSITION_SLOTS = {'C': 2, 'G': 3, 'T': 3, 'TE': 4, 'WR': 5, 'RB': 3, 'FB': 2, 'QB': 2}
+
+PLAYERS_PER_PLAY = 11
+
+
+@dataclass
+class PlayTensor:
+    """
+    All plays as fixed size NumPy arrays.
+
+    Players of a play are ordered by position (see POSITIONS) and then by y, so WR1 is always the
+    receiver closest to the sideline at y=0. Empty slots have position code -1 and NaN values.
+    """
+    play_ids: np.ndarray       # (n_plays,) uniquePlayId
+    formations: np.ndarray     # (n_plays,) offenseFormation, or None when not present
+    directions: np.ndarray     # (n_plays,) playDirection, or None when not present
+    positions: np.ndarray      # (n_plays, 11) int8 position codes
+    position_rank: np.ndarray  # (n_plays, 11) int8 rank of the player within its position, 0 = first
+    values: np.ndarray         # (n_plays, 11, k) float32
+    features: tuple            # names of the k feature columns in `values`
+
+    def __len__(self):
+        return len(self.play_ids)
+
+    def feature(self, name: str) -> np.ndarray:
+        """Returns the (n_plays, 11) array of a single feature."""
+        return self.values[:, :, self.features.index(name)]
+
+    def _overflowing_players(self, slots) -> np.ndarray:
+        """(n_plays, 11) mask of the players ranked beyond the slots of their position."""
+        capacity = np.array([slots[position] for position in POSITIONS])
+        filled = self.positions >= 0
+        return filled & (self.position_rank >= capacity[np.where(filled, self.positions, 0)])
+
+    def overflowing(self, slots=POSITION_SLOTS) -> np.ndarray:
+        """(n_plays,) mask of the plays with more players of a position than `slots` has for it."""
+        return self._overflowing_players(slots).any(axis=1)
+
+    def _report_overflow(self, players: np.ndarray, strict: bool, action: str):
+        plays = players.any(axis=1)
+        crowded = sorted({POSITIONS[code] for code in self.positions[players]})
+        message = (f"{plays.sum()} plays with more players than slots for positions {crowded}, "
+                   f"e.g. {list(self.play_ids[plays][:5])}")
+        if strict:
+            raise ValueError(f"{message}, increase their entries in `slots`")
+        print(f"{action} {message}")
+
+    def fit_slots(self, slots=POSITION_SLOTS, strict=False) -> 'PlayTensor':
+        """
+        The plays that fit in `slots`. Plays with more players of a position than it has slots (e.g. 6 WR) are
+        reported and dropped, or raise a ValueError with `strict`.
+        """
+        players = self._overflowing_players(slots)
+        if not players.any():
+            return self
+        self._report_overflow(players, strict, "Dropping")
+        keep = ~players.any(axis=1)
+        return PlayTensor(
+            play_ids=self.play_ids[keep],
+            formations=None if self.formations is None else self.formations[keep],
+            directions=None if self.directions is None else self.directions[keep],
+            positions=self.positions[keep],
+            position_rank=self.position_rank[keep],
+            values=self.values[keep],
+            features=self.features,
+        )
+
+    def to_slots(self, slots=POSITION_SLOTS, strict=False) -> np.ndarray:
+        """
+        The (n_plays, n_slots, k) float32 array behind to_frame(): every player in the slot of its position
+        and rank, slots ordered like slot_names(slots), missing players NaN. Plays that do not fit in `slots`
+        are reported and left empty, so rows still line up with the plays (a ValueError with `strict`).
+        """
+        offsets = np.zeros(len(POSITIONS), dtype=np.int64)
+        offsets[1:] = np.cumsum([slots[position] for position in POSITIONS])[:-1]
+        n_slots = sum(slots.values())
+
+        players = self._overflowing_players(slots)
+        if players.any():
+            self._report_overflow(players, strict, "Leaving out")
+        filled = (self.positions >= 0) & ~players.any(axis=1)[:, None]
+        codes = self.positions[filled]
+        ranks = self.position_rank[filled]
+
+        play_index = np.nonzero(filled)[0]
+        slot_index = offsets[codes] + ranks
+
+        wide = np.full((len(self), n_slots, len(self.features)), np.nan, dtype=np.float32)
+        wide[play_index, slot_index] = self.values[filled]
+        return wide
+
+    def to_frame(self, slots=POSITION_SLOTS, strict=False) -> pd.DataFrame:
+        """
+        Flattens the tensor into one row per play with a column per feature and position slot,
+        e.g. x_WR1, y_WR1, o_WR1, x_WR2, ... Slot columns are the same for every play, missing
+        players are NaN. Plays that do not fit in `slots` are dropped (see fit_slots()).
+        """
+        tensor = self.fit_slots(slots, strict)
+        wide = tensor.to_slots(slots)
+        columns = [f"{feature}_{slot}" for feature in tensor.features for slot in slot_names(slots)]
+
+        # (n_plays, n_slots, k) -> (n_plays, k * n_slots) so columns are grouped by feature like the old pivot
+        frame = pd.DataFrame(wide.transpose(0, 2, 1).reshape(len(tensor), -1), columns=columns)
+
+        keys = {'uniquePlayId': tensor.play_ids}
+        if tensor.directions is not None:
+            keys['playDirection'] = tensor.directions
+        if tensor.formations is not None:
+            keys['offenseFormation'] = tensor.formations
+        return pd.concat([pd.DataFrame(keys), frame], axis=1)
+
+
+def slot_names(slots=POSITION_SLOTS) -> list:
+    """C1, C2, G1, ... in the column order of play_feature_frame()."""
+    return [f"{position}{i + 1}" for position in POSITIONS for i in range(slots[position])]
+
+
+def _run_rank(keys: np.ndarray) -> np.ndarray:
+    """Position of each element within its run of equal consecutive keys."""
+    index = np.arange(len(keys))
+    run_start = np.ones(len(keys), dtype=bool)
+    run_start[1:] = keys[1:] != keys[:-1]
+    return index - np.maximum.accumulate(np.where(run_start, index, 0))
+
+
+@traced("build_play_tensor", rows=len)
+def build_play_tensor(df: pd.DataFrame, features=('x', 'y', 'o'), max_players=PLAYERS_PER_PLAY,
+                      key='uniquePlayId', canonical=False) -> PlayTensor:
+    """
+    Builds the (n_plays, 11, k) feature tensor from the one row per player snap data.
+    `key` is the column identifying a play, any column that groups 11 players works (e.g. an integer
+    play and frame key when building one row per tracking frame).
+    With `canonical`, coordinates are centered on the C and left plays mirrored first (see geometry.py),
+    so the y ordering of the slots is the same for both directions.
+
+    The rows are sorted once by (play, position, y) and every player is scattered straight into its
+    slot, so the cost is a single sort plus linear passes regardless of the number of plays.
+    Plays with more than `max_players` rows are reported and dropped.
+    """
+    features = tuple(features)
+    if canonical:
+        df = canonicalize_rows(df, key=key)
+
+    play_codes, play_ids = pd.factorize(df[key], sort=True)
+    position_codes = df['position'].map(POSITION_CODES)
+    if position_codes.isna().any():
+        unknown = sorted(df.loc[position_codes.isna(), 'position'].astype(str).unique())
+        raise ValueError(f"Unknown positions {unknown}, expected one of {POSITIONS}")
+    position_codes = position_codes.to_numpy(dtype=np.int64)
+    y = df['y'].to_numpy(dtype=np.float32)
+
+    order = np.lexsort((y, position_codes, play_codes))
+    play_codes = play_codes[order]
+    position_codes = position_codes[order]
+
+    player_rank = _run_rank(play_codes)
+    position_rank = _run_rank(play_codes * len(POSITIONS) + position_codes)
+
+    n_plays = len(play_ids)
+    counts = np.bincount(play_codes, minlength=n_plays)
+    too_many = counts > max_players
+    if too_many.any():
+        print(f"Dropping {too_many.sum()} plays with more than {max_players} offensive players")
+    keep = player_rank < max_players
+
+    positions = np.full((n_plays, max_players), -1, dtype=np.int8)
+    ranks = np.full((n_plays, max_players), -1, dtype=np.int8)
+    values = np.full((n_plays, max_players, len(features)), np.nan, dtype=np.float32)
+
+    rows, slots = play_codes[keep], player_rank[keep]
+    positions[rows, slots] = position_codes[keep]
+    ranks[rows, slots] = position_rank[keep]
+    values[rows, slots] = df[list(features)].to_numpy(dtype=np.float32)[order][keep]
+
+    # Play level columns come from the first row of every play
+    first_rows = order[np.r_[0, np.flatnonzero(np.diff(play_codes)) + 1]] if len(order) else order
+
+    # Plays dropped for having too many players are left out of every array
+    valid = ~too_many
+
+    def play_level(column):
+        if column not in df.columns:
+            return None
+        return df[column].to_numpy()[first_rows][valid]
+
+    return PlayTensor(
+        play_ids=np.asarray(play_ids)[valid],
+        formations=play_level('offenseFormation'),
+        directions=play_level('playDirection'),
+        positions=positions[valid],
+        position_rank=ranks[valid],
+        values=values[valid],
+        features=features,
+    )
+
+
+@traced("play_feature_frame", rows=len)
+def play_feature_frame(df: pd.DataFrame, features=('x', 'y', 'o'), slots=POSITION_SLOTS, canonical=True,
+                       strict=False) -> pd.DataFrame:
+    """
+    One row per play with uniquePlayId, playDirection, offenseFormation and a column per feature and
+    position slot (x_C1, ..., o_QB2). This is the shared model input for the H2O, XGBoost and AutoGluon pipelines.
+    Coordinates are canonical (relative to the C, offense moving towards +x) unless `canonical` is False.
+    Plays with more players of a position than `slots` has are reported and dropped (a ValueError with `strict`).
+    """
+    return build_play_tensor(df, features=features, canonical=canonical).to_frame(slots=slots, strict=strict)
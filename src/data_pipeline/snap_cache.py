@@ -0,0 +1,228 @@
+"""
+Cache of the per-week snap extraction and consolidation, keyed by fingerprints of the source files.
+
+Every tracking week is stored twice under resources/cache/snaps: the ball_snap rows read from its CSV,
+valid while the CSV is unchanged, and its consolidated offensive rows, valid while the CSV, plays.csv
+and players.csv are unchanged. Re-running the consolidation only re-reads the weeks whose CSV changed
+and only re-joins the weeks whose inputs changed; when nothing changed nothing is read or written.
+
+    python -m src.data_pipeline.snap_cache resources/data
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src.data_pipeline.consolidation import consolidate_snaps
+from src.data_pipeline.feature_store import FEATURE_STORE_PATH, stored_weeks, write_feature_store
+from src.data_pipeline.ingestion import ingest_tracking_weeks, tracking_file_path
+from src.instrumentation.spans import traced
+
+SNAP_CACHE_DIR = os.path.join("resources", "cache", "snaps")
+
+# Bumped whenever the extraction or consolidation logic changes, invalidating every cached week
+CACHE_VERSION = 1
+
+HASH_BLOCK_SIZE = 1 << 24
+
+
+def file_fingerprint(path: str, previous=None) -> dict:
+    """
+    Size, modification time and content hash of a file. The hash is only computed when size or
+    mtime differ from `previous` (an earlier fingerprint), otherwise it is carried over, so checking
+    an unchanged file costs a single stat call.
+    """
+    stat = os.stat(path)
+    fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if previous and previous.get('size') == stat.st_size and previous.get('mtime_ns') == stat.st_mtime_ns:
+        return {**fingerprint, 'blake2b': previous['blake2b']}
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return {**fingerprint, 'blake2b': digest.hexdigest()}
+
+
+def _same_content(fingerprint, previous) -> bool:
+    return previous is not None and fingerprint['blake2b'] == previous.get('blake2b')
+
+
+class SnapCache:
+    """The cached weeks of one data directory and the manifest of the fingerprints they were built from."""
+
+    def __init__(self, cache_dir=SNAP_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.manifest_path = os.path.join(cache_dir, "manifest.json")
+        self.manifest = {'version': CACHE_VERSION, 'weeks': {}}
+        # Fingerprints taken during this run, so a changed CSV is hashed once
+        self._fingerprints = {}
+        # Weeks whose tracking CSV could not be read during this run, they stay stale and are retried next run
+        self.unreadable = set()
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get('version') == CACHE_VERSION:
+                self.manifest = manifest
+            else:
+                print(f"Snap cache {cache_dir} was written by version {manifest.get('version')}, rebuilding it")
+
+    def _week(self, week: int) -> dict:
+        return self.manifest['weeks'].setdefault(str(week), {})
+
+    def path(self, week: int, stage: str) -> str:
+        return os.path.join(self.cache_dir, f"week_{week}_{stage}.parquet")
+
+    def save_manifest(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.manifest_path, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+
+    def tracking_fingerprint(self, data_dir: str, week: int) -> dict:
+        path = tracking_file_path(data_dir, week)
+        if path not in self._fingerprints:
+            self._fingerprints[path] = file_fingerprint(path, self._week(week).get('tracking'))
+        return self._fingerprints[path]
+
+    def stale_snap_weeks(self, data_dir: str, weeks, events=("ball_snap",)) -> list:
+        """Weeks whose snap rows have to be read again from the tracking CSV."""
+        stale = []
+        for week in weeks:
+            entry = self._week(week)
+            fingerprint = self.tracking_fingerprint(data_dir, week)
+            if _same_content(fingerprint, entry.get('tracking')) and entry.get('events') == list(events) \
+                    and os.path.exists(self.path(week, "snaps")):
+                # Touched but unchanged files keep their cache, remember the new mtime
+                entry['tracking'] = fingerprint
+            else:
+                stale.append(week)
+        return stale
+
+
+@traced("cached_snap_frames", rows=len)
+def cached_snap_frames(data_dir: str, weeks=range(1, 10), events=("ball_snap",), cache_dir=SNAP_CACHE_DIR,
+                       cache=None, **ingest_options) -> pd.DataFrame:
+    """
+    ingest_tracking_weeks() through the cache: only weeks whose tracking CSV changed since they were
+    cached are streamed again (in parallel), the others are read from Parquet. Missing files are skipped,
+    unreadable ones are skipped and left stale (recorded in cache.unreadable).
+    """
+    cache = cache or SnapCache(cache_dir)
+    weeks = [week for week in weeks if os.path.exists(tracking_file_path(data_dir, week))]
+    stale = cache.stale_snap_weeks(data_dir, weeks, events)
+
+    if stale:
+        print(f"Reading tracking weeks {stale}, {len(weeks) - len(stale)} cached")
+        failed = []
+        try:
+            snap_data = ingest_tracking_weeks(data_dir, weeks=stale, events=events, failed=failed, **ingest_options)
+        except FileNotFoundError:
+            # Every stale week failed, the cached ones can still be returned
+            snap_data = None
+        cache.unreadable.update(failed)
+        read = [week for week in stale if week not in cache.unreadable]
+
+        os.makedirs(cache.cache_dir, exist_ok=True)
+        written = set()
+        if snap_data is not None:
+            for week, rows in snap_data.groupby('week', observed=True):
+                rows.to_parquet(cache.path(week, "snaps"), index=False)
+                written.add(week)
+        for week in read:
+            entry = cache._week(week)
+            entry.update(tracking=cache.tracking_fingerprint(data_dir, week), events=list(events))
+            # Consolidated rows of a re-read week are stale as well
+            entry.pop('consolidated', None)
+            if week not in written:
+                # No snap rows at all, still cache the empty result
+                snap_data.iloc[:0].to_parquet(cache.path(week, "snaps"), index=False)
+        cache.save_manifest()
+
+    frames = [pd.read_parquet(cache.path(week, "snaps")) for week in weeks if week not in cache.unreadable]
+    if not frames:
+        raise FileNotFoundError(f"No tracking weeks could be read from {data_dir}")
+    snap_data = pd.concat(frames, ignore_index=True)
+    for col in ("club", "playDirection"):
+        if col in snap_data.columns:
+            snap_data[col] = snap_data[col].astype("category")
+    return snap_data
+
+
+def consolidate_weeks(data_dir: str, weeks=range(1, 19), path=FEATURE_STORE_PATH, cache_dir=SNAP_CACHE_DIR,
+                      force=False, **ingest_options) -> list:
+    """
+    Incremental consolidation of the tracking weeks of `data_dir` into the feature store. A week is
+    joined again when its tracking CSV, plays.csv or players.csv changed since it was cached, and
+    restored from its cached rows when only its feature store partition is missing. Only those week
+    partitions are written. Returns the written weeks.
+    """
+    start = time.perf_counter()
+    cache = SnapCache(cache_dir)
+    weeks = [week for week in weeks if os.path.exists(tracking_file_path(data_dir, week))]
+    inputs = {name: file_fingerprint(os.path.join(data_dir, f"{name}.csv"), cache.manifest.get(name))
+              for name in ('plays', 'players')}
+    inputs_changed = any(not _same_content(fingerprint, cache.manifest.get(name))
+                         for name, fingerprint in inputs.items())
+
+    snap_stale = set(cache.stale_snap_weeks(data_dir, weeks))
+
+    def joined_rows_valid(week):
+        return not (force or inputs_changed or week in snap_stale) and cache._week(week).get('consolidated') \
+            and os.path.exists(cache.path(week, "consolidated"))
+
+    stored = set(stored_weeks(path))
+    rejoin = [week for week in weeks if not joined_rows_valid(week)]
+    def consolidated_rows(week):
+        entry = cache._week(week)
+        if 'rows' not in entry:
+            # Manifests written before row counts were kept
+            entry['rows'] = pq.read_metadata(cache.path(week, "consolidated")).num_rows
+        return entry['rows']
+
+    # Weeks that consolidate to no rows have no partition to restore
+    restore = [week for week in weeks if joined_rows_valid(week) and week not in stored and consolidated_rows(week)]
+    if not rejoin and not restore:
+        cache.save_manifest()
+        print(f"All {len(weeks)} weeks are up to date ({time.perf_counter() - start:.1f}s)")
+        return []
+
+    frames = [pd.read_parquet(cache.path(week, "consolidated")) for week in restore]
+    if rejoin:
+        plays = pd.read_csv(os.path.join(data_dir, "plays.csv"))
+        players = pd.read_csv(os.path.join(data_dir, "players.csv"))
+        snap_data = cached_snap_frames(data_dir, rejoin, cache=cache, **ingest_options)
+        offensive_data = consolidate_snaps(snap_data, plays, players)
+        # Unreadable weeks keep their feature store partition until a later run reads them
+        rejoin = [week for week in rejoin if week not in cache.unreadable]
+        for week in rejoin:
+            rows = offensive_data[offensive_data['week'] == week]
+            rows.to_parquet(cache.path(week, "consolidated"), index=False)
+            cache._week(week).update(consolidated=True, rows=len(rows))
+        frames.append(offensive_data)
+
+    write_feature_store(pd.concat(frames, ignore_index=True), path)
+    cache.manifest.update(inputs)
+    cache.save_manifest()
+    print(f"Re-joined weeks {rejoin} and restored weeks {restore} from the cache "
+          f"({time.perf_counter() - start:.1f}s)")
+    return sorted(rejoin + restore)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consolidate the tracking weeks that changed into the feature store")
+    parser.add_argument("data_dir", help="Directory with plays.csv, players.csv and tracking_week_{i}.csv")
+    parser.add_argument("--features-path", default=FEATURE_STORE_PATH)
+    parser.add_argument("--cache-dir", default=SNAP_CACHE_DIR)
+    parser.add_argument("--weeks", type=int, nargs="+", default=list(range(1, 19)))
+    parser.add_argument("--force", action="store_true", help="Rebuild every week from the cached snap rows")
+    args = parser.parse_args()
+
+    consolidate_weeks(args.data_dir, args.weeks, args.features_path, args.cache_dir, args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.play_features import build_play_tensor
+from src.formation_gui.field import Field
+from src.instrumentation.spans import traced
+
+
+class FormationRenderer:
+    """
+    Draws many plays on one figure. The background (zoomed green patch, or the full field from
+    Field.generate_field) is built once, then every play only moves the scatter points and changes the title.
+    """
+
+    def __init__(self, zoomed=True, field: Field = None, dpi=100):
+        self.field = field or Field()
+        self.dpi = dpi
+        if zoomed:
+            self.fig, self.ax = plt.subplots(1, figsize=(5, 5))
+            self.field.draw_zoomed_background(self.ax)
+        else:
+            self.field.generate_field()
+            self.fig, self.ax = self.field.fig, self.field.ax
+        self.points = self.ax.scatter([], [], c='red', s=25 if zoomed else 15, zorder=3)
+        self.title = self.ax.set_title("")
+
+    def draw(self, xy: np.ndarray, title: str):
+        self.points.set_offsets(xy[~np.isnan(xy).any(axis=1)])
+        self.title.set_text(title)
+        return self.fig
+
+    def save(self, xy: np.ndarray, title: str, path: str):
+        self.draw(xy, title).savefig(path, dpi=self.dpi)
+
+    def close(self):
+        plt.close(self.fig)
+
+
+class ContactSheet:
+    """A rows x cols grid of zoomed formations, reused for every page."""
+
+    def __init__(self, rows=4, cols=5, field: Field = None, dpi=100):
+        field = field or Field()
+        self.dpi = dpi
+        self.fig, axes = plt.subplots(rows, cols, figsize=(cols * 2.5, rows * 2.5))
+        self.axes = list(np.ravel(axes))
+        self.points, self.titles = [], []
+        for ax in self.axes:
+            field.draw_zoomed_background(ax)
+            self.points.append(ax.scatter([], [], c='red', s=8, zorder=3))
+            self.titles.append(ax.set_title("", fontsize=7))
+        self.fig.tight_layout()
+
+    @property
+    def per_page(self):
+        return len(self.axes)
+
+    def draw(self, plays):
+        """plays: list of (xy, title) pairs, at most `per_page` of them."""
+        for i, ax in enumerate(self.axes):
+            if i < len(plays):
+                xy, title = plays[i]
+                self.points[i].set_offsets(xy[~np.isnan(xy).any(axis=1)])
+                self.titles[i].set_text(title)
+                ax.set_visible(True)
+            else:
+                ax.set_visible(False)
+        return self.fig
+
+    def close(self):
+        plt.close(self.fig)
+
+
+def _use_agg():
+    # Worker processes only write files, never open windows
+    matplotlib.use("Agg")
+
+
+def _render_pngs(job):
+    xy, titles, paths, zoomed, dpi = job
+    renderer = FormationRenderer(zoomed=zoomed, dpi=dpi)
+    try:
+        for play_xy, title, path in zip(xy, titles, paths):
+            renderer.save(play_xy, title, path)
+    finally:
+        renderer.close()
+    return paths
+
+
+def _render_sheets(job):
+    xy, titles, path, first_page, rows, cols, dpi = job
+    sheet = ContactSheet(rows=rows, cols=cols, dpi=dpi)
+    plays = list(zip(xy, titles))
+    pages = [plays[i:i + sheet.per_page] for i in range(0, len(plays), sheet.per_page)]
+    try:
+        if path.endswith(".pdf"):
+            from matplotlib.backends.backend_pdf import PdfPages
+            with PdfPages(path) as pdf:
+                for page in pages:
+                    pdf.savefig(sheet.draw(page))
+            return [path]
+
+        root, ext = os.path.splitext(path)
+        written = []
+        for i, page in enumerate(pages, start=first_page):
+            page_path = f"{root}_{i:04d}{ext}"
+            sheet.draw(page).savefig(page_path, dpi=dpi)
+            written.append(page_path)
+        return written
+    finally:
+        sheet.close()
+
+
+def _run(worker, jobs, processes):
+    if processes <= 1 or len(jobs) <= 1:
+        return [path for job in jobs for path in worker(job)]
+    with ProcessPoolExecutor(max_workers=processes, initializer=_use_agg) as pool:
+        return [path for paths in pool.map(worker, jobs) for path in paths]
+
+
+@traced("render_plays", rows=lambda result: result['plays'])
+def render_plays(df: pd.DataFrame, output_dir: str, mode="png", zoomed=True, processes=None, dpi=100,
+                 rows=4, cols=5, name="formations"):
+    """
+    Renders every play in `df` (one row per player, like the feature store) to files in `output_dir`.
+
+    mode "png":   one {uniquePlayId}.png per play
+    mode "sheet": contact sheet pages of rows x cols zoomed plays, {name}_{page}.png
+    mode "pdf":   the same contact sheets as a multi-page PDF, one {name}_{part}.pdf per worker process
+
+    Zoomed plays are drawn in canonical geometry (centered on the C, offense moving right).
+    Plays are split evenly over `processes` worker processes (default: one per CPU), each of which builds
+    its figure once. Returns the written paths and the plays rendered per second.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    canonical = zoomed or mode != "png"
+    tensor = build_play_tensor(df, features=('x', 'y'), canonical=canonical)
+    xy = tensor.values
+    formations = tensor.formations if tensor.formations is not None else [""] * len(tensor)
+    titles = [f"{play_id} - Formation: {formation}" for play_id, formation in zip(tensor.play_ids, formations)]
+
+    processes = processes or os.cpu_count() or 1
+    start = time.perf_counter()
+
+    if mode == "png":
+        paths = [os.path.join(output_dir, f"{play_id}.png") for play_id in tensor.play_ids]
+        step = math.ceil(len(tensor) / processes) if len(tensor) else 1
+        jobs = [(xy[i:i + step], titles[i:i + step], paths[i:i + step], zoomed, dpi)
+                for i in range(0, len(tensor), step)]
+        written = _run(_render_pngs, jobs, processes)
+    elif mode in ("sheet", "pdf"):
+        per_page = rows * cols
+        pages = math.ceil(len(tensor) / per_page)
+        step = math.ceil(pages / processes) * per_page if pages else per_page
+        ext = ".pdf" if mode == "pdf" else ".png"
+        jobs = []
+        for part, i in enumerate(range(0, len(tensor), step)):
+            # PNG pages are numbered across workers, PDFs get one part file per worker
+            stem = f"{name}_{part:03d}" if mode == "pdf" and step < len(tensor) else name
+            path = os.path.join(output_dir, stem + ext)
+            jobs.append((xy[i:i + step], titles[i:i + step], path, i // per_page, rows, cols, dpi))
+        written = _run(_render_sheets, jobs, processes)
+    else:
+        raise ValueError(f"Unknown mode '{mode}', expected 'png', 'sheet' or 'pdf'")
+
+    elapsed = time.perf_counter() - start
+    plays_per_second = len(tensor) / elapsed if elapsed > 0 else None
+    print(f"Rendered {len(tensor)} plays in {elapsed:.1f}s ({plays_per_second or 0:.1f} plays/s)")
+    return {"paths": written, "plays": len(tensor), "seconds": elapsed, "plays_per_second": plays_per_second}
@@ -3,6 +3,8 @@ import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 import pandas as pd
 import os
+from src.data_pipeline.geometry import canonicalize_rows, mirror_rows
+from src.instrumentation.spans import traced
 
 class Field:
 
@@ -24,9 +26,7 @@ class Field:
         self.ax.scatter(play.x, play.y, c='red', s=15)
         self.ax.set_title(f"Formation: {play.offenseFormation.unique()[0]}")
 
-    def zoomed_formation(self, play: pd.DataFrame, title_suffix: str = ""):
-        fig, ax = plt.subplots(1, figsize=(5,5))
-
+    def draw_zoomed_background(self, ax):
         ax.set_xlim(-25, 25)
         ax.set_ylim(-25, 25)
         ax.axis("off")
@@ -34,24 +34,20 @@ class Field:
         # Field
         field = patches.Rectangle((-25, -25), 50, 50, fc='green')
         ax.add_patch(field)
+        ax.plot([0, 0], [-25, 25], color='white', linestyle='-', linewidth=.5)
 
-        center_pos = play[play['position'] == 'C'][['x', 'y']]
-        center_x = center_pos["x"].values[0]
-        center_y = center_pos["y"].values[0]
+    @traced("Field.zoomed_formation")
+    def zoomed_formation(self, play: pd.DataFrame, title_suffix: str = ""):
+        fig, ax = plt.subplots(1, figsize=(5,5))
+        self.draw_zoomed_background(ax)
+
+        # Center on the C, direction is left as is so flip_formation can be shown separately
+        centered_play = canonicalize_rows(play, mirror=False)
 
-        centered_play = play.copy()
-        centered_play["x"] = play["x"].subtract(center_x)
-        centered_play["y"] = play["y"].subtract(center_y)
-        
         ax.scatter(centered_play.x, centered_play.y, c=['red'], s=25)
-        ax.plot([0, 0], [-25, 25], color='white', linestyle='-', linewidth=.5)
         ax.set_title(f"Formation: {centered_play.offenseFormation.unique()[0]}{title_suffix}")
 
         return fig
     
     def flip_formation(self, play: pd.DataFrame):
-        tmp = play.copy()
-        tmp['x'] = play['x'].multiply(-1)
-        tmp['y'] = play['y'].multiply(-1)
-
-        return tmp
\ No newline at end of file
+        return mirror_rows(play)
\ No newline at end of file
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.feature_store import FEATURE_STORE_PATH, load_features
+from src.data_pipeline.geometry import canonicalize_rows
+
+
+def _group_index(values: np.ndarray) -> dict:
+    """Maps every distinct value to the sorted positions where it occurs, built with one sort."""
+    codes, uniques = pd.factorize(values)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.cumsum(np.bincount(codes, minlength=len(uniques)))[:-1]
+    return {value: positions for value, positions in zip(uniques, np.split(order, bounds))}
+
+
+class PlayStore:
+    """
+    One row per player data, sorted so every play is a contiguous block of rows.
+
+    Lookups by uniquePlayId, gameId and offenseFormation go through dictionaries built once at load time,
+    so fetching a play is a slice of the sorted frame instead of a scan of the whole dataset.
+    """
+
+    def __init__(self, df: pd.DataFrame, key='uniquePlayId'):
+        codes, play_ids = pd.factorize(df[key])
+        order = np.argsort(codes, kind='stable')
+        counts = np.bincount(codes, minlength=len(play_ids))
+
+        self.key = key
+        self.rows = df.iloc[order].reset_index(drop=True)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.play_ids = np.asarray(play_ids, dtype=object)
+        self._index = {play_id: i for i, play_id in enumerate(self.play_ids)}
+
+        first_rows = self.rows.iloc[self.offsets[:-1]]
+        self.games = first_rows['gameId'].to_numpy() if 'gameId' in df.columns else None
+        self.formations = first_rows['offenseFormation'].astype(str).to_numpy() \
+            if 'offenseFormation' in df.columns else None
+        self._by_game = _group_index(self.games) if self.games is not None else {}
+        self._by_formation = _group_index(self.formations) if self.formations is not None else {}
+        self._xy = self.rows[['x', 'y']].to_numpy(dtype=np.float64)
+        self._canonical = None
+
+    @classmethod
+    def from_feature_store(cls, path=FEATURE_STORE_PATH, filters=None):
+        return cls(load_features(path, filters=filters))
+
+    def __len__(self):
+        return len(self.play_ids)
+
+    def __contains__(self, play_id):
+        return play_id in self._index
+
+    def index_of(self, play_id) -> int:
+        if play_id not in self._index:
+            raise KeyError(f"Play {play_id} is not in the store")
+        return self._index[play_id]
+
+    def play_at(self, i: int) -> pd.DataFrame:
+        return self.rows.iloc[self.offsets[i]:self.offsets[i + 1]]
+
+    def play(self, play_id) -> pd.DataFrame:
+        return self.play_at(self.index_of(play_id))
+
+    def game_ids(self):
+        return list(self._by_game)
+
+    def formation_names(self):
+        return sorted(self._by_formation)
+
+    def plays_in_game(self, game_id) -> np.ndarray:
+        """Store positions of the plays of one game, in store order."""
+        return self._by_game.get(game_id, np.empty(0, dtype=np.int64))
+
+    def plays_with_formation(self, formation) -> np.ndarray:
+        """Store positions of the plays with one offenseFormation, in store order."""
+        return self._by_formation.get(formation, np.empty(0, dtype=np.int64))
+
+    def select(self, formation=None, game_id=None) -> np.ndarray:
+        positions = np.arange(len(self))
+        if formation is not None:
+            positions = self.plays_with_formation(formation)
+        if game_id is not None:
+            positions = np.intersect1d(positions, self.plays_in_game(game_id), assume_unique=True)
+        return positions
+
+    def random_play(self, formation=None, game_id=None, rng=None) -> pd.DataFrame:
+        positions = self.select(formation, game_id)
+        if len(positions) == 0:
+            raise KeyError(f"No plays with formation={formation} and gameId={game_id}")
+        rng = rng or np.random.default_rng()
+        return self.play_at(int(rng.choice(positions)))
+
+    def xy(self, i: int, canonical=False) -> np.ndarray:
+        """
+        (n_players, 2) coordinates of the play at store position `i`. With `canonical` they are centered
+        on the C and mirrored to move right, computed for the whole store on first use.
+        """
+        if not canonical:
+            return self._xy[self.offsets[i]:self.offsets[i + 1]]
+        if self._canonical is None:
+            columns = [col for col in (self.key, 'position', 'playDirection', 'x', 'y') if col in self.rows.columns]
+            canonical = canonicalize_rows(self.rows[columns], key=self.key)
+            self._canonical = canonical[['x', 'y']].to_numpy(dtype=np.float64)
+        return self._canonical[self.offsets[i]:self.offsets[i + 1]]
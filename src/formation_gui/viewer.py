@@ -0,0 +1,86 @@
+import numpy as np
+
+from src.formation_gui.batch_render import FormationRenderer
+from src.formation_gui.field import Field
+from src.formation_gui.play_store import PlayStore
+
+
+class FormationViewer:
+    """
+    Browses the plays of a PlayStore on a single figure.
+
+    The figure is drawn once through Field; moving to another play only swaps the player points and title.
+    In an interactive matplotlib window (e.g. %matplotlib widget in a notebook) call `connect()` and use
+    the right/left arrow keys to step through the current selection and "r" to jump to a random play.
+    """
+
+    def __init__(self, store: PlayStore, zoomed=True, field: Field = None):
+        self.store = store
+        self.zoomed = zoomed
+        self.renderer = FormationRenderer(zoomed=zoomed, field=field)
+        self.selection = np.arange(len(store))
+        self.cursor = 0
+        self.rng = np.random.default_rng()
+
+    @property
+    def fig(self):
+        return self.renderer.fig
+
+    @property
+    def current_play_id(self):
+        return self.store.play_ids[self.selection[self.cursor]]
+
+    def select(self, formation=None, game_id=None):
+        """Restricts browsing to one formation and/or game, and shows the first play of the selection."""
+        selection = self.store.select(formation, game_id)
+        if len(selection) == 0:
+            print(f"No plays with formation={formation} and gameId={game_id}")
+            return self.fig
+        self.selection = selection
+        self.cursor = 0
+        return self._draw()
+
+    def show(self, play_id):
+        """Jumps to a play, clearing the selection if the play is not part of it."""
+        i = self.store.index_of(play_id)
+        matches = np.flatnonzero(self.selection == i)
+        if len(matches) == 0:
+            self.selection = np.arange(len(self.store))
+            matches = [i]
+        self.cursor = int(matches[0])
+        return self._draw()
+
+    def step(self, n=1):
+        self.cursor = (self.cursor + n) % len(self.selection)
+        return self._draw()
+
+    def next(self):
+        return self.step(1)
+
+    def previous(self):
+        return self.step(-1)
+
+    def random(self):
+        self.cursor = int(self.rng.integers(len(self.selection)))
+        return self._draw()
+
+    def connect(self):
+        self.fig.canvas.mpl_connect('key_press_event', self._on_key)
+        return self._draw()
+
+    def _on_key(self, event):
+        if event.key == 'right':
+            self.next()
+        elif event.key == 'left':
+            self.previous()
+        elif event.key == 'r':
+            self.random()
+        else:
+            return
+        self.fig.canvas.draw_idle()
+
+    def _draw(self):
+        i = self.selection[self.cursor]
+        formation = self.store.formations[i] if self.store.formations is not None else ""
+        title = f"{self.store.play_ids[i]} - Formation: {formation} ({self.cursor + 1}/{len(self.selection)})"
+        return self.renderer.draw(self.store.xy(i, canonical=self.zoomed), title)
@@ -0,0 +1,266 @@
+"""
+Lightweight stage timing for the formation pipeline.
+
+    with span("merge plays", rows=len(snap_data)) as s:
+        ...
+        s.set(rows_out=len(result))
+
+    @traced("build_play_tensor", rows=len)
+    def build_play_tensor(...): ...
+
+Each span records wall time, process CPU time, the RSS at its end, the peak RSS of the process so far and
+any counts passed to it. Tracing is off by default and a disabled span is a shared no-op object, so the
+instrumented code pays one attribute check. Turn it on with enable_tracing() or by setting
+FORMATION_TRACE_DIR: every process (including pool workers, which inherit the variable) then writes
+<dir>/trace_<pid>.json at exit, and merge_traces() combines them into one Chrome trace that opens in
+chrome://tracing or https://ui.perfetto.dev.
+"""
+import argparse
+import atexit
+import functools
+import glob
+import json
+import os
+import sys
+import threading
+import time
+
+TRACE_DIR_VARIABLE = "FORMATION_TRACE_DIR"
+
+
+def _rss_bytes():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return None
+
+
+def _peak_rss_bytes():
+    try:
+        import resource
+        # ru_maxrss is in KiB on Linux and in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        import psutil
+        memory = psutil.Process().memory_info()
+        # Windows reports the peak working set
+        return getattr(memory, "peak_wset", memory.rss)
+
+
+class _NoSpan:
+    """Returned by span() while tracing is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Span:
+    def __init__(self, tracer, name: str, attributes: dict):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        """Adds counts or labels known only after the work, e.g. the number of output rows."""
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        self.cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end_ns = time.perf_counter_ns()
+        rss = _rss_bytes()
+        args = {
+            'cpu_ms': (time.process_time() - self.cpu_start) * 1000,
+            'peak_rss_mb': _peak_rss_bytes() / 2 ** 20,
+            **({'rss_mb': rss / 2 ** 20} if rss is not None else {}),
+            **self.attributes,
+        }
+        if exc_type is not None:
+            args['error'] = exc_type.__name__
+        self.tracer.record(self.name, self.start_ns, end_ns, args)
+        return False
+
+
+class Tracer:
+    """Collects finished spans as Chrome trace "complete" events."""
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.output_dir = None
+        self._origin_ns = time.perf_counter_ns()
+        # Wall clock of the origin, so traces of several processes line up
+        self._origin_us = time.time_ns() // 1000
+        self._lock = threading.Lock()
+
+    def record(self, name, start_ns, end_ns, args):
+        event = {
+            'name': name,
+            'ph': 'X',
+            'ts': self._origin_us + (start_ns - self._origin_ns) / 1000,
+            'dur': (end_ns - start_ns) / 1000,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args,
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def write(self, path: str):
+        with self._lock:
+            events = list(self.events)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return path
+
+
+_TRACER = Tracer()
+
+
+def tracing_enabled() -> bool:
+    return _TRACER.enabled
+
+
+def _write_at_exit():
+    if _TRACER.enabled and _TRACER.output_dir and _TRACER.events:
+        _TRACER.write(os.path.join(_TRACER.output_dir, f"trace_{os.getpid()}.json"))
+
+
+def _write_at_worker_exit(*_):
+    from multiprocessing import util
+
+    # Forked pool workers leave through os._exit, which skips atexit but runs multiprocessing finalizers
+    util.Finalize(None, _write_at_exit, exitpriority=100)
+
+
+def enable_tracing(output_dir=None):
+    """
+    Starts recording spans. With `output_dir` the spans of this process are written to
+    <output_dir>/trace_<pid>.json at exit, and worker processes started afterwards trace there too.
+    """
+    _TRACER.enabled = True
+    if output_dir:
+        from multiprocessing import util
+
+        _TRACER.output_dir = output_dir
+        os.environ[TRACE_DIR_VARIABLE] = output_dir
+        atexit.register(_write_at_exit)
+        # Spawned workers enable tracing on import through the environment variable, forked ones here
+        util.register_after_fork(_TRACER, _write_at_worker_exit)
+
+
+def _forget_parent_spans():
+    # A forked child starts with a copy of the parent's spans, which the parent writes itself
+    _TRACER.events = []
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_parent_spans)
+
+
+def disable_tracing():
+    _TRACER.enabled = False
+    os.environ.pop(TRACE_DIR_VARIABLE, None)
+
+
+def enable_from_env():
+    """Enables tracing when FORMATION_TRACE_DIR is set, by a parent process that traces or by the user for a run."""
+    if os.environ.get(TRACE_DIR_VARIABLE):
+        enable_tracing(os.environ[TRACE_DIR_VARIABLE])
+
+
+def span(name: str, **attributes):
+    """Context manager timing the enclosed block. `attributes` (e.g. rows=...) are stored with it."""
+    if not _TRACER.enabled:
+        return _NO_SPAN
+    return Span(_TRACER, name, attributes)
+
+
+def traced(name=None, rows=None):
+    """
+    Decorator timing every call of a function. `rows` is applied to the return value to record its
+    size, e.g. rows=len.
+    """
+    def decorator(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _TRACER.enabled:
+                return fn(*args, **kwargs)
+            with Span(_TRACER, label, {}) as current:
+                result = fn(*args, **kwargs)
+                if rows is not None:
+                    current.set(rows=rows(result))
+                return result
+        return wrapper
+    return decorator
+
+
+def trace_events() -> list:
+    """The spans recorded by this process so far."""
+    return list(_TRACER.events)
+
+
+def write_trace(path: str):
+    """Writes the spans of this process as a Chrome trace JSON file."""
+    return _TRACER.write(path)
+
+
+def merge_traces(trace_dir: str, path=None) -> str:
+    """Combines the per-process trace_<pid>.json files of `trace_dir` into a single Chrome trace."""
+    events = []
+    for part in sorted(glob.glob(os.path.join(trace_dir, "trace_*.json"))):
+        with open(part) as f:
+            events.extend(json.load(f)['traceEvents'])
+    path = path or os.path.join(trace_dir, "trace.json")
+    with open(path, "w") as f:
+        json.dump({'traceEvents': sorted(events, key=lambda event: event['ts']), 'displayTimeUnit': 'ms'}, f)
+    return path
+
+
+def summarize_trace(path: str):
+    """Per span name: calls, total and mean wall time, CPU time and the highest peak RSS, as a DataFrame."""
+    import pandas as pd
+
+    with open(path) as f:
+        events = json.load(f)['traceEvents']
+    frame = pd.DataFrame([{'name': event['name'], 'wall_ms': event['dur'] / 1000, **event['args']}
+                          for event in events])
+    summary = frame.groupby('name').agg(calls=('wall_ms', 'size'), wall_ms=('wall_ms', 'sum'),
+                                        mean_ms=('wall_ms', 'mean'), cpu_ms=('cpu_ms', 'sum'),
+                                        peak_rss_mb=('peak_rss_mb', 'max'))
+    return summary.sort_values('wall_ms', ascending=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge the per-process traces of a run and summarize them")
+    parser.add_argument("trace_dir", help="Directory FORMATION_TRACE_DIR pointed to")
+    parser.add_argument("--output", default=None, help="Defaults to <trace_dir>/trace.json")
+    args = parser.parse_args()
+
+    path = merge_traces(args.trace_dir, args.output)
+    print(summarize_trace(path).to_string(float_format=lambda v: f"{v:.1f}"))
+    print(f"Chrome trace saved to: {path}")
+
+
+enable_from_env()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+KEY_COLUMNS = ['uniquePlayId', 'playDirection', 'offenseFormation']
+
+
+def benchmark_model(name, model, test: pd.DataFrame, single_queries=500):
+    """
+    Accuracy and log loss on `test` (a play_feature_frame with offenseFormation), per-play latency of
+    one-row predict_proba calls and throughput of one batch call. `model` needs `classes` and `predict_proba`.
+    """
+    labels = test['offenseFormation'].astype(str).to_numpy()
+    features = test.drop(columns=KEY_COLUMNS, errors='ignore')
+
+    start = time.perf_counter()
+    probabilities = model.predict_proba(features)
+    batch_seconds = time.perf_counter() - start
+
+    classes = np.asarray(model.classes).astype(str)
+    predictions = classes[probabilities.argmax(axis=1)]
+    class_index = {label: i for i, label in enumerate(classes)}
+    label_index = np.array([class_index.get(label, -1) for label in labels])
+    known = label_index >= 0
+    true_probabilities = np.where(known, probabilities[np.arange(len(labels)), label_index.clip(min=0)], 0.0)
+
+    latencies = []
+    for i in range(min(single_queries, len(features))):
+        play = features.iloc[i:i + 1]
+        start = time.perf_counter()
+        model.predict_proba(play)
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1000
+
+    return {
+        'model': name,
+        'accuracy': float((predictions == labels).mean()),
+        'logloss': float(np.mean(np.log(1.0 / np.clip(true_probabilities, 1e-15, 1.0)))),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'batch_plays_per_second': len(features) / batch_seconds if batch_seconds > 0 else None,
+    }
@@ -0,0 +1,203 @@
+"""
+Permutation invariant formation classifier over the 11 offensive players of a play.
+
+Every player is a token: a learned embedding of its position plus its canonical x, y and the sine and
+cosine of its orientation. Tokens go through a shared dense layer (DeepSets) and optional self-attention
+blocks without positional encodings, then are pooled with a masked mean and max. Shuffling the players
+of a play therefore never changes the prediction, and no slot or column order is learned.
+"""
+import json
+import os
+
+import keras
+import numpy as np
+import pandas as pd
+from keras import layers, ops
+
+from src.data_pipeline.play_features import PLAYERS_PER_PLAY, POSITION_SLOTS, POSITIONS
+
+FEATURES = ('x', 'y', 'o')
+# Canonical coordinates are yards from the C, mostly within +-25
+COORDINATE_SCALE = 10.0
+# x, y, sin(o), cos(o)
+TOKEN_FEATURES = 4
+
+
+def player_tokens(positions: np.ndarray, values: np.ndarray) -> dict:
+    """
+    Network inputs from (n_plays, 11) position codes (-1 = empty) and (n_plays, 11, 3) x, y, o values,
+    e.g. the arrays of a canonical PlayTensor. Position 0 marks an empty token.
+    """
+    x, y, o = (values[:, :, i] for i in range(3))
+    radians = np.deg2rad(o)
+    features = np.stack([x / COORDINATE_SCALE, y / COORDINATE_SCALE, np.sin(radians), np.cos(radians)], axis=-1)
+    return {
+        'position': (positions.astype(np.int32) + 1).clip(min=0),
+        'features': np.nan_to_num(features, nan=0.0).astype(np.float32),
+    }
+
+
+def slot_columns(slots=POSITION_SLOTS):
+    """play_feature_frame columns per feature of FEATURES, and the position code of every slot."""
+    names = [f"{position}{i + 1}" for position in POSITIONS for i in range(slots[position])]
+    codes = np.array([code for code, position in enumerate(POSITIONS) for _ in range(slots[position])])
+    return {feature: [f"{feature}_{name}" for name in names] for feature in FEATURES}, codes
+
+
+def tokens_from_frame(frame: pd.DataFrame, slots=POSITION_SLOTS) -> dict:
+    """
+    Network inputs from play_feature_frame columns (x_WR1, ...), so the model scores the same frames as
+    the other models. The filled slots of each play are packed into the first tokens.
+    """
+    columns, _ = slot_columns(slots)
+    wide = np.stack([frame.reindex(columns=columns[feature]).to_numpy(dtype=np.float32) for feature in FEATURES],
+                    axis=-1)
+    return tokens_from_slots(wide, slots)
+
+
+def tokens_from_slots(wide: np.ndarray, slots=POSITION_SLOTS) -> dict:
+    """Network inputs from a (n_plays, n_slots, 3) x, y, o slot array, e.g. a PlayBatches batch."""
+    _, codes = slot_columns(slots)
+    filled = ~np.isnan(wide[:, :, 0])
+    order = np.argsort(~filled, axis=1, kind='stable')[:, :PLAYERS_PER_PLAY]
+    present = np.take_along_axis(filled, order, axis=1)
+    positions = np.where(present, codes[order], -1)
+    values = np.take_along_axis(wide, order[:, :, None], axis=1)
+    return player_tokens(positions, values)
+
+
+class AugmentedTokens(keras.utils.PyDataset):
+    """
+    Network inputs and labels of the batches of a PlayBatches (augmentation.py) for model.fit(); every
+    epoch draws a new shuffle and new augmentations, only one batch is materialized at a time.
+    """
+
+    def __init__(self, batches, slots=POSITION_SLOTS, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = batches
+        self.slots = slots
+
+    def __len__(self):
+        return len(self.batches)
+
+    def __getitem__(self, i):
+        batch, labels = self.batches[i]
+        return tokens_from_slots(batch, self.slots), labels
+
+    def on_epoch_end(self):
+        self.batches.set_epoch(self.batches.epoch + 1)
+
+
+@keras.saving.register_keras_serializable(package="formation_net")
+class SetAttention(layers.Layer):
+    """Self-attention between the players of a play followed by a feed forward layer, both residual."""
+
+    def __init__(self, units=64, heads=4, dropout=0.1, **kwargs):
+        super().__init__(**kwargs)
+        self.units = units
+        self.heads = heads
+        self.dropout = dropout
+        self.attention = layers.MultiHeadAttention(num_heads=heads, key_dim=units // heads, dropout=dropout)
+        self.feed_forward = keras.Sequential([layers.Dense(units * 2, activation="relu"), layers.Dense(units)])
+        self.attention_norm = layers.LayerNormalization()
+        self.feed_forward_norm = layers.LayerNormalization()
+
+    def build(self, tokens_shape, position_shape=None):
+        # Sublayers are built here rather than on the first call, so a loaded model restores their weights directly
+        self.attention.build(tokens_shape, tokens_shape)
+        self.feed_forward.build(tokens_shape)
+        self.attention_norm.build(tokens_shape)
+        self.feed_forward_norm.build(tokens_shape)
+        super().build(tokens_shape)
+
+    def call(self, tokens, position, training=None):
+        # Empty tokens neither attend nor are attended to
+        present = ops.greater(position, 0)
+        pair_mask = ops.logical_and(ops.expand_dims(present, 1), ops.expand_dims(present, 2))
+        attended = self.attention(tokens, tokens, attention_mask=pair_mask, training=training)
+        tokens = self.attention_norm(tokens + attended)
+        return self.feed_forward_norm(tokens + self.feed_forward(tokens))
+
+    def get_config(self):
+        return {**super().get_config(), 'units': self.units, 'heads': self.heads, 'dropout': self.dropout}
+
+
+@keras.saving.register_keras_serializable(package="formation_net")
+class MaskedPooling(layers.Layer):
+    """Mean and max over the present tokens of every play."""
+
+    def call(self, tokens, position):
+        present = ops.cast(ops.expand_dims(ops.greater(position, 0), -1), tokens.dtype)
+        mean = ops.sum(tokens * present, axis=1) / ops.maximum(ops.sum(present, axis=1), 1.0)
+        maximum = ops.max(tokens * present - (1.0 - present) * 1e9, axis=1)
+        return ops.concatenate([mean, maximum], axis=-1)
+
+
+def build_formation_net(n_classes: int, units=64, embedding_dim=16, blocks=1, heads=4, dropout=0.1,
+                        learning_rate=1e-3) -> keras.Model:
+    """The compiled network. blocks=0 is a plain DeepSets model without attention."""
+    position = keras.Input(shape=(PLAYERS_PER_PLAY,), dtype="int32", name="position")
+    features = keras.Input(shape=(PLAYERS_PER_PLAY, TOKEN_FEATURES), name="features")
+
+    embedded = layers.Embedding(len(POSITIONS) + 1, embedding_dim)(position)
+    tokens = layers.Dense(units, activation="relu")(layers.Concatenate()([embedded, features]))
+    tokens = layers.Dense(units, activation="relu")(tokens)
+    for _ in range(blocks):
+        tokens = SetAttention(units, heads, dropout)(tokens, position)
+
+    hidden = layers.Dense(units, activation="relu")(MaskedPooling()(tokens, position))
+    hidden = layers.Dropout(dropout)(hidden)
+    outputs = layers.Dense(n_classes, activation="softmax", name="formation")(hidden)
+
+    model = keras.Model({'position': position, 'features': features}, outputs, name="formation_net")
+    model.compile(optimizer=keras.optimizers.Adam(learning_rate), loss="sparse_categorical_crossentropy",
+                  metrics=["accuracy"])
+    return model
+
+
+def _metadata_path(model_path: str) -> str:
+    return os.path.splitext(model_path)[0] + ".json"
+
+
+def save_formation_net(model: keras.Model, classes, model_path: str):
+    """Saves the network to a .keras file and its classes to a .json file next to it."""
+    model.save(model_path)
+    with open(_metadata_path(model_path), "w") as f:
+        json.dump({'classes': [str(label) for label in classes], 'features': list(FEATURES),
+                   'coordinate_scale': COORDINATE_SCALE}, f, indent=2)
+    return model_path
+
+
+class FormationNetModel:
+    """
+    A saved formation network for batched CPU inference, with the predict_proba() interface of the
+    other models. Batches are padded to a power of two (at most `batch_size`) so the compiled predict
+    function is only traced for a handful of shapes.
+    """
+
+    def __init__(self, model_path: str, batch_size=1024):
+        self.model = keras.saving.load_model(model_path)
+        with open(_metadata_path(model_path)) as f:
+            self.classes = json.load(f)['classes']
+        self.model_id = os.path.basename(model_path)
+        self.batch_size = batch_size
+        columns, _ = slot_columns()
+        self.feature_columns = [col for feature in FEATURES for col in columns[feature]]
+
+    def _predict_batch(self, inputs: dict) -> np.ndarray:
+        n = len(inputs['position'])
+        padded = min(1 << max(n - 1, 0).bit_length(), self.batch_size)
+        if padded > n:
+            inputs = {name: np.concatenate([values, np.zeros((padded - n,) + values.shape[1:], values.dtype)])
+                      for name, values in inputs.items()}
+        return np.asarray(self.model.predict_on_batch(inputs))[:n]
+
+    def predict_tokens(self, inputs: dict) -> np.ndarray:
+        """Class probabilities for player_tokens() inputs, scored in chunks of `batch_size` plays."""
+        n = len(inputs['position'])
+        chunks = [self._predict_batch({name: values[start:start + self.batch_size] for name, values in inputs.items()})
+                  for start in range(0, n, self.batch_size)]
+        return np.concatenate(chunks).astype(np.float64) if chunks else np.zeros((0, len(self.classes)))
+
+    def predict_proba(self, features: pd.DataFrame) -> np.ndarray:
+        return self.predict_tokens(tokens_from_frame(features))
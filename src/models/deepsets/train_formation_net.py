@@ -0,0 +1,113 @@
+"""
+Trains the permutation invariant formation network on the frozen split and compares its accuracy,
+single-play latency and batch throughput with other saved models on the test plays:
+
+    python -m src.models.deepsets.train_formation_net --model model_new/leader_portable.npz
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.feature_store import FEATURE_STORE_PATH, load_features
+from src.data_pipeline.play_features import build_play_tensor
+from src.models.benchmark import benchmark_model
+from src.models.training.split import SPLIT_PATH, apply_split, freeze_split
+from src.serving.models import load_formation_model
+
+SEED = 3245
+
+
+def split_rows(tensor, split: pd.DataFrame, classes):
+    """Tensor rows and labels per split name, for the labelled plays of a canonical PlayTensor."""
+    rows = pd.DataFrame({'uniquePlayId': tensor.play_ids, 'row': np.arange(len(tensor))})
+    encode = {label: i for i, label in enumerate(classes)}
+    labels = pd.Series(tensor.formations).astype(str).map(encode)
+
+    data = {}
+    for name, frame in apply_split(rows, split).items():
+        index = frame['row'].to_numpy()
+        index = index[labels.iloc[index].notna().to_numpy()]
+        data[name] = (index, labels.iloc[index].to_numpy(dtype=np.int32))
+    return data
+
+
+def split_tokens(tensor, split: pd.DataFrame, classes):
+    """Network inputs and labels per split name, for the plays of a canonical PlayTensor."""
+    from src.models.deepsets.formation_net import player_tokens
+
+    return {name: (player_tokens(tensor.positions[index], tensor.values[index]), labels)
+            for name, (index, labels) in split_rows(tensor, split, classes).items()}
+
+
+def train_formation_net(tensor, split: pd.DataFrame, model_path: str, epochs=40, batch_size=256, blocks=1,
+                        units=64, augment_passes=0):
+    """
+    Trains on the train plays with early stopping on val and saves the best weights to `model_path`.
+    With `augment_passes` every epoch adds that many mirrored/permuted passes of the train plays, generated
+    batch by batch.
+    """
+    import keras
+    from src.models.deepsets.formation_net import AugmentedTokens, build_formation_net, save_formation_net
+
+    keras.utils.set_random_seed(SEED)
+    classes = np.unique(pd.Series(tensor.formations).dropna().astype(str))
+    data = split_tokens(tensor, split, classes)
+
+    model = build_formation_net(len(classes), units=units, blocks=blocks)
+    callbacks = [keras.callbacks.EarlyStopping(patience=5, restore_best_weights=True)]
+    start = time.perf_counter()
+    if augment_passes:
+        from src.data_pipeline.augmentation import Augmentation, PlayBatches
+
+        index, labels = split_rows(tensor, split, classes)['train']
+        batches = PlayBatches(tensor.to_slots()[index], labels, batch_size=batch_size,
+                              augmentation=Augmentation(tensor.features), passes=augment_passes + 1, seed=SEED)
+        model.fit(AugmentedTokens(batches), validation_data=data['val'], epochs=epochs, verbose=2,
+                  callbacks=callbacks)
+    else:
+        model.fit(*data['train'], validation_data=data['val'], epochs=epochs, batch_size=batch_size, verbose=2,
+                  callbacks=callbacks)
+    print(f"Trained in {time.perf_counter() - start:.1f}s")
+    return save_formation_net(model, classes, model_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the set based formation network and benchmark it")
+    parser.add_argument("--features-path", default=FEATURE_STORE_PATH)
+    parser.add_argument("--split-path", default=SPLIT_PATH)
+    parser.add_argument("--output", default=os.path.join("training_runs", "formation_net", "formation_net.keras"))
+    parser.add_argument("--epochs", type=int, default=40)
+    parser.add_argument("--blocks", type=int, default=1, help="Self-attention blocks, 0 for plain DeepSets")
+    parser.add_argument("--units", type=int, default=64)
+    parser.add_argument("--augment-passes", type=int, default=0,
+                        help="Mirrored/permuted passes of the train plays added to every epoch")
+    parser.add_argument("--batch-size", type=int, default=1024, help="Inference batch size")
+    parser.add_argument("--model", action="append", default=[],
+                        help="Saved H2O model or portable .npz export to compare with, repeatable")
+    parser.add_argument("--single-queries", type=int, default=500)
+    args = parser.parse_args()
+
+    data = load_features(args.features_path, columns=['uniquePlayId', 'playDirection', 'x', 'y', 'o', 'position',
+                                                      'offenseFormation'])
+    # Plays that do not fit the slots are left out, so augmentation and the comparison see the same plays
+    tensor = build_play_tensor(data, features=('x', 'y', 'o'), canonical=True).fit_slots()
+    split = freeze_split(pd.Series(tensor.play_ids), args.split_path)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    model_path = train_formation_net(tensor, split, args.output, args.epochs, blocks=args.blocks, units=args.units,
+                                     augment_passes=args.augment_passes)
+
+    from src.models.deepsets.formation_net import FormationNetModel
+    test = apply_split(tensor.to_frame(), split)['test']
+    results = [benchmark_model("formation_net", FormationNetModel(model_path, batch_size=args.batch_size), test,
+                               args.single_queries)]
+    for path in args.model:
+        results.append(benchmark_model(path, load_formation_model(path), test, args.single_queries))
+    print(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
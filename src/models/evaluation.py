@@ -0,0 +1,315 @@
+"""
+Cached prediction matrices and vectorized evaluation of many formation models at once.
+
+Every model scores a split once: its (n_plays, n_classes) probability matrix is saved as
+<store>/<split>/<model_id>.npy next to the split's play keys and labels, so comparing models later
+never runs them again. evaluate() stacks the cached matrices into one (n_models, n_plays, n_classes)
+array and computes accuracy, log loss, Brier score, per-formation precision/recall/F1, confusion matrices,
+calibration (reliability bins and ECE) and one-vs-rest ROC AUC and average precision for all models
+together in NumPy:
+
+    python -m src.models.evaluation --models model_new/leader_portable.npz training_runs/xgboost/xgboost_model.json
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.play_container import play_keys_from_ids
+from src.models.benchmark import KEY_COLUMNS
+
+PREDICTION_STORE_DIR = os.path.join("resources", "cache", "predictions")
+
+
+class PredictionStore:
+    """
+    Probability matrices per split and model id. A split holds the packed play keys and label codes of
+    its plays; the columns of every matrix follow the split's classes, which only ever grow, so older
+    matrices lack the newest columns and are padded with zeros when read.
+    """
+
+    def __init__(self, root=PREDICTION_STORE_DIR):
+        self.root = root
+
+    def _dir(self, split: str) -> str:
+        return os.path.join(self.root, split)
+
+    def _meta(self, split: str) -> dict:
+        path = os.path.join(self._dir(split), "meta.json")
+        if not os.path.exists(path):
+            return {'classes': [], 'models': {}}
+        with open(path) as f:
+            return json.load(f)
+
+    def _save_meta(self, split: str, meta: dict):
+        path = os.path.join(self._dir(split), "meta.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def classes(self, split: str) -> list:
+        return self._meta(split)['classes']
+
+    def model_ids(self, split: str) -> list:
+        return list(self._meta(split)['models'])
+
+    def __contains__(self, key) -> bool:
+        model_id, split = key
+        return model_id in self._meta(split)['models']
+
+    def plays(self, split: str) -> np.ndarray:
+        return np.load(os.path.join(self._dir(split), "plays.npy"))
+
+    def labels(self, split: str) -> np.ndarray:
+        """Label codes into classes(split), one per play."""
+        return np.load(os.path.join(self._dir(split), "labels.npy"))
+
+    def save(self, model_id: str, split: str, probabilities: np.ndarray, classes, play_ids, labels):
+        """
+        Stores the probabilities of a model for the plays `play_ids` (uniquePlayId) with their true `labels`.
+        The first model saved for a split fixes its plays; later ones are reordered to them.
+        """
+        os.makedirs(self._dir(split), exist_ok=True)
+        meta = self._meta(split)
+        classes = [str(label) for label in classes]
+        labels = pd.Series(labels).astype(str).to_numpy()
+        meta['classes'] += sorted(set(classes).union(labels) - set(meta['classes']))
+        position = {label: i for i, label in enumerate(meta['classes'])}
+
+        keys = play_keys_from_ids(play_ids)
+        plays_path = os.path.join(self._dir(split), "plays.npy")
+        if os.path.exists(plays_path):
+            stored = np.load(plays_path)
+            order = np.argsort(keys)
+            found = order[np.searchsorted(keys, stored, sorter=order).clip(max=len(keys) - 1)]
+            if len(keys) != len(stored) or not np.array_equal(keys[found], stored):
+                raise ValueError(f"The plays scored by {model_id} are not the {len(stored)} plays of split '{split}'")
+        else:
+            order = np.argsort(keys, kind='stable')
+            found = order
+            np.save(plays_path, keys[order])
+        np.save(os.path.join(self._dir(split), "labels.npy"),
+                np.array([position[label] for label in labels[found]], dtype=np.int16))
+
+        matrix = np.zeros((len(keys), len(meta['classes'])), dtype=np.float32)
+        matrix[:, [position[label] for label in classes]] = np.asarray(probabilities)[found]
+        np.save(os.path.join(self._dir(split), f"{model_id}.npy"), matrix)
+        meta['models'][model_id] = {'saved': time.strftime("%Y-%m-%dT%H:%M:%S")}
+        self._save_meta(split, meta)
+
+    def load(self, model_id: str, split: str) -> np.ndarray:
+        """The (n_plays, n_classes) matrix of a model, memory-mapped unless it has to be padded."""
+        matrix = np.load(os.path.join(self._dir(split), f"{model_id}.npy"), mmap_mode='r')
+        missing = len(self.classes(split)) - matrix.shape[1]
+        return np.pad(matrix, ((0, 0), (0, missing))) if missing else matrix
+
+    def stack(self, split: str, model_ids=None) -> np.ndarray:
+        """(n_models, n_plays, n_classes) float32 matrices of `model_ids`, all cached models by default."""
+        model_ids = self.model_ids(split) if model_ids is None else list(model_ids)
+        stacked = np.empty((len(model_ids), len(self.plays(split)), len(self.classes(split))), dtype=np.float32)
+        for i, model_id in enumerate(model_ids):
+            stacked[i] = self.load(model_id, split)
+        return stacked
+
+    def score(self, model, frame: pd.DataFrame, split: str, model_id=None, refresh=False) -> np.ndarray:
+        """
+        Probabilities of `model` on `frame` (play_feature_frame columns with offenseFormation), read from the
+        store when this model already scored the split, otherwise computed once and stored.
+        """
+        model_id = model_id or model.model_id
+        if refresh or (model_id, split) not in self:
+            probabilities = model.predict_proba(frame.drop(columns=KEY_COLUMNS, errors='ignore'))
+            self.save(model_id, split, probabilities, model.classes, frame['uniquePlayId'], frame['offenseFormation'])
+        return self.load(model_id, split)
+
+
+def confusion_matrices(predictions: np.ndarray, labels: np.ndarray, n_classes: int) -> np.ndarray:
+    """(n_models, n_classes, n_classes) counts, rows are the true and columns the predicted formation."""
+    n_models = len(predictions)
+    cells = (np.arange(n_models)[:, None] * n_classes + labels) * n_classes + predictions
+    return np.bincount(cells.ravel(), minlength=n_models * n_classes * n_classes).reshape(
+        n_models, n_classes, n_classes)
+
+
+def calibration_bins(probabilities: np.ndarray, labels: np.ndarray, bins=10) -> dict:
+    """
+    Reliability of the top-class confidence: per model and bin the number of plays, their mean confidence
+    and accuracy, and the expected calibration error (count weighted gap between the two).
+    """
+    n_models, n_plays = probabilities.shape[:2]
+    confidence = probabilities.max(axis=2)
+    correct = probabilities.argmax(axis=2) == labels
+    cells = (np.arange(n_models)[:, None] * bins + np.minimum((confidence * bins).astype(np.int64), bins - 1)).ravel()
+
+    def per_bin(weights=None):
+        return np.bincount(cells, weights=weights, minlength=n_models * bins).reshape(n_models, bins)
+
+    counts = per_bin()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_confidence = per_bin(confidence.ravel()) / counts
+        accuracy = per_bin(correct.ravel()) / counts
+    ece = np.nansum(counts * np.abs(mean_confidence - accuracy), axis=1) / n_plays
+    return {'counts': counts, 'confidence': mean_confidence, 'accuracy': accuracy, 'ece': ece}
+
+
+def _last_of_ties(sorted_scores: np.ndarray) -> np.ndarray:
+    # Curve points are only taken where the score changes, tied plays are passed together
+    return np.concatenate([sorted_scores[:, 1:] != sorted_scores[:, :-1],
+                           np.ones((len(sorted_scores), 1), dtype=bool)], axis=1)
+
+
+def _previous_at(values: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    # Value at the previous valid point of non-decreasing `values`, 0 before the first one
+    kept = np.maximum.accumulate(np.where(valid, values, 0), axis=1)
+    return np.concatenate([np.zeros((len(values), 1)), kept[:, :-1]], axis=1)
+
+
+def ranking_scores(probabilities: np.ndarray, labels: np.ndarray) -> dict:
+    """
+    One-vs-rest ROC AUC and average precision per model and class, (n_models, n_classes) arrays with
+    NaN for classes that have no plays. Same tie handling as sklearn's roc_auc_score and
+    average_precision_score.
+    """
+    n_models, _, n_classes = probabilities.shape
+    roc_auc = np.full((n_models, n_classes), np.nan)
+    average_precision = np.full((n_models, n_classes), np.nan)
+    for c in range(n_classes):
+        positive = labels == c
+        n_positive = positive.sum()
+        if n_positive == 0 or n_positive == len(labels):
+            continue
+        order = np.argsort(-probabilities[:, :, c], axis=1, kind='stable')
+        scores = np.take_along_axis(probabilities[:, :, c], order, axis=1)
+        true_positives = np.cumsum(positive[order], axis=1)
+        false_positives = np.arange(1, len(labels) + 1) - true_positives
+        valid = _last_of_ties(scores)
+
+        tpr, fpr = true_positives / n_positive, false_positives / (len(labels) - n_positive)
+        tpr_before, fpr_before = _previous_at(tpr, valid), _previous_at(fpr, valid)
+        roc_auc[:, c] = np.sum(np.where(valid, (fpr - fpr_before) * (tpr + tpr_before) / 2, 0.0), axis=1)
+
+        precision = true_positives / np.arange(1, len(labels) + 1)
+        recall_step = tpr - tpr_before
+        average_precision[:, c] = np.sum(np.where(valid, recall_step * precision, 0.0), axis=1)
+    return {'roc_auc': roc_auc, 'average_precision': average_precision}
+
+
+def roc_pr_curves(probabilities: np.ndarray, labels: np.ndarray, class_index: int) -> dict:
+    """ROC (fpr, tpr) and precision-recall points of one model (an (n_plays, n_classes) matrix) and class."""
+    positive = labels == class_index
+    order = np.argsort(-probabilities[:, class_index], kind='stable')
+    scores = probabilities[order, class_index]
+    valid = _last_of_ties(scores[None])[0]
+    true_positives = np.cumsum(positive[order])[valid]
+    seen = np.arange(1, len(labels) + 1)[valid]
+    return {
+        'threshold': scores[valid],
+        'fpr': np.r_[0.0, (seen - true_positives) / max((~positive).sum(), 1)],
+        'tpr': np.r_[0.0, true_positives / max(positive.sum(), 1)],
+        'precision': true_positives / seen,
+        'recall': true_positives / max(positive.sum(), 1),
+    }
+
+
+def evaluate(store: PredictionStore, split="test", model_ids=None, bins=10) -> dict:
+    """
+    Metrics of every cached model of `split` (or of `model_ids`), computed together:
+
+    summary: one row per model with accuracy, logloss, brier, macro_f1, ece, roc_auc and average_precision
+             (the last two averaged over the formations present in the split)
+    f1, precision, recall, roc_auc, average_precision: model x formation DataFrames
+    confusion: (n_models, n_classes, n_classes) counts, calibration: the calibration_bins() arrays
+    """
+    model_ids = store.model_ids(split) if model_ids is None else list(model_ids)
+    classes = store.classes(split)
+    labels = store.labels(split).astype(np.int64)
+    probabilities = store.stack(split, model_ids)
+    n_models, n_plays, n_classes = probabilities.shape
+
+    predictions = probabilities.argmax(axis=2)
+    true_probability = probabilities[:, np.arange(n_plays), labels]
+    one_hot = np.eye(n_classes, dtype=np.float32)[labels]
+
+    confusion = confusion_matrices(predictions, labels, n_classes)
+    true_positives = np.diagonal(confusion, axis1=1, axis2=2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        precision = true_positives / confusion.sum(axis=1)
+        recall = true_positives / confusion.sum(axis=2)
+        f1 = 2 * true_positives / (confusion.sum(axis=1) + confusion.sum(axis=2))
+    present = np.bincount(labels, minlength=n_classes) > 0
+
+    calibration = calibration_bins(probabilities, labels, bins)
+    ranking = ranking_scores(probabilities, labels)
+
+    def per_class(values):
+        return pd.DataFrame(values, index=pd.Index(model_ids, name='model_id'), columns=classes)
+
+    summary = pd.DataFrame({
+        'model_id': model_ids,
+        'accuracy': (predictions == labels).mean(axis=1),
+        'logloss': -np.log(np.clip(true_probability, 1e-15, 1.0)).mean(axis=1),
+        'brier': ((probabilities - one_hot) ** 2).sum(axis=2).mean(axis=1),
+        'macro_f1': np.nan_to_num(f1[:, present]).mean(axis=1),
+        'ece': calibration['ece'],
+        'roc_auc': np.nanmean(ranking['roc_auc'], axis=1),
+        'average_precision': np.nanmean(ranking['average_precision'], axis=1),
+    }).sort_values('logloss', ignore_index=True)
+
+    return {
+        'summary': summary,
+        'classes': classes,
+        'f1': per_class(f1),
+        'precision': per_class(precision),
+        'recall': per_class(recall),
+        'roc_auc': per_class(ranking['roc_auc']),
+        'average_precision': per_class(ranking['average_precision']),
+        'confusion': confusion,
+        'calibration': calibration,
+    }
+
+
+def main():
+    from src.data_pipeline.feature_store import FEATURE_STORE_PATH, load_features
+    from src.data_pipeline.play_features import play_feature_frame
+    from src.models.training.split import SPLIT_PATH, apply_split, freeze_split
+    from src.serving.models import load_formation_model
+
+    parser = argparse.ArgumentParser(description="Score models into the prediction store once and compare them")
+    parser.add_argument("--models", nargs="*", default=[],
+                        help="Saved H2O models, portable .npz exports, .keras networks or XGBoost .json boosters")
+    parser.add_argument("--split", default="test", choices=["train", "val", "test"])
+    parser.add_argument("--store", default=PREDICTION_STORE_DIR)
+    parser.add_argument("--refresh", action="store_true", help="Score the models again even when cached")
+    parser.add_argument("--features-path", default=FEATURE_STORE_PATH)
+    parser.add_argument("--split-path", default=SPLIT_PATH)
+    args = parser.parse_args()
+
+    store = PredictionStore(args.store)
+    models = {}
+    for path in args.models:
+        model = load_formation_model(path)
+        models[getattr(model, 'model_id', None) or os.path.basename(path)] = model
+    unscored = {model_id: model for model_id, model in models.items()
+                if args.refresh or (model_id, args.split) not in store}
+    if unscored:
+        data = load_features(args.features_path, columns=['uniquePlayId', 'playDirection', 'x', 'y', 'o', 'position',
+                                                          'offenseFormation'])
+        data = play_feature_frame(data, features=('x', 'y', 'o'))
+        frame = apply_split(data, freeze_split(data['uniquePlayId'], args.split_path))[args.split]
+        frame = frame[frame['offenseFormation'].notna()]
+        for model_id, model in unscored.items():
+            store.score(model, frame, args.split, model_id, refresh=True)
+
+    start = time.perf_counter()
+    results = evaluate(store, args.split)
+    print(f"Evaluated {len(results['summary'])} models in {time.perf_counter() - start:.2f}s")
+    print(results['summary'].to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    print("\nF1 per formation")
+    print(results['f1'].to_string(float_format=lambda v: f"{v:.3f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+"""
+Checkpointed, resumable H2O AutoML runs on a cluster of local JVMs.
+
+The algorithm families are split into shards (e.g. GBM | XGBoost | DRF,GLM | DeepLearning). Every shard is an
+AutoML run of its own and trains in segments of `segment_secs`. After each segment its new models are saved
+with their cross-validation predictions, and the shard's progress is written to
+<checkpoint_dir>/<project_name>/<shard>/state.json. A crash or kill therefore loses at most one segment:
+running the same project_name again skips the finished shards and continues the others with the time they
+have left. Every model is also exported by AutoML as soon as it is trained (export_checkpoints_dir).
+
+All shards use the same fold column, so when they are done their models are loaded into one cloud and
+stacked (all models and best of family), as a single AutoML run would have, and ranked on one leaderboard.
+
+Shards run one after the other on a single cloud of `nodes` JVMs, or with --parallel-shards at the same
+time, each node being a single-JVM cloud of its own that takes every nodes-th shard:
+
+    python -m src.models.h2oAI.automl_runner --project-name formations --nodes 4 --parallel-shards
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.feature_store import FEATURE_STORE_PATH
+from src.instrumentation.spans import span
+from src.models.training.incremental import H2O_FAMILIES
+from src.models.training.split import SPLIT_PATH
+
+TARGET = 'offenseFormation'
+FOLD_COLUMN = 'fold'
+SEED = 3245
+
+DEFAULT_SHARDS = (('GBM',), ('XGBoost',), ('DRF', 'GLM'), ('DeepLearning',))
+# Families whose AutoML steps include a random grid search, the only steps worth repeating in later segments
+GRID_FAMILIES = ('GBM', 'XGBoost', 'DeepLearning')
+
+
+def h2o_jar_path() -> str:
+    import h2o
+    return os.path.join(os.path.dirname(h2o.__file__), "backend", "bin", "h2o.jar")
+
+
+class LocalCloud:
+    """
+    `nodes` h2o.jar JVMs on this host that form one H2O cloud through a flatfile. Node i listens on
+    base_port + 2 * i (H2O also takes the next port). Used as a context manager, the JVMs are stopped on exit.
+    """
+
+    def __init__(self, name: str, nodes=1, base_port=54321, nthreads=-1, max_mem_size="4G", log_dir="h2o_logs"):
+        self.name = name
+        self.nodes = nodes
+        self.ports = [base_port + 2 * i for i in range(nodes)]
+        self.nthreads = nthreads
+        self.max_mem_size = max_mem_size
+        self.log_dir = os.path.abspath(os.path.join(log_dir, name))
+        self.processes = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.ports[0]}"
+
+    def start(self, timeout=180):
+        from h2o.backend import H2OLocalServer
+
+        # Same lookup as h2o.init(): H2O_JAVA_HOME, PATH, then JAVA_HOME
+        java = H2OLocalServer._find_java()
+        os.makedirs(self.log_dir, exist_ok=True)
+        flatfile = os.path.join(self.log_dir, "flatfile.txt")
+        with open(flatfile, "w") as f:
+            f.writelines(f"127.0.0.1:{port}\n" for port in self.ports)
+
+        for i, port in enumerate(self.ports):
+            node_dir = os.path.join(self.log_dir, f"node_{i}")
+            os.makedirs(node_dir, exist_ok=True)
+            command = [java, f"-Xmx{self.max_mem_size}", "-jar", h2o_jar_path(), "-name", self.name,
+                       "-ip", "127.0.0.1", "-port", str(port), "-flatfile", flatfile, "-ice_root", node_dir,
+                       "-log_dir", node_dir, "-allow_unsupported_java"]
+            if self.nthreads > 0:
+                command += ["-nthreads", str(self.nthreads)]
+            with open(os.path.join(node_dir, "stdout.log"), "w") as out:
+                self.processes.append(subprocess.Popen(command, stdout=out, stderr=subprocess.STDOUT))
+
+        deadline = time.time() + timeout
+        while True:
+            if any(process.poll() is not None for process in self.processes):
+                self.stop()
+                # Usually a port still held by the JVMs of a killed run
+                raise RuntimeError(f"A node of H2O cloud {self.name} exited, see the logs in {self.log_dir}")
+            size = self.cloud_size()
+            if size == self.nodes:
+                print(f"H2O cloud {self.name} is up with {size} nodes at {self.url}")
+                return self
+            if time.time() > deadline:
+                self.stop()
+                raise RuntimeError(f"H2O cloud {self.name} did not form ({size} of {self.nodes} nodes), "
+                                   f"see the logs in {self.log_dir}")
+            time.sleep(2)
+
+    def cloud_size(self) -> int:
+        try:
+            with urllib.request.urlopen(f"{self.url}/3/Cloud", timeout=5) as response:
+                cloud = json.load(response)
+            # A node of an older run still holding the port belongs to another cloud
+            if cloud.get('cloud_name') != self.name or not cloud.get('consensus'):
+                return 0
+            return cloud['cloud_size']
+        except OSError:
+            return 0
+
+    def connect(self):
+        import h2o
+        h2o.connect(url=self.url, verbose=False)
+
+    def stop(self):
+        for process in self.processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.processes = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def fold_assignment(play_ids, nfolds: int) -> np.ndarray:
+    """Cross-validation fold of every play, a hash of its uniquePlayId so it is the same in every shard and run."""
+    hashes = pd.util.hash_pandas_object(pd.Series(play_ids).astype(str), index=False).to_numpy()
+    return (hashes % np.uint64(nfolds)).astype(np.int32)
+
+
+def load_frames(paths: dict, nfolds: int):
+    """
+    H2O frames of the frozen split: AutoML cross-validates on train + val with the fold column, test is
+    held out. Returns (training frame, test frame, predictor columns).
+    """
+    import h2o
+
+    train = pd.concat([pd.read_parquet(paths['train']), pd.read_parquet(paths['val'])], ignore_index=True)
+    test = pd.read_parquet(paths['test'])
+    train[FOLD_COLUMN] = fold_assignment(train['uniquePlayId'], nfolds)
+
+    x = [col for col in train.columns if col not in ('uniquePlayId', 'playDirection', TARGET, FOLD_COLUMN)]
+    column_types = {**{col: "real" for col in x}, TARGET: "enum"}
+    with span("h2o.H2OFrame", rows=len(train)):
+        training_frame = h2o.H2OFrame(train.drop(columns=['uniquePlayId', 'playDirection']),
+                                      column_types={**column_types, FOLD_COLUMN: "int"})
+    test_frame = h2o.H2OFrame(test.drop(columns=['uniquePlayId', 'playDirection']), column_types=column_types)
+    return training_frame, test_frame, x
+
+
+def shard_name(families) -> str:
+    return "_".join(families)
+
+
+def _read_json(path: str, default=None):
+    if not os.path.exists(path):
+        return default
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_json(path: str, data):
+    # Written to a temporary file first, so a kill never leaves a half written checkpoint
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def run_shard(project_dir: str, families, training_frame, x, budget: float, segment_secs=900, seed=SEED):
+    """
+    Trains the AutoML run of one shard until its `budget` seconds are used up, segment by segment, and
+    checkpoints after every segment. Resumes from the shard's state.json when there is one.
+    """
+    import h2o
+    from h2o.automl import H2OAutoML
+
+    name = shard_name(families)
+    shard_dir = os.path.join(project_dir, name)
+    state_path = os.path.join(shard_dir, "state.json")
+    os.makedirs(shard_dir, exist_ok=True)
+    state = _read_json(state_path, {'families': list(families), 'budget': budget, 'used': 0.0, 'segments': 0,
+                                    'models': {}, 'done': False})
+    if state['done']:
+        print(f"Shard {name} already finished with {len(state['models'])} models")
+        return state
+    if state['segments']:
+        print(f"Resuming shard {name} after {state['segments']} segments, {state['budget'] - state['used']:.0f}s left")
+
+    while state['budget'] - state['used'] >= 1:
+        seconds = min(segment_secs, state['budget'] - state['used'])
+        plan = None
+        if state['models']:
+            # The default models came with the first segment that trained anything, later ones only add grid models
+            plan = [(family, 'grids') for family in families if family in GRID_FAMILIES]
+            if not plan:
+                break
+        aml = H2OAutoML(max_runtime_secs=int(math.ceil(seconds)), seed=seed + state['segments'],
+                        project_name=f"{os.path.basename(project_dir)}_{name}_{state['segments']}",
+                        sort_metric="logloss", include_algos=None if plan else list(families), modeling_plan=plan,
+                        keep_cross_validation_predictions=True,
+                        export_checkpoints_dir=os.path.join(shard_dir, "exported"))
+        start = time.perf_counter()
+        with span("aml.train", shard=name, segment=state['segments'], rows=training_frame.nrows):
+            aml.train(x=x, y=TARGET, training_frame=training_frame, fold_column=FOLD_COLUMN)
+
+        models_dir = os.path.join(shard_dir, "models")
+        new_models = [model_id for model_id in aml.leaderboard.as_data_frame()['model_id']
+                      if model_id not in state['models']]
+        for model_id in new_models:
+            state['models'][model_id] = h2o.save_model(h2o.get_model(model_id), path=models_dir, force=True,
+                                                       export_cross_validation_predictions=True)
+        state['used'] += time.perf_counter() - start
+        state['segments'] += 1
+        _write_json(state_path, state)
+        print(f"Shard {name}: segment {state['segments']} done, {len(state['models'])} models saved, "
+              f"{max(state['budget'] - state['used'], 0):.0f}s left")
+        if not new_models:
+            # Nothing left to search (or the families cannot train on this cloud), more segments would not help
+            print(f"Shard {name}: segment {state['segments']} trained no new models, stopping the shard")
+            break
+
+    state['done'] = True
+    _write_json(state_path, state)
+    return state
+
+
+def available_shards(project_dir: str, shards) -> list:
+    """
+    The shards that can train on the connected cloud. Without XGBoost on the cloud, shards of XGBoost only
+    are dropped unless an earlier run already saved models for them.
+    """
+    from h2o.estimators import H2OXGBoostEstimator
+
+    if H2OXGBoostEstimator.available():
+        return list(shards)
+    available = []
+    for families in shards:
+        state = _read_json(os.path.join(project_dir, shard_name(families), "state.json"), {'models': {}})
+        if set(families) == {'XGBoost'} and not state['models']:
+            print(f"XGBoost is not available on this cloud, skipping shard {shard_name(families)}")
+        else:
+            available.append(families)
+    return available
+
+
+def _run_shards(job):
+    """Runs a list of shards on one cloud, in a worker process when shards run in parallel."""
+    import h2o
+
+    if job.get('url'):
+        h2o.connect(url=job['url'], verbose=False)
+    training_frame, _, x = load_frames(job['paths'], job['nfolds'])
+    return [run_shard(job['project_dir'], families, training_frame, x, job['budget'], job['segment_secs'],
+                      job['seed'])
+            for families in job['shards']]
+
+
+def _family(model_id: str) -> str:
+    return next((name for prefix, name in H2O_FAMILIES.items() if model_id.startswith(prefix)), 'Other')
+
+
+def stack_shards(project_dir: str, shards, training_frame, x, seed=SEED):
+    """
+    Loads the saved models of every shard and trains the AllModels and BestOfFamily stacked ensembles on
+    them. Returns the leaderboard frame (cross-validation metrics) and the models by id.
+    """
+    import h2o
+    from h2o.estimators import H2OStackedEnsembleEstimator
+
+    models = {}
+    for families in shards:
+        state = _read_json(os.path.join(project_dir, shard_name(families), "state.json"))
+        for model_id, path in state['models'].items():
+            models[model_id] = h2o.load_model(path)
+
+    if not models:
+        raise RuntimeError(f"The shards of {project_dir} did not train any model, increase the time limit")
+    metrics = pd.DataFrame({'model_id': list(models),
+                            'logloss': [model.logloss(xval=True) for model in models.values()]})
+    metrics['family'] = metrics['model_id'].map(_family)
+    best_of_family = metrics.sort_values('logloss').groupby('family').head(1)['model_id'].tolist()
+
+    project = os.path.basename(project_dir)
+    for name, base_models in (('AllModels', list(models)), ('BestOfFamily', best_of_family)):
+        if len(base_models) < 2:
+            continue
+        # Cross-validating the metalearner on the same folds gives the ensembles comparable xval metrics
+        ensemble = H2OStackedEnsembleEstimator(model_id=f"StackedEnsemble_{name}_{project}",
+                                               base_models=base_models, metalearner_fold_column=FOLD_COLUMN,
+                                               seed=seed)
+        with span("stacked_ensemble", ensemble=name, models=len(base_models)):
+            ensemble.train(x=x, y=TARGET, training_frame=training_frame)
+        models[ensemble.model_id] = ensemble
+
+    leaderboard = h2o.make_leaderboard(list(models.values()), sort_metric="logloss", scoring_data="xval")
+    return leaderboard.as_data_frame(), models
+
+
+def run_automl(project_name: str, checkpoint_dir=os.path.join("training_runs", "h2o_automl"), shards=DEFAULT_SHARDS,
+               nodes=1, parallel_shards=False, time_limit=10_000, segment_secs=900, nfolds=10,
+               max_mem_size="4G", cpus=None, base_port=54321, features_path=FEATURE_STORE_PATH,
+               split_path=SPLIT_PATH, seed=SEED, model_dir="model_new") -> pd.DataFrame:
+    """
+    Trains (or resumes) the AutoML project `project_name` and saves its leader to `model_dir`.
+    `time_limit` is the wall-clock budget of the shard search, split evenly over the shards that share a cloud.
+    Returns the combined leaderboard, which is also written to <checkpoint_dir>/<project_name>/leaderboard.csv.
+    """
+    import h2o
+    from src.models.training.orchestrator import prepare_split_data
+
+    project_dir = os.path.join(checkpoint_dir, project_name)
+    os.makedirs(project_dir, exist_ok=True)
+    shards = [tuple(families) for families in shards]
+    settings = {'shards': [list(families) for families in shards], 'nfolds': nfolds, 'seed': seed}
+    manifest_path = os.path.join(project_dir, "manifest.json")
+    previous = _read_json(manifest_path)
+    if previous is not None and previous != settings:
+        raise ValueError(f"Project {project_name} was started with {previous}, not {settings}. "
+                         f"Use the same settings to resume it or a new project name")
+    _write_json(manifest_path, settings)
+
+    paths = prepare_split_data(features_path, split_path, project_dir)
+    nthreads = max(1, (cpus or os.cpu_count()) // nodes)
+    log_dir = os.path.join(project_dir, "logs")
+    if parallel_shards:
+        # One single-JVM cloud per node, each driven by its own worker process (the h2o client is per process)
+        clouds = [LocalCloud(f"{project_name}_{i}", 1, base_port + 2 * i, nthreads, max_mem_size, log_dir)
+                  for i in range(nodes)]
+    else:
+        clouds = [LocalCloud(project_name, nodes, base_port, nthreads, max_mem_size, log_dir)]
+
+    start = time.perf_counter()
+    started = []
+    try:
+        for cloud in clouds:
+            started.append(cloud.start())
+        # The first cloud checks which shards can train and is reused for the ensembles
+        cloud = started[0]
+        cloud.connect()
+        shards = available_shards(project_dir, shards)
+        if not shards:
+            raise RuntimeError(f"None of the shards of {project_name} can train on this cloud")
+        budget = time_limit / math.ceil(len(shards) / len(started))
+
+        if parallel_shards:
+            jobs = [{'url': node.url, 'paths': paths, 'nfolds': nfolds, 'project_dir': project_dir,
+                     'shards': shards[i::nodes], 'budget': budget, 'segment_secs': segment_secs, 'seed': seed}
+                    for i, node in enumerate(started)]
+            with ProcessPoolExecutor(max_workers=nodes, mp_context=get_context("spawn")) as pool:
+                list(pool.map(_run_shards, jobs))
+            for node in started[1:]:
+                node.stop()
+            # Frames and models of the shard workers, the models are loaded again from their checkpoints
+            h2o.remove_all()
+        training_frame, test_frame, x = load_frames(paths, nfolds)
+        if not parallel_shards:
+            for families in shards:
+                run_shard(project_dir, families, training_frame, x, budget, segment_secs, seed)
+        print(f"Shards finished in {time.perf_counter() - start:.0f}s, stacking their models")
+
+        leaderboard, models = stack_shards(project_dir, shards, training_frame, x, seed)
+        leaderboard.to_csv(os.path.join(project_dir, "leaderboard.csv"), index=False)
+        print(leaderboard.head(20).to_string(index=False))
+
+        leader = models[leaderboard['model_id'].iloc[0]]
+        print(leader.model_performance(test_data=test_frame))
+        model_path = h2o.save_model(model=leader, path=model_dir, force=True)
+        print("Model saved to: ", model_path)
+    finally:
+        for cloud in started:
+            cloud.stop()
+    return leaderboard
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checkpointed, resumable H2O AutoML on a local multi-JVM cluster")
+    parser.add_argument("--project-name", required=True, help="Runs with the same name resume each other")
+    parser.add_argument("--checkpoint-dir", default=os.path.join("training_runs", "h2o_automl"))
+    parser.add_argument("--shards", nargs="+", default=[",".join(families) for families in DEFAULT_SHARDS],
+                        help="Algorithm families per shard, comma separated, e.g. GBM XGBoost DRF,GLM DeepLearning")
+    parser.add_argument("--nodes", type=int, default=1, help="JVMs to start on this host")
+    parser.add_argument("--parallel-shards", action="store_true",
+                        help="Run the shards in parallel, one single-JVM cloud per node, instead of one cloud")
+    parser.add_argument("--time-limit", type=int, default=10_000, help="Wall-clock seconds of the shard search")
+    parser.add_argument("--segment-secs", type=int, default=900, help="AutoML seconds between two checkpoints")
+    parser.add_argument("--nfolds", type=int, default=10)
+    parser.add_argument("--max-mem-size", default="4G", help="Heap of every JVM")
+    parser.add_argument("--cpus", type=int, default=None, help="Cores shared by the JVMs, default all")
+    parser.add_argument("--base-port", type=int, default=54321)
+    parser.add_argument("--features-path", default=FEATURE_STORE_PATH)
+    parser.add_argument("--split-path", default=SPLIT_PATH)
+    parser.add_argument("--model-dir", default="model_new")
+    args = parser.parse_args()
+
+    run_automl(args.project_name, args.checkpoint_dir, [shard.split(",") for shard in args.shards], args.nodes,
+               args.parallel_shards, args.time_limit, args.segment_secs, args.nfolds, args.max_mem_size, args.cpus,
+               args.base_port, args.features_path, args.split_path, model_dir=args.model_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,30 +2,19 @@ import pandas as pd
 import numpy as np
 import h2o
 from h2o.automl import H2OAutoML
+from src.data_pipeline.feature_store import load_features
+from src.data_pipeline.play_features import play_feature_frame
+from src.models.training.split import apply_split, freeze_split
+from src.models.portable.export_h2o import export_h2o
+from src.models.portable.scorer import PortableModel
+from src.models.portable.verify import verify_artifact
+from src.instrumentation.spans import span
 
-# Load the dataset
-data = pd.read_csv("reduced_data.csv")
+# Load the dataset (run from the repository root so the feature store path resolves)
+data = load_features(columns=['uniquePlayId', 'playDirection', 'x', 'y', 'o', 'position', 'offenseFormation'])
 
-def aggregate_play(df):
-    """
-    Aggregates the data for each play, pivoting the table so that each row represents a single play
-    and contains the x, y, o, and position data for each player.
-    """
-    # Select the columns we need
-    df = df[['uniquePlayId', 'playDirection', 'x', 'y', 'o', 'position', 'offenseFormation']]
-
-    # Pivot the table using a multi-index
-    df_pivot = df.pivot_table(index=['uniquePlayId', 'playDirection', 'offenseFormation'], columns='position', values=['x', 'y', 'o'])
-
-    # Flatten the multi-level column index
-    df_pivot.columns = ['_'.join(col).strip() for col in df_pivot.columns.values]
-
-    # Reset index to make 'uniquePlayId' a regular column
-    df_pivot = df_pivot.reset_index()
-
-    return df_pivot
-
-data = aggregate_play(data)
+# One row per play, with a column per feature and position slot (x_WR1, x_WR2, ...)
+data = play_feature_frame(data, features=('x', 'y', 'o'))
 
 # Print the first few rows of the aggregated data
 print(data.head())
@@ -40,7 +29,8 @@ h2o_config = {
 h2o.init(**h2o_config)
 
 # Convert pandas DataFrame to H2O Frame
-h2o_df = h2o.H2OFrame(data)
+with span("h2o.H2OFrame", rows=len(data)):
+    h2o_df = h2o.H2OFrame(data)
 
 # Identify target and predictor columns
 y = "offenseFormation"
@@ -49,8 +39,11 @@ x.remove(y)
 x.remove("uniquePlayId") # Remove uniquePlayId as it is only used to group rows.
 x.remove("playDirection") # Remove playDirection as it is a categorical value that might confuse the data.
 
-# Split data into training and testing sets
-train, test = h2o_df.split_frame(ratios=[0.8], seed=3245)
+# Split data into training and testing sets with the frozen play split shared by all frameworks.
+# AutoML cross-validates, so it trains on train + val and the test plays are never seen.
+splits = apply_split(data, freeze_split(data['uniquePlayId']))
+train = h2o.H2OFrame(pd.concat([splits['train'], splits['val']]), column_types=h2o_df.types)
+test = h2o.H2OFrame(splits['test'], column_types=h2o_df.types)
 
 # Configure AutoML
 aml = H2OAutoML(max_runtime_secs=10_000, # Run for 1 hour (adjust as needed)
@@ -61,8 +54,9 @@ aml = H2OAutoML(max_runtime_secs=10_000, # Run for 1 hour (adjust as needed)
                 # include_algos = ["XGBoost", "StackedEnsemble"],
                 )
 
-# Train the model
-aml.train(x=x, y=y, training_frame=train)
+# Train the model (timed as the "aml.train" span when FORMATION_TRACE_DIR is set)
+with span("aml.train", rows=train.nrows):
+    aml.train(x=x, y=y, training_frame=train)
 
 # View the AutoML Leaderboard
 lb = aml.leaderboard
@@ -79,6 +73,16 @@ best_model = aml.leader
 model_path = h2o.save_model(model=best_model, path="./model_new", force=True)
 print("Model saved to: ", model_path)
 
+# Export a JVM-free copy of the leader and check it against the H2O predictions on the test set
+try:
+    portable_path = export_h2o(best_model, "./model_new/leader_portable.npz", training_frame=train)
+    portable_model = PortableModel(portable_path)
+    expected = best_model.predict(test).as_data_frame()[portable_model.classes].to_numpy()
+    check = verify_artifact(portable_path, test.as_data_frame(), expected)
+    print("Portable model saved to: ", portable_path, check)
+except (ValueError, AssertionError) as e:
+    print(f"Could not export a portable copy of {best_model.model_id}: {e}")
+
 # Shutdown H2O cluster
 h2o.cluster().shutdown()
 
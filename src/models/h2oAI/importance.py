@@ -0,0 +1,144 @@
+import json
+import os
+
+import pandas as pd
+
+# Analysis results of a model are cached here, one directory per model id
+IMPORTANCE_CACHE_DIR = os.path.join("resources", "cache", "varimp")
+
+# Parameters written to model_architectures.txt
+ARCHITECTURE_PARAMS = ['ntrees', 'max_depth', 'learn_rate', 'min_rows', 'sample_rate', 'col_sample_rate']
+
+
+def _base_model_outputs(model_ids):
+    """
+    Raw JSON output of every base model, straight from the REST API. Unlike h2o.get_model this builds
+    no client side model objects, so it costs one small request per model.
+    """
+    import h2o
+
+    outputs = {}
+    for model_id in model_ids:
+        outputs[model_id] = h2o.api(f"GET /3/Models/{model_id}")['models'][0]
+    return outputs
+
+
+def base_model_varimp(model_ids) -> tuple:
+    """
+    Variable importances of all base models as one long frame (model_id, algo, variable,
+    relative_importance, scaled_importance, percentage), and the base model parameters.
+    Models without variable importances (e.g. a GLM with all coefficients dropped) are reported and skipped.
+    """
+    frames = []
+    params = []
+    for model_id, model_json in _base_model_outputs(model_ids).items():
+        params.append({
+            'model_id': model_id,
+            'algo': model_json['algo'],
+            **{p['name']: str(p['actual_value']) for p in model_json['parameters'] if p['name'] in ARCHITECTURE_PARAMS},
+        })
+        table = model_json['output'].get('variable_importances')
+        if table is None:
+            print(f"Model {model_id} has no variable importances")
+            continue
+        frame = pd.DataFrame(table.cell_values, columns=table.col_header)
+        frames.append(frame.assign(model_id=model_id, algo=model_json['algo']))
+
+    columns = ['model_id', 'algo', 'variable', 'relative_importance', 'scaled_importance', 'percentage']
+    varimp = pd.concat(frames, ignore_index=True)[columns] if frames else pd.DataFrame(columns=columns)
+    return varimp, pd.DataFrame(params)
+
+
+def metalearner_weights(ensemble) -> pd.Series:
+    """
+    Share of the metalearner attributed to each base model: the sum of the absolute standardized GLM
+    coefficients over its "<base model>/<class>" inputs and every class, normalized to sum to 1.
+    Base models the metalearner dropped get 0. Non GLM metalearners give equal weights.
+    """
+    base_ids = list(ensemble.base_models)
+    metalearner = ensemble.metalearner()
+    if metalearner.algo != "glm":
+        print(f"Metalearner of {ensemble.model_id} is a {metalearner.algo}, base models are weighted equally")
+        return pd.Series(1.0 / len(base_ids), index=base_ids, name='weight')
+
+    coefficients = pd.DataFrame(metalearner.coef_norm()).drop(index='Intercept', errors='ignore')
+    per_model = coefficients.abs().sum(axis=1).groupby(lambda name: name.rsplit('/', 1)[0]).sum()
+    per_model = per_model.reindex(base_ids, fill_value=0.0)
+    total = per_model.sum()
+    weights = per_model / total if total > 0 else pd.Series(1.0 / len(base_ids), index=base_ids)
+    return weights.rename('weight')
+
+
+def aggregate_varimp(varimp: pd.DataFrame, weights: pd.Series = None) -> pd.DataFrame:
+    """
+    One row per variable, aggregated over the base models with a single groupby:
+      relative_importance  mean over the models that report the variable (the original simple average)
+      mean_percentage      mean share of each model's total importance, 0 for models without the variable
+      weighted_importance  the same shares weighted by the metalearner weights of the models
+    """
+    n_models = varimp['model_id'].nunique()
+    if weights is None:
+        weights = pd.Series(1.0, index=varimp['model_id'].unique())
+    weights = weights / weights.sum() if weights.sum() > 0 else weights
+
+    varimp = varimp.assign(weighted=varimp['percentage'] * varimp['model_id'].map(weights).fillna(0.0).to_numpy())
+    grouped = varimp.groupby('variable', sort=False).agg(
+        relative_importance=('relative_importance', 'mean'),
+        percentage_sum=('percentage', 'sum'),
+        weighted_importance=('weighted', 'sum'),
+        n_models=('model_id', 'nunique'),
+    )
+    grouped['mean_percentage'] = grouped.pop('percentage_sum') / max(n_models, 1)
+    return grouped.reset_index().sort_values('relative_importance', ascending=False, ignore_index=True)
+
+
+def _cache_path(model_id, cache_dir):
+    return os.path.join(cache_dir, model_id)
+
+
+def load_cached_analysis(model_id: str, cache_dir=IMPORTANCE_CACHE_DIR):
+    """The cached analysis of `model_id`, or None. Reading it needs no H2O cluster."""
+    path = _cache_path(model_id, cache_dir)
+    if not os.path.exists(os.path.join(path, "summary.json")):
+        return None
+    with open(os.path.join(path, "summary.json")) as f:
+        analysis = json.load(f)
+    for name in ('varimp', 'weights', 'params'):
+        analysis[name] = pd.read_parquet(os.path.join(path, f"{name}.parquet"))
+    analysis['weights'] = analysis['weights'].set_index('model_id')['weight']
+    return analysis
+
+
+def analyze_ensemble(ensemble, test_frame=None, cache_dir=IMPORTANCE_CACHE_DIR, refresh=False) -> dict:
+    """
+    Base model variable importances, metalearner weights, base model parameters and (when `test_frame`
+    is given) the test metrics of a stacked ensemble, cached on disk under its model id.
+    A cached analysis is returned as is unless `refresh`, so the test set is only scored once per model.
+    """
+    if not refresh:
+        cached = load_cached_analysis(ensemble.model_id, cache_dir)
+        if cached is not None:
+            return cached
+
+    varimp, params = base_model_varimp(ensemble.base_models)
+    weights = metalearner_weights(ensemble)
+    analysis = {'model_id': ensemble.model_id, 'metrics': None}
+    if test_frame is not None:
+        perf = ensemble.model_performance(test_data=test_frame)
+        analysis['metrics'] = {'logloss': perf.logloss(), 'mean_per_class_error': perf.mean_per_class_error(),
+                               'rmse': perf.rmse()}
+
+    path = _cache_path(ensemble.model_id, cache_dir)
+    os.makedirs(path, exist_ok=True)
+    varimp.to_parquet(os.path.join(path, "varimp.parquet"), index=False)
+    weights.rename_axis('model_id').reset_index().to_parquet(os.path.join(path, "weights.parquet"), index=False)
+    params.to_parquet(os.path.join(path, "params.parquet"), index=False)
+    with open(os.path.join(path, "summary.json"), "w") as f:
+        json.dump(analysis, f, indent=2)
+
+    return {**analysis, 'varimp': varimp, 'weights': weights, 'params': params}
+
+
+def analysis_model_id(model_path: str) -> str:
+    """h2o.save_model writes a model to a file named after its model id."""
+    return os.path.basename(os.path.normpath(model_path))
@@ -1,109 +1,62 @@
 import pandas as pd
-import numpy as np
-import h2o
 import matplotlib.pyplot as plt
 import seaborn as sns
+from src.data_pipeline.feature_store import load_features
+from src.data_pipeline.play_features import play_feature_frame
+from src.models.h2oAI.importance import (ARCHITECTURE_PARAMS, aggregate_varimp, analysis_model_id, analyze_ensemble,
+                                         load_cached_analysis)
+from src.models.training.split import apply_split, freeze_split
 
 # --- Configuration ---
 FILE_FORMAT = "jpg"  # Choose "pdf" or "jpg"
 OUTPUT_DIR = "./plots"  # Directory to save the plots
+REFRESH_ANALYSIS = False  # Set to True to recompute the cached variable importances and test metrics
 
 import os
 if not os.path.exists(OUTPUT_DIR):
     os.makedirs(OUTPUT_DIR)
 
-# Load the dataset
-data = pd.read_csv("reduced_data.csv")
-
-def aggregate_play(df):
-    """
-    Aggregates the data for each play, pivoting the table so that each row represents a single play
-    and contains the x, y, o, and position data for each player.
-    """
-    # Select the columns we need
-    df = df[['uniquePlayId', 'playDirection', 'x', 'y', 'o', 'position', 'offenseFormation']]
-
-    # Pivot the table using a multi-index
-    df_pivot = df.pivot_table(index=['uniquePlayId', 'playDirection', 'offenseFormation'], columns='position', values=['x', 'y', 'o'])
-
-    # Flatten the multi-level column index
-    df_pivot.columns = ['_'.join(col).strip() for col in df_pivot.columns.values]
+# Load the previously saved model
+model_path = "C:/Users/quort/OneDrive/Desktop/coding/model/StackedEnsemble_BestOfFamily_4_AutoML_1_20250321_14016"  # YOUR MODEL PATH
 
-    # Reset index to make 'uniquePlayId' a regular column
-    df_pivot = df_pivot.reset_index()
+# Variable importances, metalearner weights and test metrics are cached per model id (resources/cache/varimp),
+# so once a model has been analyzed the plots are regenerated without starting H2O or scoring the test set again
+analysis = None if REFRESH_ANALYSIS else load_cached_analysis(analysis_model_id(model_path))
 
-    return df_pivot
+if analysis is None:
+    import h2o
 
-data = aggregate_play(data)
+    # Load the dataset (run from the repository root so the feature store path resolves)
+    data = load_features(columns=['uniquePlayId', 'playDirection', 'x', 'y', 'o', 'position', 'offenseFormation'])
 
-# Configure H2O
-h2o_config = {
-    "nthreads": -1,  # Use all available CPU threads
-    "max_mem_size": "16G",  # Adjust based on your RAM
-}
+    # One row per play, with a column per feature and position slot (x_WR1, x_WR2, ...)
+    data = play_feature_frame(data, features=('x', 'y', 'o'))
 
-# Initialize H2O
-h2o.init(**h2o_config)
+    # Configure H2O
+    h2o_config = {
+        "nthreads": -1,  # Use all available CPU threads
+        "max_mem_size": "16G",  # Adjust based on your RAM
+    }
 
-# Load the previously saved model
-model_path = "C:/Users/quort/OneDrive/Desktop/coding/model/StackedEnsemble_BestOfFamily_4_AutoML_1_20250321_14016"  # YOUR MODEL PATH
-best_model = h2o.load_model(model_path)
+    # Initialize H2O
+    h2o.init(**h2o_config)
+    best_model = h2o.load_model(model_path)
 
-# Convert pandas DataFrame to H2O Frame
-h2o_df = h2o.H2OFrame(data)
+    # Evaluate on the test plays of the frozen split the model was trained with, so no training play is scored
+    test_data = apply_split(data, freeze_split(data['uniquePlayId']))['test']
+    column_types = {col: "real" for col in test_data.columns if col not in ('uniquePlayId', 'playDirection', 'offenseFormation')}
+    test = h2o.H2OFrame(test_data, column_types={**column_types, "offenseFormation": "enum"})
 
-# Identify target and predictor columns (same as before)
-y = "offenseFormation"
-x = h2o_df.columns
-x.remove(y)
-x.remove("uniquePlayId")
-x.remove("playDirection")
+    analysis = analyze_ensemble(best_model, test_frame=test, refresh=REFRESH_ANALYSIS)
 
-# Split data into training and testing sets (for evaluation/plots)
-train, test = h2o_df.split_frame(ratios=[0.8], seed=1234)
+    # Shutdown H2O cluster, everything below only uses the analysis
+    h2o.cluster().shutdown()
 
 # Evaluate the Leader Model on Test Data
-perf = best_model.model_performance(test_data=test)
-print(perf)
-
-# Access Base Models and their variable importances
-base_models = best_model.base_models
-variable_importances = {}
-
-for model_id in base_models:
-    try:
-        model = h2o.get_model(model_id)  # Load the base model
-        if hasattr(model, 'varimp'):
-            varimp = model.varimp(use_pandas=True)
-            if varimp is not None:
-                variable_importances[model_id] = varimp
-            else:
-                print(f"Model {model_id} has varimp attribute but it is None.")
-        else:
-            print(f"Model {model_id} does not have varimp attribute.")
-    except Exception as e:
-        print(f"Error getting variable importance for model {model_id}: {e}")
-
-# Aggregate Variable Importances (Example: Simple Averaging)
-aggregated_importances = {}
-for model_id, varimp_df in variable_importances.items():
-    for index, row in varimp_df.iterrows():
-        variable = row['variable']
-        importance = row['relative_importance']
-        if variable in aggregated_importances:
-            aggregated_importances[variable].append(importance)
-        else:
-            aggregated_importances[variable] = [importance]
-
-# Average the importances across models
-averaged_importances = {
-    variable: np.mean(importances) for variable, importances in aggregated_importances.items()
-}
-
-# Convert to DataFrame for plotting
-importance_df = pd.DataFrame(
-    list(averaged_importances.items()), columns=['variable', 'relative_importance']
-).sort_values(by='relative_importance', ascending=False)
+print(f"Test metrics of {analysis['model_id']}: {analysis['metrics']}")
+
+# Aggregate Variable Importances over the base models (simple average and metalearner weighted)
+importance_df = aggregate_varimp(analysis['varimp'], analysis['weights'])
 
 # **Variable Importance Plot**
 plt.figure(figsize=(12, 6))
@@ -118,21 +71,28 @@ plt.savefig(plot_filename, bbox_inches="tight")
 print(f"Variable importance plot saved to: {plot_filename}")
 plt.close()  # Close the plot to prevent it from displaying
 
-# Since partial_plot relies on direct variable importance, it may not be directly applicable.
-# Alternative: You could try partial plots on individual base models.
+# **Weighted Variable Importance Plot**, each base model counts as much as the metalearner relies on it
+weighted_df = importance_df.sort_values("weighted_importance", ascending=False).head(20)
+plt.figure(figsize=(12, 6))
+sns.barplot(x="variable", y="weighted_importance", data=weighted_df, palette="viridis")
+plt.xticks(rotation=45, ha="right")
+plt.title("Variable Importance Weighted by Metalearner Coefficients")
+plt.tight_layout()
 
-# Shutdown H2O cluster
-leaderboard = best_model.leaderboard
+plot_filename = os.path.join(OUTPUT_DIR, f"weighted_variable_importance.{FILE_FORMAT}")
+plt.savefig(plot_filename, bbox_inches="tight")
+print(f"Weighted variable importance plot saved to: {plot_filename}")
+plt.close()
 
-# Convert to pandas DataFrame and select top 5 models
-top_models = leaderboard.as_data_frame().head(5)
+# Top 5 base models by their share of the metalearner
+top_models = analysis['weights'].sort_values(ascending=False).head(5).rename_axis('model_id').reset_index()
 
 # Create a bar plot for top models
 plt.figure(figsize=(12, 6))
-sns.barplot(x='model_id', y='auc', data=top_models, palette='viridis')
+sns.barplot(x='model_id', y='weight', data=top_models, palette='viridis')
 plt.title('Top 5 Models in Stacked Ensemble')
 plt.xlabel('Model ID')
-plt.ylabel('AUC')
+plt.ylabel('Metalearner Weight')
 plt.xticks(rotation=45, ha='right')
 plt.tight_layout()
 
@@ -143,28 +103,18 @@ print(f"Top models plot saved to: {plot_filename}")
 plt.close()
 
 # Get details of top models
-model_details = []
-for model_id in top_models['model_id']:
-    model = h2o.get_model(model_id)
-    details = {
-        'model_id': model_id,
-        'algorithm': model.algo,
-        'parameters': model.params
-    }
-    model_details.append(details)
+model_details = analysis['params'].set_index('model_id').loc[top_models['model_id']].reset_index()
 
 # Create a text file with model architectures
 architecture_filename = os.path.join(OUTPUT_DIR, "model_architectures.txt")
 with open(architecture_filename, 'w') as f:
-    for details in model_details:
+    for _, details in model_details.iterrows():
         f.write(f"Model ID: {details['model_id']}\n")
-        f.write(f"Algorithm: {details['algorithm']}\n")
+        f.write(f"Algorithm: {details['algo']}\n")
         f.write("Key Parameters:\n")
-        for param, value in details['parameters'].items():
-            if param in ['ntrees', 'max_depth', 'learn_rate', 'min_rows', 'sample_rate', 'col_sample_rate']:
-                f.write(f"  {param}: {value['actual']}\n")
+        for param in ARCHITECTURE_PARAMS:
+            if param in details and pd.notna(details[param]):
+                f.write(f"  {param}: {details[param]}\n")
         f.write("\n" + "-"*50 + "\n\n")
 
 print(f"Model architectures saved to: {architecture_filename}")
-
-h2o.cluster().shutdown()
@@ -0,0 +1,59 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.feature_store import FEATURE_STORE_PATH, load_features
+from src.data_pipeline.play_features import play_feature_frame
+from src.models.benchmark import benchmark_model
+from src.models.neighbors.formation_index import FormationIndex, KNNFormationModel, embedding_columns
+from src.models.training.split import SPLIT_PATH, apply_split, freeze_split
+from src.serving.models import load_formation_model
+
+
+def benchmark_neighbors(index: FormationIndex, test: pd.DataFrame, k=10, single_queries=500):
+    """Latency of a single top-k neighbour query for a play already in slot order."""
+    alignments = test[embedding_columns()].to_numpy(dtype=np.float32)
+    latencies = []
+    for i in range(min(single_queries, len(test))):
+        start = time.perf_counter()
+        index.kneighbors(alignments[i], k=k)
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1000
+    return {'k': k, 'p50_ms': float(np.percentile(latencies, 50)), 'p99_ms': float(np.percentile(latencies, 99))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="kNN formation search against the trained models")
+    parser.add_argument("--features-path", default=FEATURE_STORE_PATH)
+    parser.add_argument("--split-path", default=SPLIT_PATH)
+    parser.add_argument("--model", action="append", default=[],
+                        help="Saved H2O model, portable .npz export or XGBoost .json booster, repeatable")
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 15, 31])
+    parser.add_argument("--single-queries", type=int, default=500)
+    args = parser.parse_args()
+
+    data = load_features(args.features_path, columns=['uniquePlayId', 'playDirection', 'x', 'y', 'o', 'position',
+                                                      'offenseFormation'])
+    data = play_feature_frame(data, features=('x', 'y', 'o'))
+
+    # Frozen play split shared by the training code, so no model is evaluated on plays it trained on
+    splits = apply_split(data, freeze_split(data['uniquePlayId'], args.split_path))
+    train, test = pd.concat([splits['train'], splits['val']], ignore_index=True), splits['test']
+
+    start = time.perf_counter()
+    index = FormationIndex(train)
+    print(f"Indexed {len(index)} plays in {time.perf_counter() - start:.2f}s")
+    print(f"Top-10 query latency: {benchmark_neighbors(index, test, k=10, single_queries=args.single_queries)}")
+
+    results = [benchmark_model(f"knn_k{k}", KNNFormationModel(index, k=k), test, args.single_queries)
+               for k in args.k]
+    for path in args.model:
+        results.append(benchmark_model(path, load_formation_model(path), test, args.single_queries))
+
+    print(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from src.data_pipeline.play_features import POSITION_SLOTS, POSITIONS, play_feature_frame
+
+# How far apart (in yards) two plays are per player of a position one has and the other has not.
+# Keeps 2 TE sets away from 1 TE sets even when the slot coordinates happen to line up.
+PERSONNEL_WEIGHT = 5.0
+
+
+def embedding_columns(slots=POSITION_SLOTS):
+    slot_names = [f"{position}{i + 1}" for position in POSITIONS for i in range(slots[position])]
+    return [f"{feature}_{slot}" for feature in ('x', 'y') for slot in slot_names]
+
+
+def embed_features(features, slots=POSITION_SLOTS, personnel_weight=PERSONNEL_WEIGHT) -> np.ndarray:
+    """
+    Fixed length vectors from the per-slot feature frame of play_feature_frame (canonical x/y per slot).
+
+    Slots are filled by position and y order, so the same alignment always lands in the same dimensions
+    whatever order the players were listed in. Empty slots sit at the center (0, 0) and a personnel count
+    per position, scaled by `personnel_weight`, is appended so that missing players still cost distance.
+    `features` can also be a 2D array with the columns already in embedding_columns() order.
+    """
+    columns = embedding_columns(slots)
+    if isinstance(features, pd.DataFrame):
+        # Positional indexing on the raw values, selecting columns by label costs more than the query itself
+        indexer = features.columns.get_indexer(columns)
+        if (indexer < 0).any():
+            missing = [col for col, i in zip(columns, indexer) if i < 0]
+            raise ValueError(f"Features are missing {len(missing)} embedding columns, e.g. {missing[:5]}")
+        coordinates = features.to_numpy()[:, indexer].astype(np.float32)
+    else:
+        coordinates = np.atleast_2d(np.asarray(features, dtype=np.float32))
+    present = ~np.isnan(coordinates[:, :len(columns) // 2])
+
+    starts = np.cumsum([0] + [slots[position] for position in POSITIONS[:-1]])
+    personnel = np.add.reduceat(present, starts, axis=1).astype(np.float32) * personnel_weight
+
+    return np.hstack([np.nan_to_num(coordinates, nan=0.0), personnel])
+
+
+class FormationIndex:
+    """
+    KD-tree over the canonical embeddings of historical plays.
+
+    `query` returns the k most similar plays of every input play, with their uniquePlayId,
+    offenseFormation and distance.
+    """
+
+    def __init__(self, features: pd.DataFrame, leaf_size=16, personnel_weight=PERSONNEL_WEIGHT):
+        self.personnel_weight = personnel_weight
+        self.play_ids = features['uniquePlayId'].to_numpy()
+        self.formations = features['offenseFormation'].astype(str).to_numpy()
+        self.tree = cKDTree(embed_features(features, personnel_weight=personnel_weight), leafsize=leaf_size)
+
+    @classmethod
+    def from_rows(cls, df: pd.DataFrame, **kwargs):
+        """Builds the index from one row per player data, e.g. load_features()."""
+        return cls(play_feature_frame(df, features=('x', 'y')), **kwargs)
+
+    def __len__(self):
+        return len(self.play_ids)
+
+    def kneighbors(self, features, k=10):
+        """
+        (distances, positions) arrays of shape (n_queries, k), nearest first. `k` is capped at the number of
+        indexed plays, cKDTree would pad the missing neighbours with an out of range position.
+        """
+        if not len(self):
+            raise ValueError("The formation index is empty")
+        k = min(k, len(self))
+        distances, positions = self.tree.query(embed_features(features, personnel_weight=self.personnel_weight), k=k)
+        return distances.reshape(-1, k), positions.reshape(-1, k)
+
+    def query(self, features: pd.DataFrame, k=10) -> pd.DataFrame:
+        distances, positions = self.kneighbors(features, k=k)
+        k = positions.shape[1]
+        return pd.DataFrame({
+            'query': np.repeat(np.arange(len(features)), k),
+            'rank': np.tile(np.arange(1, k + 1), len(features)),
+            'uniquePlayId': self.play_ids[positions.ravel()],
+            'offenseFormation': self.formations[positions.ravel()],
+            'distance': distances.ravel(),
+        })
+
+
+class KNNFormationModel:
+    """
+    kNN formation classifier on a FormationIndex, with the same `classes` / `predict_proba`
+    interface as the H2O and portable models so it can be served or benchmarked in their place.
+    Neighbours vote with weight 1 / distance when `weights` is "distance", else uniformly.
+    """
+
+    def __init__(self, index: FormationIndex, k=15, weights="distance"):
+        self.index = index
+        # Small indexes (e.g. a filtered subset) hold fewer plays than k
+        self.k = min(k, len(index))
+        self.weights = weights
+        self.classes, self._labels = np.unique(index.formations, return_inverse=True)
+        self.classes = list(self.classes)
+        self.feature_columns = embedding_columns()
+        self.model_id = f"knn_k{self.k}"
+
+    def predict_proba(self, features) -> np.ndarray:
+        distances, positions = self.index.kneighbors(features, k=self.k)
+        if self.weights == "distance":
+            weights = 1.0 / np.maximum(distances, 1e-6)
+        else:
+            weights = np.ones_like(distances)
+
+        votes = np.zeros((len(features), len(self.classes)))
+        rows = np.repeat(np.arange(len(features)), self.k)
+        np.add.at(votes, (rows, self._labels[positions.ravel()]), weights.ravel())
+        return votes / votes.sum(axis=1, keepdims=True)
+
+    def predict(self, features) -> np.ndarray:
+        return np.asarray(self.classes)[self.predict_proba(features).argmax(axis=1)]
@@ -0,0 +1,112 @@
+import json
+
+import numpy as np
+
+
+def _tree_depth(left: np.ndarray, right: np.ndarray) -> int:
+    depth = np.zeros(len(left), dtype=np.int64)
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        for child in (left[node], right[node]):
+            if child >= 0:
+                depth[child] = depth[node] + 1
+                stack.append(child)
+    return int(depth.max())
+
+
+def tree_component(kind: str, trees, n_classes: int, features, init=0.0, float32_inputs=False):
+    """
+    Packs a list of trees into one flat node table.
+
+    trees: iterable of (class_index, nodes) where nodes is a dict of equally long arrays with
+           feature (column index into `features`, -1 for leaves), threshold, left, right
+           (child node index within the tree, -1 for leaves), missing_left and value.
+    kind:  "gbm" sums the leaf values per class and applies a softmax, "drf" averages them.
+    """
+    columns = {name: [] for name in ('feature', 'threshold', 'left', 'right', 'missing_left', 'value')}
+    roots, groups = [], []
+    offset, max_depth = 0, 0
+
+    for group, nodes in trees:
+        left = np.asarray(nodes['left'], dtype=np.int64)
+        right = np.asarray(nodes['right'], dtype=np.int64)
+        max_depth = max(max_depth, _tree_depth(left, right))
+
+        columns['feature'].append(np.asarray(nodes['feature'], dtype=np.int32))
+        columns['threshold'].append(np.asarray(nodes['threshold'], dtype=np.float64))
+        columns['left'].append(np.where(left >= 0, left + offset, -1))
+        columns['right'].append(np.where(right >= 0, right + offset, -1))
+        columns['missing_left'].append(np.asarray(nodes['missing_left'], dtype=bool))
+        columns['value'].append(np.asarray(nodes['value'], dtype=np.float64))
+        roots.append(offset)
+        groups.append(group)
+        offset += len(left)
+
+    arrays = {name: np.concatenate(parts) for name, parts in columns.items()}
+    arrays['left'] = arrays['left'].astype(np.int32)
+    arrays['right'] = arrays['right'].astype(np.int32)
+    arrays['roots'] = np.asarray(roots, dtype=np.int32)
+    arrays['group'] = np.asarray(groups, dtype=np.int32)
+
+    spec = {
+        'type': 'trees',
+        'kind': kind,
+        'n_classes': n_classes,
+        'features': list(features),
+        'init': np.atleast_1d(init).tolist(),
+        'float32_inputs': float32_inputs,
+        'max_depth': max_depth,
+    }
+    return spec, arrays
+
+
+def glm_component(features, coefficients, intercept, means):
+    spec = {'type': 'glm', 'features': list(features)}
+    arrays = {
+        'coefficients': np.asarray(coefficients, dtype=np.float64),
+        'intercept': np.asarray(intercept, dtype=np.float64),
+        'means': np.asarray(means, dtype=np.float64),
+    }
+    return spec, arrays
+
+
+def mlp_component(features, weights, biases, activation, means, scales, hidden_scales=None):
+    """hidden_scales: factor applied to each hidden layer's output at scoring time, 1 - its dropout ratio."""
+    if hidden_scales is None:
+        hidden_scales = np.ones(len(weights) - 1)
+    spec = {'type': 'mlp', 'features': list(features), 'n_layers': len(weights), 'activation': activation}
+    arrays = {
+        'means': np.asarray(means, dtype=np.float64),
+        'scales': np.asarray(scales, dtype=np.float64),
+        'hidden_scales': np.asarray(hidden_scales, dtype=np.float64),
+    }
+    for i, (w, b) in enumerate(zip(weights, biases)):
+        arrays[f'weights_{i}'] = np.asarray(w, dtype=np.float64)
+        arrays[f'biases_{i}'] = np.asarray(b, dtype=np.float64)
+    return spec, arrays
+
+
+def stack_component(base_components, metalearner_component):
+    specs, arrays = [], {}
+    for i, (spec, base_arrays) in enumerate(base_components):
+        specs.append(spec)
+        arrays.update({f'base_{i}/{key}': value for key, value in base_arrays.items()})
+    meta_spec, meta_arrays = metalearner_component
+    arrays.update({f'metalearner/{key}': value for key, value in meta_arrays.items()})
+    return {'type': 'stack', 'base_models': specs, 'metalearner': meta_spec}, arrays
+
+
+def save_artifact(path: str, component, model_id: str, source: str, classes, features):
+    """Writes a model component (spec, arrays) and its metadata as a compressed .npz file."""
+    spec, arrays = component
+    meta = {
+        'model_id': model_id,
+        'source': source,
+        'classes': [str(label) for label in classes],
+        'features': list(features),
+        'model': spec,
+    }
+    np.savez_compressed(path, meta=np.array(json.dumps(meta)),
+                        **{f'model/{key}': value for key, value in arrays.items()})
+    return path
@@ -0,0 +1,166 @@
+import numpy as np
+
+from src.models.portable.artifact import (glm_component, mlp_component, save_artifact, stack_component,
+                                          tree_component)
+
+
+def _feature_names(model):
+    # The response column is always last in the model output names
+    return list(model._model_json["output"]["names"][:-1])
+
+
+def _classes(model):
+    return list(model._model_json["output"]["domains"][-1])
+
+
+def _tree_nodes(tree, feature_index):
+    left = np.array(tree.left_children, dtype=np.int64)
+    right = np.array(tree.right_children, dtype=np.int64)
+    internal = left >= 0
+
+    if tree.levels is not None and any(levels is not None for levels, split in zip(tree.levels, internal) if split):
+        raise ValueError("Categorical splits are not supported, all formation features are numeric")
+
+    threshold = np.array([np.nan if t is None else t for t in tree.thresholds], dtype=np.float64)
+    nas = np.array([str(direction).upper() for direction in tree.nas])
+
+    # An NA-vs-rest split has no threshold: send every value away from the NA branch
+    na_split = internal & np.isnan(threshold)
+    threshold = np.where(na_split & (nas == "LEFT"), -np.inf, threshold)
+    threshold = np.where(na_split & (nas != "LEFT"), np.inf, threshold)
+
+    return {
+        'feature': np.array([feature_index[f] if split else -1 for f, split in zip(tree.features, internal)]),
+        'threshold': np.where(internal, threshold, np.inf),
+        'left': left,
+        'right': right,
+        'missing_left': internal & (nas == "LEFT"),
+        'value': np.array(tree.predictions, dtype=np.float64),
+    }
+
+
+def _export_trees(model, kind):
+    from h2o.tree import H2OTree
+
+    features = _feature_names(model)
+    classes = _classes(model)
+    feature_index = {name: i for i, name in enumerate(features)}
+    # Early stopping means fewer trees than the ntrees parameter may have been built
+    n_trees = int(model._model_json["output"]["model_summary"]["number_of_trees"][0])
+
+    trees = []
+    for tree_number in range(n_trees):
+        for class_index, label in enumerate(classes):
+            tree = H2OTree(model, tree_number, tree_class=label)
+            trees.append((class_index, _tree_nodes(tree, feature_index)))
+
+    init = model._model_json["output"].get("init_f") or 0.0
+    return tree_component(kind, trees, len(classes), features, init=init)
+
+
+def _column_stats(training_frame, columns):
+    frame = training_frame[columns].as_data_frame()
+    return frame.mean().to_numpy(dtype=np.float64), frame.std().to_numpy(dtype=np.float64)
+
+
+def _export_glm(model, training_frame, features=None, means=None):
+    classes = _classes(model)
+    coefficients = model.coef()
+    if features is None:
+        features = [name for name in coefficients[f"coefs_class_{classes[0]}"] if name != "Intercept"]
+
+    matrix = np.array([[coefficients[f"coefs_class_{label}"].get(name, 0.0) for label in classes] for name in features])
+    intercept = np.array([coefficients[f"coefs_class_{label}"]["Intercept"] for label in classes])
+
+    if means is None:
+        if training_frame is None:
+            raise ValueError(f"GLM {model.model_id} imputes missing values with training means, pass training_frame")
+        means, _ = _column_stats(training_frame, features)
+    return glm_component(features, matrix, intercept, means)
+
+
+def _export_deep_learning(model):
+    output = model._model_json["output"]
+    if output.get("weights") is None:
+        raise ValueError(f"Deep learning model {model.model_id} was trained without export_weights_and_biases=True, "
+                         "retrain it with that option or exclude DeepLearning from the AutoML run")
+
+    activation = model.params['activation']['actual']
+    hidden_scales = None
+    if activation.endswith("WithDropout"):
+        # H2O scales hidden activations by the keep probability at scoring time (input dropout is not rescaled)
+        n_hidden = len(model.params['hidden']['actual'])
+        ratios = model.params['hidden_dropout_ratios']['actual'] or [0.5] * n_hidden  # H2O's default ratio
+        hidden_scales = 1.0 - np.array(ratios, dtype=np.float64)
+        activation = activation[:-len("WithDropout")]
+    if activation not in ("Rectifier", "Tanh"):
+        raise ValueError(f"Unsupported deep learning activation {activation}")
+
+    features = _feature_names(model)
+    n_layers = len(output["weights"])
+    weights = [model.weights(i).as_data_frame().to_numpy() for i in range(n_layers)]
+    biases = [model.biases(i).as_data_frame().to_numpy().ravel() for i in range(n_layers)]
+
+    if model.params['standardize']['actual']:
+        means, scales = np.array(output["normsub"]), np.array(output["normmul"])
+    else:
+        means, scales = np.zeros(len(features)), np.ones(len(features))
+    return mlp_component(features, weights, biases, activation, means, scales, hidden_scales)
+
+
+def _export_component(model, training_frame):
+    if model.algo == "gbm":
+        return _export_trees(model, "gbm")
+    if model.algo == "drf":
+        return _export_trees(model, "drf")
+    if model.algo == "glm":
+        return _export_glm(model, training_frame)
+    if model.algo == "deeplearning":
+        return _export_deep_learning(model)
+    if model.algo == "stackedensemble":
+        return _export_stacked_ensemble(model, training_frame)
+    raise ValueError(f"Model {model.model_id} uses unsupported algorithm {model.algo}")
+
+
+def _export_stacked_ensemble(model, training_frame):
+    import h2o
+
+    classes = _classes(model)
+    base_ids = list(model.base_models)
+    base_components = [_export_component(h2o.get_model(base_id), training_frame) for base_id in base_ids]
+
+    # The metalearner sees one column per base model and class, named "<base model id>/<class>"
+    level_one = [f"{base_id}/{label}" for base_id in base_ids for label in classes]
+    metalearner = model.metalearner()
+    if metalearner.algo != "glm":
+        raise ValueError(f"Only GLM metalearners are supported, {model.model_id} uses {metalearner.algo}")
+    metalearner = _export_glm(metalearner, None, features=level_one, means=np.zeros(len(level_one)))
+    return stack_component(base_components, metalearner)
+
+
+def _union_features(spec, features):
+    if spec['type'] == 'stack':
+        for base in spec['base_models']:
+            _union_features(base, features)
+    else:
+        features.extend(name for name in spec['features'] if name not in features)
+    return features
+
+
+def export_h2o(model, path: str, training_frame=None):
+    """
+    Exports a multinomial H2O model to a portable .npz artifact scored by
+    src.models.portable.scorer.PortableModel, without a JVM.
+
+    Supports GBM, DRF/XRT, GLM and deep learning models (the latter only when trained with
+    export_weights_and_biases=True), and stacked ensembles of them with a GLM metalearner such as the
+    AutoML StackedEnsemble_BestOfFamily leader. GLM models impute missing values with training means,
+    so `training_frame` (the frame the model was trained on) is required when one is present.
+    """
+    if model._model_json["output"]["model_category"] != "Multinomial":
+        raise ValueError("Only multinomial models are supported")
+
+    component = _export_component(model, training_frame)
+    features = _union_features(component[0], [])
+    return save_artifact(path, component, model_id=model.model_id, source='h2o',
+                         classes=_classes(model), features=features)
@@ -0,0 +1,60 @@
+import json
+
+import numpy as np
+
+from src.models.portable.artifact import save_artifact, tree_component
+
+
+def _base_score(booster, n_classes):
+    params = json.loads(booster.save_config())['learner']['learner_model_param']
+    values = [float(v) for v in params['base_score'].strip('[]').split(',')]
+    # Older releases store a single scalar, newer ones one margin per class
+    return np.broadcast_to(np.asarray(values, dtype=np.float64), (n_classes,))
+
+
+def export_xgboost(booster, path: str, classes, model_id="xgboost", iteration_range=None):
+    """
+    Exports a multi:softprob / multi:softmax XGBoost booster (e.g. the notebook's model_mod2) to a
+    portable .npz artifact scored by src.models.portable.scorer.PortableModel.
+
+    classes: formation labels in label encoder order, e.g. label_encoder_formation.classes_
+    iteration_range: (start, end) boosting rounds to keep, as in Booster.predict. Defaults to all rounds.
+    """
+    features = list(booster.feature_names or [f"f{i}" for i in range(booster.num_features())])
+    n_classes = len(classes)
+
+    model = json.loads(booster.save_raw('json'))['learner']['gradient_booster']['model']
+    tree_info = model['tree_info']
+    trees_per_round = len(tree_info) // booster.num_boosted_rounds()
+
+    start, end = iteration_range or (0, booster.num_boosted_rounds())
+    if end == 0:
+        end = booster.num_boosted_rounds()
+    keep = range(start * trees_per_round, end * trees_per_round)
+
+    table = booster.trees_to_dataframe()
+    table = table[table['Tree'].isin(keep)]
+
+    feature_index = {name: i for i, name in enumerate(features)}
+    trees = []
+    for tree_id, nodes in table.groupby('Tree', sort=True):
+        nodes = nodes.sort_values('Node')
+        node_ids = {node_id: i for i, node_id in enumerate(nodes['ID'])}
+        leaf = (nodes['Feature'] == 'Leaf').to_numpy()
+
+        def child(column):
+            return np.array([-1 if is_leaf else node_ids[c] for is_leaf, c in zip(leaf, nodes[column])])
+
+        trees.append((tree_info[tree_id], {
+            'feature': np.where(leaf, -1, [feature_index.get(f, -1) for f in nodes['Feature']]),
+            # XGBoost compares in float32, keep the thresholds exactly as stored
+            'threshold': np.where(leaf, np.inf, nodes['Split'].to_numpy(dtype=np.float32)),
+            'left': child('Yes'),
+            'right': child('No'),
+            'missing_left': (nodes['Missing'] == nodes['Yes']).to_numpy() & ~leaf,
+            'value': np.where(leaf, nodes['Gain'].to_numpy(dtype=np.float64), 0.0),
+        }))
+
+    component = tree_component('gbm', trees, n_classes, features,
+                               init=_base_score(booster, n_classes), float32_inputs=True)
+    return save_artifact(path, component, model_id=model_id, source='xgboost', classes=classes, features=features)
@@ -0,0 +1,192 @@
+"""
+Pure NumPy scoring of exported formation models.
+
+An artifact is a single .npz file written by export_xgboost() or export_h2o(). It holds a JSON
+description of the model plus the arrays of its components:
+
+  trees  gradient boosted (H2O GBM, XGBoost) or random forest (H2O DRF/XRT) tree ensembles
+  glm    multinomial generalized linear model
+  mlp    H2O deep learning feed forward network
+  stack  stacked ensemble, a glm metalearner over the class probabilities of other components
+
+Scoring only needs NumPy, so it starts in milliseconds and never touches a JVM:
+
+  python -m src.models.portable.scorer model.npz features.npy probabilities.npy
+"""
+import json
+import sys
+
+import numpy as np
+
+
+def softmax(margin: np.ndarray) -> np.ndarray:
+    margin = margin - margin.max(axis=1, keepdims=True)
+    exp = np.exp(margin)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class _Trees:
+    """All trees of an ensemble as flat node arrays, traversed for every row and tree at once."""
+
+    def __init__(self, spec, arrays, prefix, features):
+        self.kind = spec['kind']
+        self.n_classes = spec['n_classes']
+        self.float32_inputs = spec.get('float32_inputs', False)
+        self.init = np.asarray(spec.get('init', 0.0), dtype=np.float64)
+
+        self.columns = np.array([features.index(name) for name in spec['features']], dtype=np.int64)
+        self.feature = arrays[f'{prefix}/feature']
+        self.threshold = arrays[f'{prefix}/threshold']
+        self.left = arrays[f'{prefix}/left']
+        self.right = arrays[f'{prefix}/right']
+        self.missing_left = arrays[f'{prefix}/missing_left']
+        self.value = arrays[f'{prefix}/value']
+        self.roots = arrays[f'{prefix}/roots']
+        self.max_depth = int(spec['max_depth'])
+
+        # (n_trees, n_classes) indicator used to add up the leaf values of each class
+        groups = arrays[f'{prefix}/group']
+        self.class_matrix = np.zeros((len(groups), self.n_classes), dtype=np.float64)
+        self.class_matrix[np.arange(len(groups)), groups] = 1.0
+
+    def leaf_values(self, X: np.ndarray) -> np.ndarray:
+        X = X[:, self.columns]
+        if self.float32_inputs:
+            X = X.astype(np.float32)
+        rows = np.arange(len(X))[:, None]
+
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            feature = self.feature[node]
+            internal = feature >= 0
+            if not internal.any():
+                break
+            x = X[rows, np.where(internal, feature, 0)]
+            go_left = (x < self.threshold[node]) | (np.isnan(x) & self.missing_left[node])
+            node = np.where(internal, np.where(go_left, self.left[node], self.right[node]), node)
+        return self.value[node]
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        totals = self.leaf_values(X) @ self.class_matrix
+        if self.kind == 'drf':
+            # H2O random forests average per-class votes and renormalise them to sum to one
+            sums = totals.sum(axis=1, keepdims=True)
+            return np.divide(totals, sums, out=np.zeros_like(totals), where=sums > 0)
+        return softmax(totals + self.init)
+
+
+def _impute_and_scale(X, means, scales):
+    X = np.where(np.isnan(X), means, X)
+    return (X - means) * scales if scales is not None else X
+
+
+class _GLM:
+    def __init__(self, spec, arrays, prefix, features):
+        self.columns = np.array([features.index(name) for name in spec['features']], dtype=np.int64)
+        self.coefficients = arrays[f'{prefix}/coefficients']  # (n_features, n_classes)
+        self.intercept = arrays[f'{prefix}/intercept']        # (n_classes,)
+        self.means = arrays[f'{prefix}/means']
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        X = _impute_and_scale(X[:, self.columns], self.means, None)
+        return softmax(X @ self.coefficients + self.intercept)
+
+
+class _MLP:
+    ACTIVATIONS = {
+        'Rectifier': lambda z: np.maximum(z, 0.0),
+        'Tanh': np.tanh,
+    }
+
+    def __init__(self, spec, arrays, prefix, features):
+        self.columns = np.array([features.index(name) for name in spec['features']], dtype=np.int64)
+        self.means = arrays[f'{prefix}/means']
+        self.scales = arrays[f'{prefix}/scales']
+        self.hidden_scales = arrays[f'{prefix}/hidden_scales']
+        self.weights = [arrays[f'{prefix}/weights_{i}'] for i in range(spec['n_layers'])]
+        self.biases = [arrays[f'{prefix}/biases_{i}'] for i in range(spec['n_layers'])]
+        self.activation = self.ACTIVATIONS[spec['activation']]
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        hidden = _impute_and_scale(X[:, self.columns], self.means, self.scales)
+        for weights, biases, scale in zip(self.weights[:-1], self.biases[:-1], self.hidden_scales):
+            hidden = self.activation(hidden @ weights.T + biases) * scale
+        return softmax(hidden @ self.weights[-1].T + self.biases[-1])
+
+
+class _Stack:
+    def __init__(self, spec, arrays, prefix, features):
+        self.base_models = [_build(base, arrays, f'{prefix}/base_{i}', features)
+                            for i, base in enumerate(spec['base_models'])]
+        self.metalearner = _GLM(spec['metalearner'], arrays, f'{prefix}/metalearner', spec['metalearner']['features'])
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        level_one = np.hstack([base.predict_proba(X) for base in self.base_models])
+        return self.metalearner.predict_proba(level_one)
+
+
+_COMPONENTS = {'trees': _Trees, 'glm': _GLM, 'mlp': _MLP, 'stack': _Stack}
+
+
+def _build(spec, arrays, prefix, features):
+    return _COMPONENTS[spec['type']](spec, arrays, prefix, features)
+
+
+class PortableModel:
+    """
+    Loads an exported model artifact and scores it with NumPy only.
+
+    Exposes the same `classes` / `predict_proba(features)` interface as the serving models, so it can be
+    handed straight to FormationServer. `features` is a DataFrame holding (at least) the model's feature
+    columns, or a 2D array with the columns already in `feature_columns` order.
+    """
+
+    def __init__(self, path: str, batch_size=4096):
+        with np.load(path, allow_pickle=False) as artifact:
+            arrays = {key: artifact[key] for key in artifact.files}
+        meta = json.loads(str(arrays.pop('meta')))
+
+        self.path = path
+        self.batch_size = batch_size
+        self.model_id = meta['model_id']
+        self.source = meta['source']
+        self.classes = list(meta['classes'])
+        self.feature_columns = list(meta['features'])
+        self._root = _build(meta['model'], arrays, 'model', self.feature_columns)
+
+    def _matrix(self, features) -> np.ndarray:
+        if hasattr(features, 'columns'):
+            missing = [col for col in self.feature_columns if col not in features.columns]
+            if missing:
+                raise ValueError(f"Features are missing {len(missing)} columns of {self.model_id}, e.g. {missing[:5]}")
+            features = features[self.feature_columns]
+        elif np.shape(features)[-1] != len(self.feature_columns):
+            raise ValueError(f"{self.model_id} takes {len(self.feature_columns)} feature columns, "
+                             f"got {np.shape(features)[-1]}")
+        return np.asarray(features, dtype=np.float64)
+
+    def predict_proba(self, features) -> np.ndarray:
+        X = self._matrix(features)
+        # Tree traversal holds an (n_rows, n_trees) node index, so large inputs are scored in slices
+        if len(X) <= self.batch_size:
+            return self._root.predict_proba(X)
+        return np.vstack([self._root.predict_proba(X[start:start + self.batch_size])
+                          for start in range(0, len(X), self.batch_size)])
+
+    def predict(self, features) -> np.ndarray:
+        return np.asarray(self.classes)[self.predict_proba(features).argmax(axis=1)]
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 3:
+        print("usage: python -m src.models.portable.scorer MODEL.npz FEATURES.npy OUTPUT.npy")
+        return 2
+    model_path, features_path, output_path = argv
+    model = PortableModel(model_path)
+    np.save(output_path, model.predict_proba(np.load(features_path)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
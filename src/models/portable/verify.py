@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from src.models.portable.scorer import PortableModel
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+
+
+def verify_artifact(path: str, features, expected: np.ndarray, atol=1e-5) -> dict:
+    """
+    Scores `features` with the exported artifact in a fresh Python subprocess (so no JVM or H2O/XGBoost
+    import can leak in) and compares the probabilities with `expected`, the original model's predictions.
+
+    Returns the largest absolute difference, the fraction of plays with the same predicted formation and
+    the subprocess wall time (interpreter start, artifact load and scoring). Raises AssertionError
+    when the difference exceeds `atol`.
+    """
+    model = PortableModel(path)
+    matrix = model._matrix(features)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        features_path = os.path.join(tmp, "features.npy")
+        output_path = os.path.join(tmp, "probabilities.npy")
+        np.save(features_path, matrix)
+
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "src.models.portable.scorer", os.path.abspath(path),
+                        features_path, output_path], cwd=REPO_ROOT, check=True)
+        elapsed = time.perf_counter() - start
+        probabilities = np.load(output_path)
+
+    expected = np.asarray(expected, dtype=np.float64)
+    max_diff = float(np.abs(probabilities - expected).max())
+    agreement = float((probabilities.argmax(axis=1) == expected.argmax(axis=1)).mean())
+    if max_diff > atol:
+        raise AssertionError(f"Exported model differs from the original by {max_diff:.3g} (atol={atol})")
+    return {"max_abs_diff": max_diff, "label_agreement": agreement, "subprocess_seconds": elapsed}
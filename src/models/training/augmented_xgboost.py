@@ -0,0 +1,39 @@
+"""
+XGBoost training matrices built batch by batch from augmented PlayBatches (see augmentation.py).
+
+XGBoost pulls the batches through a DataIter and keeps only the quantized matrix, in memory
+(QuantileDMatrix) or paged to disk under `cache_prefix` (ExtMemQuantileDMatrix), so the float copies of
+the augmented passes never exist at once.
+"""
+import xgboost as xgb
+
+from src.data_pipeline.augmentation import flatten_slots
+
+
+class PlayBatchIter(xgb.DataIter):
+    """Hands the batches of a PlayBatches to XGBoost, flattened to play_feature_frame() columns."""
+
+    def __init__(self, batches, feature_names, cache_prefix=None):
+        super().__init__(cache_prefix=cache_prefix)
+        self.batches = batches
+        self.feature_names = list(feature_names)
+        self._next = 0
+
+    def next(self, input_data) -> bool:
+        if self._next == len(self.batches):
+            return False
+        batch, labels = self.batches[self._next]
+        input_data(data=flatten_slots(batch), label=labels, feature_names=self.feature_names)
+        self._next += 1
+        return True
+
+    def reset(self):
+        self._next = 0
+
+
+def augmented_matrix(batches, feature_names, max_bin=256, cache_prefix=None, nthread=None):
+    """Quantized training matrix of every batch of `batches`, paged to disk when `cache_prefix` is set."""
+    iterator = PlayBatchIter(batches, feature_names, cache_prefix)
+    if cache_prefix:
+        return xgb.ExtMemQuantileDMatrix(iterator, max_bin=max_bin, nthread=nthread)
+    return xgb.QuantileDMatrix(iterator, max_bin=max_bin, nthread=nthread)
@@ -0,0 +1,107 @@
+"""
+Weekly update of the formation models when a new tracking_week_{i}.csv arrives.
+
+Only the new week is consolidated and appended to the feature store, then the models start from the
+previous run instead of from scratch: the XGBoost booster keeps boosting for a few rounds and H2O AutoML
+only searches the algorithm families that led the previous leaderboard, with fewer folds.
+
+    python -m src.models.training.incremental resources/data --previous-run training_runs
+"""
+import argparse
+import os
+
+import pandas as pd
+
+from src.data_pipeline.consolidation import append_new_weeks
+from src.data_pipeline.feature_store import FEATURE_STORE_PATH, stored_weeks
+from src.models.training.orchestrator import run_training
+from src.models.training.split import SPLIT_PATH
+
+# AutoML model id prefix -> include_algos name (extremely randomized trees are part of DRF)
+H2O_FAMILIES = {
+    'StackedEnsemble': 'StackedEnsemble',
+    'DeepLearning': 'DeepLearning',
+    'XGBoost': 'XGBoost',
+    'GBM': 'GBM',
+    'DRF': 'DRF',
+    'XRT': 'DRF',
+    'GLM': 'GLM',
+}
+
+
+def top_h2o_families(leaderboard_path: str, top_n=2) -> list:
+    """
+    The `top_n` best algorithm families of a saved AutoML leaderboard (best first). Stacked ensembles
+    are added back when they led, as they are cheap to rebuild from the retrained base models.
+    """
+    leaderboard = pd.read_csv(leaderboard_path)
+    families = []
+    for model_id in leaderboard['model_id']:
+        family = next((name for prefix, name in H2O_FAMILIES.items() if model_id.startswith(prefix)), None)
+        if family is not None and family not in families:
+            families.append(family)
+
+    base_families = [family for family in families if family != 'StackedEnsemble'][:top_n]
+    if families and families[0] == 'StackedEnsemble':
+        base_families.append('StackedEnsemble')
+    return base_families
+
+
+def retrain_incrementally(data_dir: str, previous_run="training_runs", output_dir=None,
+                          features_path=FEATURE_STORE_PATH, split_path=SPLIT_PATH, backends=('xgboost', 'h2o'),
+                          xgboost_rounds=100, h2o_top_families=2, h2o_nfolds=3, time_limit=900, cpus=None,
+                          force=False) -> pd.DataFrame:
+    """
+    Appends the new tracking weeks of `data_dir` to the feature store and warm-starts the models of
+    `previous_run` (an orchestrator output directory) on the updated data. Returns the new leaderboard,
+    or None when there was no new week and `force` is False.
+    """
+    plays = pd.read_csv(os.path.join(data_dir, "plays.csv"))
+    players = pd.read_csv(os.path.join(data_dir, "players.csv"))
+    new_weeks = append_new_weeks(data_dir, plays, players, features_path)
+    if not new_weeks and not force:
+        return None
+
+    options = {}
+    xgboost_model = os.path.join(previous_run, "xgboost", "xgboost_model.json")
+    if 'xgboost' in backends and os.path.exists(xgboost_model):
+        options['xgboost'] = {'init_model': xgboost_model, 'rounds': xgboost_rounds}
+    else:
+        print(f"No booster at {xgboost_model}, XGBoost trains from scratch")
+
+    h2o_leaderboard = os.path.join(previous_run, "h2o", "leaderboard.csv")
+    if 'h2o' in backends and os.path.exists(h2o_leaderboard):
+        families = top_h2o_families(h2o_leaderboard, top_n=h2o_top_families)
+        print(f"H2O AutoML limited to {families}")
+        options['h2o'] = {'include_algos': families, 'nfolds': h2o_nfolds}
+    else:
+        print(f"No leaderboard at {h2o_leaderboard}, H2O AutoML searches every family")
+
+    output_dir = output_dir or os.path.join(previous_run, f"week_{max(stored_weeks(features_path))}")
+    return run_training(backends, features_path, split_path, output_dir, time_limit, cpus, backend_options=options)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add new tracking weeks and warm-start the formation models")
+    parser.add_argument("data_dir", help="Directory with plays.csv, players.csv and tracking_week_{i}.csv")
+    parser.add_argument("--previous-run", default="training_runs", help="Output directory of the previous run")
+    parser.add_argument("--output-dir", default=None, help="Defaults to <previous-run>/week_<latest week>")
+    parser.add_argument("--features-path", default=FEATURE_STORE_PATH)
+    parser.add_argument("--split-path", default=SPLIT_PATH)
+    parser.add_argument("--backends", nargs="+", default=['xgboost', 'h2o'], choices=['xgboost', 'h2o'])
+    parser.add_argument("--xgboost-rounds", type=int, default=100)
+    parser.add_argument("--h2o-top-families", type=int, default=2)
+    parser.add_argument("--h2o-nfolds", type=int, default=3)
+    parser.add_argument("--time-limit", type=int, default=900)
+    parser.add_argument("--force", action="store_true", help="Retrain even when there is no new week")
+    args = parser.parse_args()
+
+    leaderboard = retrain_incrementally(args.data_dir, args.previous_run, args.output_dir, args.features_path,
+                                        args.split_path, args.backends, args.xgboost_rounds,
+                                        args.h2o_top_families, args.h2o_nfolds, args.time_limit, force=args.force)
+    if leaderboard is not None:
+        print(leaderboard.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
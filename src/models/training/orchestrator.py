@@ -0,0 +1,315 @@
+"""
+Trains the H2O AutoML, XGBoost and AutoGluon models side by side on one frozen split.
+
+Every framework runs in its own spawned process, pinned to its own share of the CPU cores, and
+reports its leader with the same test metrics so the results end up in a single leaderboard:
+
+    python -m src.models.training.orchestrator --backends h2o xgboost autogluon --time-limit 1800
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.feature_store import FEATURE_STORE_PATH, load_features
+from src.data_pipeline.play_features import play_feature_frame
+from src.instrumentation.spans import span
+from src.models.benchmark import KEY_COLUMNS, benchmark_model
+from src.models.training.split import SPLIT_PATH, apply_split, freeze_split
+
+TARGET = 'offenseFormation'
+SEED = 3245
+THREAD_VARIABLES = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+
+def cpu_budgets(backends, total=None) -> dict:
+    """Splits the available cores between the backends, e.g. 16 cores for 3 backends -> 6, 5, 5."""
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count()))
+    cores = cores[:total] if total else cores
+    if len(cores) < len(backends):
+        # Fewer cores than jobs: every job gets one core and some share
+        return {backend: [cores[i % len(cores)]] for i, backend in enumerate(backends)}
+    parts = np.array_split(cores, len(backends))
+    return {backend: [int(core) for core in part] for backend, part in zip(backends, parts)}
+
+
+def _limit_cpus(cores):
+    # Runs first in the spawned worker, before numpy/xgboost/h2o size their thread pools
+    for variable in THREAD_VARIABLES:
+        os.environ[variable] = str(len(cores))
+    if hasattr(os, 'sched_setaffinity'):
+        # Inherited by child processes too, e.g. the H2O JVM
+        os.sched_setaffinity(0, cores)
+
+
+def _feature_columns(frame: pd.DataFrame):
+    return [col for col in frame.columns if col not in KEY_COLUMNS]
+
+
+class _XGBoostModel:
+    def __init__(self, booster, classes, feature_columns):
+        self.booster = booster
+        self.classes = list(classes)
+        self.feature_columns = feature_columns
+
+    def predict_proba(self, features: pd.DataFrame) -> np.ndarray:
+        import xgboost as xgb
+        return self.booster.predict(xgb.DMatrix(features.reindex(columns=self.feature_columns)))
+
+
+class _AutoGluonModel:
+    def __init__(self, predictor):
+        self.predictor = predictor
+        self.classes = [str(label) for label in predictor.class_labels]
+
+    def predict_proba(self, features: pd.DataFrame) -> np.ndarray:
+        return self.predictor.predict_proba(features, as_multiclass=True).to_numpy(dtype=np.float64)
+
+
+def train_xgboost(job):
+    """
+    Trains a booster with early stopping on the val split. With job['init_model'] (a booster saved by a
+    previous run) boosting continues from that booster for at most job['rounds'] rounds instead, and with
+    job['search'] the parameters are tuned by successive halving (see xgboost_search.py). job['augment']
+    trains on augmented passes of the train plays, streamed into the matrix (see augmentation.py).
+    job['search'] cannot be combined with job['init_model'] or job['augment'].
+    """
+    import xgboost as xgb
+
+    train, val = pd.read_parquet(job['train']), pd.read_parquet(job['val'])
+    columns = _feature_columns(train)
+
+    init_model = None
+    if job.get('init_model'):
+        init_model = xgb.Booster(model_file=job['init_model'])
+        classes = np.array(json.loads(init_model.attr('classes')))
+        unseen = sorted(set(train[TARGET].astype(str)) - set(classes))
+        if unseen:
+            print(f"Formations {unseen} are new and ignored by the warm start, run a full training to add them")
+    else:
+        classes = np.unique(train[TARGET].astype(str))
+    encode = {label: i for i, label in enumerate(classes)}
+    # Only formations the booster has a class for can be trained on and scored
+    train = train[train[TARGET].astype(str).isin(encode)]
+    val = val[val[TARGET].astype(str).isin(encode)]
+
+    if job.get('search') and job.get('augment'):
+        raise ValueError("job['search'] tunes on the original plays only and cannot be combined with job['augment']")
+    if job.get('search') and init_model is not None:
+        raise ValueError("job['search'] trains new boosters and cannot be combined with job['init_model']")
+    if job.get('search'):
+        # job['search'] holds search_xgboost settings, e.g. {'n_trials': 27}
+        from src.models.training.xgboost_search import search_xgboost
+        booster, classes, _ = search_xgboost(train, val, job['output_dir'], cpus=len(job['cores']), classes=classes,
+                                             **job['search'])
+        model_path = os.path.join(job['output_dir'], "xgboost_model.json")
+        return _XGBoostModel(booster, classes, columns), "xgboost", model_path
+
+    if job.get('augment'):
+        # job['augment'] holds 'passes' and Augmentation settings, e.g. {'passes': 3, 'jitter': 0.1}
+        from src.data_pipeline.augmentation import Augmentation, PlayBatches, slot_array, slot_columns
+        from src.models.training.augmented_xgboost import augmented_matrix
+
+        settings = dict(job['augment'])
+        passes = settings.pop('passes', 2)
+        features = tuple(dict.fromkeys(col.split('_', 1)[0] for col in columns))
+        columns = slot_columns(features)
+        batches = PlayBatches(slot_array(train, features), train[TARGET].astype(str).map(encode).to_numpy(),
+                              batch_size=65536, augmentation=Augmentation(features, **settings), passes=passes,
+                              seed=SEED)
+        dtrain = augmented_matrix(batches, columns, nthread=len(job['cores']))
+        dval = xgb.QuantileDMatrix(val[columns], label=val[TARGET].astype(str).map(encode), ref=dtrain)
+    else:
+        dtrain = xgb.DMatrix(train[columns], label=train[TARGET].astype(str).map(encode))
+        dval = xgb.DMatrix(val[columns], label=val[TARGET].astype(str).map(encode))
+    params = {
+        'objective': 'multi:softprob',
+        'num_class': len(classes),
+        'eval_metric': 'mlogloss',
+        'tree_method': 'hist',
+        'max_depth': 5,
+        'eta': 0.05,
+        'subsample': 0.9,
+        'colsample_bytree': 0.9,
+        'lambda': 2.0,
+        'alpha': 1.0,
+        'nthread': len(job['cores']),
+        'seed': SEED,
+    }
+    booster = xgb.train(params, dtrain, num_boost_round=job.get('rounds', 1000), evals=[(dval, "val")],
+                        early_stopping_rounds=25, verbose_eval=False, xgb_model=init_model)
+    booster = booster[:booster.best_iteration + 1]
+    booster.set_attr(classes=json.dumps([str(label) for label in classes]))
+
+    model_path = os.path.join(job['output_dir'], "xgboost_model.json")
+    booster.save_model(model_path)
+    return _XGBoostModel(booster, classes, columns), "xgboost", model_path
+
+
+def train_h2o(job):
+    import h2o
+    from h2o.automl import H2OAutoML
+    from src.serving.models import H2OFormationModel
+
+    h2o.init(nthreads=len(job['cores']), max_mem_size=job['h2o_max_mem_size'], port=job['h2o_port'])
+    frames = {}
+    for name in ('train', 'val'):
+        frame = pd.read_parquet(job[name])
+        column_types = {col: "real" for col in _feature_columns(frame)}
+        with span("h2o.H2OFrame", split=name, rows=len(frame)):
+            frames[name] = h2o.H2OFrame(frame.drop(columns=['uniquePlayId', 'playDirection']),
+                                        column_types={**column_types, TARGET: "enum"})
+    x = [col for col in frames['train'].columns if col != TARGET]
+
+    # job['include_algos'] restricts the search, e.g. to the families that led a previous run
+    aml = H2OAutoML(max_runtime_secs=job['time_limit'], seed=SEED, sort_metric="logloss",
+                    nfolds=job.get('nfolds', 5), include_algos=job.get('include_algos'))
+    with span("aml.train", rows=frames['train'].nrows):
+        aml.train(x=x, y=TARGET, training_frame=frames['train'], leaderboard_frame=frames['val'])
+    model_path = h2o.save_model(model=aml.leader, path=os.path.join(job['output_dir'], "h2o"), force=True)
+    aml.leaderboard.as_data_frame().to_csv(os.path.join(job['output_dir'], "leaderboard.csv"), index=False)
+
+    # Connects to the cluster started above
+    model = H2OFormationModel(model_path, h2o_config={"nthreads": len(job['cores']), "port": job['h2o_port']})
+    return model, aml.leader.model_id, model_path
+
+
+def train_autogluon(job):
+    from autogluon.tabular import TabularPredictor
+
+    train, val = pd.read_parquet(job['train']), pd.read_parquet(job['val'])
+    train, val = (frame.drop(columns=['uniquePlayId', 'playDirection']) for frame in (train, val))
+    model_path = os.path.join(job['output_dir'], "autogluon")
+    predictor = TabularPredictor(label=TARGET, path=model_path).fit(
+        train_data=train, tuning_data=val, time_limit=job['time_limit'], num_cpus=len(job['cores']))
+    return _AutoGluonModel(predictor), predictor.model_best, model_path
+
+
+TRAINERS = {
+    'h2o': train_h2o,
+    'xgboost': train_xgboost,
+    'autogluon': train_autogluon,
+}
+
+
+def run_backend(job):
+    """Trains one backend and scores its leader on the test split, inside the worker process."""
+    start = time.perf_counter()
+    with span(f"train {job['backend']}"):
+        model, model_name, model_path = TRAINERS[job['backend']](job)
+    fit_seconds = time.perf_counter() - start
+
+    test = pd.read_parquet(job['test'])
+    with span(f"score {job['backend']}", rows=len(test)):
+        result = benchmark_model(model_name, model, test, single_queries=job['single_queries'])
+    result.update({'backend': job['backend'], 'fit_seconds': fit_seconds, 'cpus': len(job['cores']),
+                   'model_path': model_path})
+
+    if job['backend'] == 'h2o':
+        import h2o
+        h2o.cluster().shutdown()
+    return result
+
+
+def prepare_split_data(features_path=FEATURE_STORE_PATH, split_path=SPLIT_PATH, output_dir="training_runs"):
+    """Builds the play feature frame once, freezes the split and writes train/val/test parquet files."""
+    data = load_features(features_path, columns=['uniquePlayId', 'playDirection', 'x', 'y', 'o', 'position', TARGET])
+    data = play_feature_frame(data, features=('x', 'y', 'o'))
+    split = freeze_split(data['uniquePlayId'], split_path)
+
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {}
+    for name, frame in apply_split(data, split).items():
+        paths[name] = os.path.join(output_dir, f"{name}.parquet")
+        frame.to_parquet(paths[name], index=False)
+        print(f"{name}: {len(frame)} plays")
+    return paths
+
+
+def run_training(backends=('h2o', 'xgboost', 'autogluon'), features_path=FEATURE_STORE_PATH, split_path=SPLIT_PATH,
+                 output_dir="training_runs", time_limit=3600, cpus=None, single_queries=200,
+                 h2o_max_mem_size="8G", h2o_port=54321, backend_options=None) -> pd.DataFrame:
+    """
+    Trains every backend concurrently on the same frozen split and returns the leaderboard of their
+    leaders: test accuracy and log loss, fit wall-clock time and single-play scoring latency.
+    A backend that fails is reported and left out of the leaderboard.
+    backend_options adds per backend settings to its job, e.g. {'xgboost': {'init_model': path, 'rounds': 100}}.
+    """
+    unknown = [backend for backend in backends if backend not in TRAINERS]
+    if unknown:
+        raise ValueError(f"Unknown backends {unknown}, expected some of {list(TRAINERS)}")
+
+    paths = prepare_split_data(features_path, split_path, output_dir)
+    budgets = cpu_budgets(backends, cpus)
+    context = get_context("spawn")
+
+    futures = {}
+    pools = []
+    for backend in backends:
+        job = {**paths, 'backend': backend, 'cores': budgets[backend], 'time_limit': time_limit,
+               'output_dir': os.path.join(output_dir, backend), 'single_queries': single_queries,
+               'h2o_max_mem_size': h2o_max_mem_size, 'h2o_port': h2o_port,
+               **(backend_options or {}).get(backend, {})}
+        os.makedirs(job['output_dir'], exist_ok=True)
+        print(f"Starting {backend} on cores {budgets[backend]}")
+        pool = ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=_limit_cpus,
+                                   initargs=(budgets[backend],))
+        pools.append(pool)
+        futures[backend] = pool.submit(run_backend, job)
+
+    results = []
+    try:
+        for backend, future in futures.items():
+            try:
+                results.append(future.result())
+                print(f"{backend} finished")
+            except Exception as e:
+                print(f"{backend} failed: {e}")
+    finally:
+        for pool in pools:
+            pool.shutdown()
+
+    columns = ['backend', 'model', 'accuracy', 'logloss', 'fit_seconds', 'p50_ms', 'p99_ms',
+               'batch_plays_per_second', 'cpus', 'model_path']
+    leaderboard = pd.DataFrame(results, columns=columns).sort_values('logloss').reset_index(drop=True)
+    leaderboard.to_csv(os.path.join(output_dir, "leaderboard.csv"), index=False)
+    return leaderboard
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train H2O, XGBoost and AutoGluon concurrently on one frozen split")
+    parser.add_argument("--backends", nargs="+", default=list(TRAINERS), choices=list(TRAINERS))
+    parser.add_argument("--features-path", default=FEATURE_STORE_PATH)
+    parser.add_argument("--split-path", default=SPLIT_PATH)
+    parser.add_argument("--output-dir", default="training_runs")
+    parser.add_argument("--time-limit", type=int, default=3600, help="Seconds per backend (H2O and AutoGluon)")
+    parser.add_argument("--cpus", type=int, default=None, help="Total cores to share, default all")
+    parser.add_argument("--h2o-max-mem-size", default="8G")
+    parser.add_argument("--xgboost-search-trials", type=int, default=0,
+                        help="Tune XGBoost with this many successive halving trials instead of the fixed parameters")
+    parser.add_argument("--xgboost-augment-passes", type=int, default=0,
+                        help="Train XGBoost on the original plays plus this many mirrored/permuted passes")
+    args = parser.parse_args()
+    if args.xgboost_search_trials and args.xgboost_augment_passes:
+        parser.error("--xgboost-search-trials tunes on the original plays only and cannot be combined with "
+                     "--xgboost-augment-passes")
+
+    xgboost_options = {}
+    if args.xgboost_search_trials:
+        xgboost_options['search'] = {'n_trials': args.xgboost_search_trials}
+    if args.xgboost_augment_passes:
+        xgboost_options['augment'] = {'passes': args.xgboost_augment_passes + 1}
+    options = {'xgboost': xgboost_options} if xgboost_options else None
+    leaderboard = run_training(args.backends, args.features_path, args.split_path, args.output_dir,
+                               args.time_limit, args.cpus, h2o_max_mem_size=args.h2o_max_mem_size,
+                               backend_options=options)
+    print(leaderboard.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Frozen assignment of every play to train/val/test, shared by all frameworks
+SPLIT_PATH = os.path.join("resources", "splits", "play_split.parquet")
+SPLIT_FRACTIONS = {'train': 0.7, 'val': 0.1, 'test': 0.2}
+SPLIT_SEED = 3245
+
+
+def assign_split(play_ids, fractions=SPLIT_FRACTIONS, seed=SPLIT_SEED) -> np.ndarray:
+    """
+    Split name of every play, from a seeded hash of its uniquePlayId.
+
+    The assignment of a play only depends on its ID, so it does not change when plays are added,
+    removed or reordered, e.g. when a new week is appended to the feature store.
+    """
+    hashes = pd.util.hash_pandas_object(pd.Series(play_ids, dtype=str), index=False,
+                                        hash_key=f"{seed:016d}"[-16:]).to_numpy()
+    unit = hashes / np.float64(2 ** 64)
+    names = list(fractions)
+    bounds = np.cumsum([fractions[name] for name in names])
+    bounds[-1] = 1.0
+    return np.asarray(names, dtype=object)[np.searchsorted(bounds, unit, side='right').clip(max=len(names) - 1)]
+
+
+def load_split(path=SPLIT_PATH) -> pd.DataFrame:
+    return pd.read_parquet(path)
+
+
+def freeze_split(play_ids, path=SPLIT_PATH, fractions=SPLIT_FRACTIONS, seed=SPLIT_SEED) -> pd.DataFrame:
+    """
+    Returns the frozen uniquePlayId -> split table, creating it at `path` on first use.
+    Plays that are not in the saved table yet are assigned and appended; existing plays keep their split.
+    """
+    play_ids = pd.unique(pd.Series(play_ids, dtype=str))
+    split = load_split(path) if os.path.exists(path) else pd.DataFrame({'uniquePlayId': [], 'split': []})
+
+    new_ids = play_ids[~np.isin(play_ids, split['uniquePlayId'].to_numpy(dtype=str))]
+    if len(new_ids) or not os.path.exists(path):
+        added = pd.DataFrame({'uniquePlayId': new_ids, 'split': assign_split(new_ids, fractions, seed)})
+        split = pd.concat([split, added], ignore_index=True).astype({'uniquePlayId': str, 'split': str})
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        split.to_parquet(path, index=False)
+        print(f"Split saved to: {path} ({len(new_ids)} new plays)")
+    return split
+
+
+def apply_split(frame: pd.DataFrame, split: pd.DataFrame) -> dict:
+    """Partitions a frame with a uniquePlayId column into {'train': ..., 'val': ..., 'test': ...}."""
+    names = frame['uniquePlayId'].astype(str).map(split.set_index('uniquePlayId')['split'])
+    if names.isna().any():
+        print(f"{names.isna().sum()} plays are not in the split and are left out, run freeze_split first")
+    split_names = dict.fromkeys(list(SPLIT_FRACTIONS) + list(split['split'].unique()))
+    return {name: frame[(names == name).to_numpy()].reset_index(drop=True) for name in split_names}
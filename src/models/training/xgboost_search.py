@@ -0,0 +1,203 @@
+"""
+Hyperparameter search for the XGBoost formation model with successive halving.
+
+The training and validation matrices are quantized once (QuantileDMatrix) and shared by every trial.
+All trials start with a small number of boosting rounds; after each rung only the best 1/reduction of them
+(by val log loss) keep boosting, for `reduction` times as many rounds, until one trial is left or the
+round budget is reached. The trials of a rung train in parallel threads with the hist tree method.
+
+    python -m src.models.training.xgboost_search --trials 27 --output-dir training_runs/xgboost_search
+"""
+import argparse
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.feature_store import FEATURE_STORE_PATH
+from src.models.benchmark import KEY_COLUMNS
+from src.models.training.split import SPLIT_PATH
+
+TARGET = 'offenseFormation'
+SEED = 3245
+
+# name -> (low, high, scale) of the sampled parameters, max_depth is drawn as an integer
+SEARCH_SPACE = {
+    'max_depth': (3, 10, 'int'),
+    'eta': (0.01, 0.3, 'log'),
+    'subsample': (0.6, 1.0, 'linear'),
+    'colsample_bytree': (0.5, 1.0, 'linear'),
+    'min_child_weight': (0.5, 10.0, 'log'),
+    'lambda': (0.1, 10.0, 'log'),
+    'alpha': (0.001, 5.0, 'log'),
+}
+
+# The hand tuned params_mod2 of the XGBoost notebook, always trial 0 so the search never does worse
+DEFAULT_PARAMS = {'max_depth': 5, 'eta': 0.05, 'subsample': 0.9, 'colsample_bytree': 0.9, 'min_child_weight': 1.0,
+                  'lambda': 2.0, 'alpha': 1.0}
+
+
+def sample_params(n_trials: int, seed=SEED, space=SEARCH_SPACE) -> list:
+    """DEFAULT_PARAMS followed by n_trials - 1 random configurations of `space`."""
+    rng = np.random.default_rng(seed)
+    configs = [dict(DEFAULT_PARAMS)]
+    for _ in range(n_trials - 1):
+        config = {}
+        for name, (low, high, scale) in space.items():
+            if scale == 'int':
+                config[name] = int(rng.integers(low, high + 1))
+            elif scale == 'log':
+                config[name] = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+            else:
+                config[name] = float(rng.uniform(low, high))
+        configs.append(config)
+    return configs[:n_trials]
+
+
+def build_matrices(train: pd.DataFrame, val: pd.DataFrame, columns, classes, max_bin=256, nthread=-1):
+    """
+    Quantized train and val matrices, built once for all trials. The val matrix reuses the bin
+    boundaries of the train matrix, as hist training requires.
+    """
+    import xgboost as xgb
+
+    encode = {label: i for i, label in enumerate(classes)}
+    train = train[train[TARGET].astype(str).isin(encode)]
+    val = val[val[TARGET].astype(str).isin(encode)]
+    dtrain = xgb.QuantileDMatrix(train[columns], label=train[TARGET].astype(str).map(encode), max_bin=max_bin,
+                                 nthread=nthread)
+    dval = xgb.QuantileDMatrix(val[columns], label=val[TARGET].astype(str).map(encode), ref=dtrain,
+                               nthread=nthread)
+    return dtrain, dval
+
+
+class Trial:
+    """One configuration and its booster, which keeps boosting from rung to rung."""
+
+    def __init__(self, trial_id: int, params: dict):
+        self.trial_id = trial_id
+        self.params = params
+        self.booster = None
+        self.best_score = math.inf
+        self.best_iteration = -1
+        self.stopped = False
+        self.seconds = 0.0
+
+    @property
+    def rounds(self):
+        return 0 if self.booster is None else self.booster.num_boosted_rounds()
+
+    def advance(self, dtrain, dval, base_params, rounds, early_stopping_rounds):
+        """
+        Boosts up to `rounds` rounds in total, stopping for good when val log loss has not improved on the
+        trial's best (over all rungs) for `early_stopping_rounds` rounds.
+        """
+        import xgboost as xgb
+
+        if self.stopped or self.rounds >= rounds:
+            return self
+        start = time.perf_counter()
+        self.booster = xgb.train({**base_params, **self.params}, dtrain, num_boost_round=rounds - self.rounds,
+                                 evals=[(dval, "val")], early_stopping_rounds=early_stopping_rounds,
+                                 verbose_eval=False, xgb_model=self.booster)
+        self.seconds += time.perf_counter() - start
+        # Early stopping starts over in every rung, so its best only covers this rung. best_iteration counts the
+        # rounds of earlier rungs too, and replaces the trial's best only when this rung improved on it
+        if self.booster.best_score < self.best_score:
+            self.best_iteration = self.booster.best_iteration
+            self.best_score = self.booster.best_score
+        self.stopped = self.rounds < rounds or self.rounds - 1 - self.best_iteration >= early_stopping_rounds
+        return self
+
+    def record(self, rung: int) -> dict:
+        return {'trial': self.trial_id, 'rung': rung, 'rounds': self.rounds, 'best_iteration': self.best_iteration,
+                'val_mlogloss': self.best_score, 'stopped': self.stopped, 'seconds': self.seconds, **self.params}
+
+
+def successive_halving(dtrain, dval, num_class: int, configs, min_rounds=30, max_rounds=1000, reduction=3,
+                       early_stopping_rounds=25, cpus=None, parallel=None):
+    """
+    Runs the configurations on a geometric round budget (min_rounds, min_rounds * reduction, ...) and
+    keeps the best len / reduction of them after every rung. Returns the best trial and the history
+    (one row per trial and rung).
+    """
+    if cpus is None:
+        cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    base_params = {'objective': 'multi:softprob', 'num_class': num_class, 'eval_metric': 'mlogloss',
+                   'tree_method': 'hist', 'seed': SEED}
+
+    trials = [Trial(i, params) for i, params in enumerate(configs)]
+    history = []
+    rung, rounds = 0, min_rounds
+    while True:
+        # Many small single threaded trials use the cores better than one trial with all of them
+        workers = min(parallel or cpus, len(trials))
+        params = {**base_params, 'nthread': max(1, cpus // workers)}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(lambda trial: trial.advance(dtrain, dval, params, rounds, early_stopping_rounds), trials))
+
+        trials.sort(key=lambda trial: trial.best_score)
+        history.extend(trial.record(rung) for trial in trials)
+        best = trials[0]
+        print(f"Rung {rung}: {len(trials)} trials, {rounds} rounds, best val mlogloss {best.best_score:.4f} "
+              f"(trial {best.trial_id})")
+        if len(trials) == 1 or rounds >= max_rounds or all(trial.stopped for trial in trials):
+            break
+        trials = trials[:max(1, len(trials) // reduction)]
+        rung, rounds = rung + 1, min(rounds * reduction, max_rounds)
+
+    return trials[0], pd.DataFrame(history)
+
+
+def search_xgboost(train: pd.DataFrame, val: pd.DataFrame, output_dir: str, n_trials=27, min_rounds=30,
+                   max_rounds=1000, reduction=3, early_stopping_rounds=25, cpus=None, parallel=None, classes=None,
+                   seed=SEED):
+    """
+    Searches the XGBoost parameters on the train/val play frames and saves the best booster (cut at its
+    best iteration, with its classes as the 'classes' attribute) to xgboost_model.json and the trial
+    history to search_trials.csv in `output_dir`. Returns the booster, its classes and the history.
+    """
+    columns = [col for col in train.columns if col not in KEY_COLUMNS]
+    classes = np.unique(train[TARGET].astype(str)) if classes is None else np.asarray(classes)
+    dtrain, dval = build_matrices(train, val, columns, classes)
+
+    best, history = successive_halving(dtrain, dval, len(classes), sample_params(n_trials, seed), min_rounds,
+                                       max_rounds, reduction, early_stopping_rounds, cpus, parallel)
+    booster = best.booster[:best.best_iteration + 1]
+    booster.set_attr(classes=json.dumps([str(label) for label in classes]),
+                     params=json.dumps(best.params))
+
+    os.makedirs(output_dir, exist_ok=True)
+    booster.save_model(os.path.join(output_dir, "xgboost_model.json"))
+    history.to_csv(os.path.join(output_dir, "search_trials.csv"), index=False)
+    print(f"Best trial {best.trial_id}: val mlogloss {best.best_score:.4f} after {best.best_iteration + 1} rounds, "
+          f"{best.params}")
+    return booster, classes, history
+
+
+def main():
+    from src.models.training.orchestrator import prepare_split_data
+
+    parser = argparse.ArgumentParser(description="Successive halving hyperparameter search for XGBoost")
+    parser.add_argument("--features-path", default=FEATURE_STORE_PATH)
+    parser.add_argument("--split-path", default=SPLIT_PATH)
+    parser.add_argument("--output-dir", default=os.path.join("training_runs", "xgboost_search"))
+    parser.add_argument("--trials", type=int, default=27)
+    parser.add_argument("--min-rounds", type=int, default=30)
+    parser.add_argument("--max-rounds", type=int, default=1000)
+    parser.add_argument("--reduction", type=int, default=3, help="Keep 1/reduction of the trials per rung")
+    parser.add_argument("--cpus", type=int, default=None)
+    parser.add_argument("--parallel", type=int, default=None, help="Trials trained at once, default one per core")
+    args = parser.parse_args()
+
+    paths = prepare_split_data(args.features_path, args.split_path, args.output_dir)
+    search_xgboost(pd.read_parquet(paths['train']), pd.read_parquet(paths['val']), args.output_dir, args.trials,
+                   args.min_rounds, args.max_rounds, args.reduction, cpus=args.cpus, parallel=args.parallel)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+
+class LatencyStats:
+    """Keeps the most recent request latencies and reports percentiles over them."""
+
+    def __init__(self, window=10_000):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+            self.count += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            latencies = np.array(self._latencies, dtype=np.float64)
+            count = self.count
+        if not len(latencies):
+            return {"count": count, "p50_ms": None, "p99_ms": None, "mean_ms": None}
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        return {"count": count, "p50_ms": p50, "p99_ms": p99, "mean_ms": latencies.mean() * 1000}
+
+
+class MicroBatcher:
+    """
+    Collects feature frames submitted from many request threads and scores them together.
+
+    A background thread waits for the first pending frame, then keeps collecting for up to
+    `max_wait_ms` or until `max_batch_size` plays are queued, and makes a single call to
+    `predict_fn` with all of them concatenated. Each caller gets back the rows of its own frame.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=256, max_wait_ms=2.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batch_sizes = deque(maxlen=10_000)
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, features: pd.DataFrame) -> Future:
+        future = Future()
+        self._queue.put((features, future))
+        return future
+
+    def predict(self, features: pd.DataFrame) -> np.ndarray:
+        """Blocking helper for request handlers."""
+        return self.submit(features).result()
+
+    def close(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _collect(self):
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+
+        pending = [first]
+        n_plays = len(first[0])
+        deadline = time.perf_counter() + self.max_wait
+        while n_plays < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.append(item)
+            n_plays += len(item[0])
+        return pending
+
+    def _run(self):
+        while not self._stopped.is_set():
+            pending = self._collect()
+            if not pending:
+                continue
+
+            frames = [features for features, _ in pending]
+            try:
+                probabilities = self.predict_fn(pd.concat(frames, ignore_index=True))
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            self.batch_sizes.append(len(probabilities))
+            start = 0
+            for features, future in pending:
+                future.set_result(probabilities[start:start + len(features)])
+                start += len(features)
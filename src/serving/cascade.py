@@ -0,0 +1,160 @@
+"""
+Cascade of a cheap formation model and an expensive one.
+
+Every play is scored by the fast model first (a shallow decision tree or kNN). Plays whose top
+probability clears a threshold keep that answer; only the rest are escalated to the full model, e.g.
+the StackedEnsemble_BestOfFamily leader. The threshold is calibrated on the val plays so the
+answered plays are as accurate as the full model:
+
+    python -m src.serving.cascade model_new/leader_portable.npz --fast tree
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.feature_store import FEATURE_STORE_PATH, load_features
+from src.data_pipeline.play_features import play_feature_frame
+from src.models.benchmark import KEY_COLUMNS, benchmark_model
+from src.models.training.split import SPLIT_PATH, apply_split, freeze_split
+from src.serving.models import load_formation_model
+
+
+class ShallowTreeModel:
+    """A depth limited decision tree over the play_feature_frame columns, scored in microseconds."""
+
+    def __init__(self, train: pd.DataFrame, max_depth=8, min_samples_leaf=20, seed=3245):
+        from sklearn.tree import DecisionTreeClassifier
+
+        self.feature_columns = [col for col in train.columns if col not in KEY_COLUMNS]
+        self.tree = DecisionTreeClassifier(max_depth=max_depth, min_samples_leaf=min_samples_leaf, random_state=seed)
+        self.tree.fit(train[self.feature_columns].to_numpy(dtype=np.float32), train['offenseFormation'].astype(str))
+        self.classes = [str(label) for label in self.tree.classes_]
+        self.model_id = f"tree_depth{max_depth}"
+
+    def predict_proba(self, features) -> np.ndarray:
+        if hasattr(features, 'columns'):
+            features = features.reindex(columns=self.feature_columns)
+        return self.tree.predict_proba(np.asarray(features, dtype=np.float32))
+
+
+def _align(probabilities: np.ndarray, classes, target_classes) -> np.ndarray:
+    """Reorders the columns of `probabilities` to `target_classes`, 0 for classes the model does not know."""
+    position = {label: i for i, label in enumerate(classes)}
+    aligned = np.zeros((len(probabilities), len(target_classes)))
+    for j, label in enumerate(target_classes):
+        if label in position:
+            aligned[:, j] = probabilities[:, position[label]]
+    return aligned
+
+
+def accuracy(model, frame: pd.DataFrame) -> float:
+    probabilities = model.predict_proba(frame.drop(columns=KEY_COLUMNS, errors='ignore'))
+    predictions = np.asarray(model.classes).astype(str)[probabilities.argmax(axis=1)]
+    return float((predictions == frame['offenseFormation'].astype(str).to_numpy()).mean())
+
+
+def calibrate_threshold(fast_model, val: pd.DataFrame, target_accuracy: float) -> float:
+    """
+    Lowest top-class probability at which the fast model's answered val plays (every play at or above
+    the threshold) are still at least `target_accuracy` accurate. 1.0 when no threshold reaches it.
+    """
+    labels = val['offenseFormation'].astype(str).to_numpy()
+    probabilities = fast_model.predict_proba(val.drop(columns=KEY_COLUMNS, errors='ignore'))
+    confidence = probabilities.max(axis=1)
+    correct = np.asarray(fast_model.classes)[probabilities.argmax(axis=1)] == labels
+
+    order = np.argsort(-confidence, kind='stable')
+    cumulative_accuracy = np.cumsum(correct[order]) / np.arange(1, len(order) + 1)
+    # Only cut between distinct confidences, ties are answered together
+    last_of_tie = np.r_[confidence[order][1:] != confidence[order][:-1], True]
+    accurate = np.flatnonzero((cumulative_accuracy >= target_accuracy) & last_of_tie)
+    return float(confidence[order][accurate[-1]]) if len(accurate) else 1.0
+
+
+class CascadeModel:
+    """
+    `fast` answers the plays it is confident about (top probability >= threshold), `full` the others.
+    Same classes / predict_proba() interface as the models it wraps, so it can be served as is.
+    """
+
+    def __init__(self, fast, full, threshold: float):
+        self.fast = fast
+        self.full = full
+        self.threshold = threshold
+        self.classes = list(full.classes)
+        self.model_id = f"cascade({getattr(fast, 'model_id', 'fast')}->{getattr(full, 'model_id', 'full')})"
+        self.plays = 0
+        self.escalated = 0
+
+    def predict_proba(self, features: pd.DataFrame) -> np.ndarray:
+        probabilities = _align(self.fast.predict_proba(features), self.fast.classes, self.classes)
+        unsure = np.flatnonzero(probabilities.max(axis=1) < self.threshold)
+        if len(unsure):
+            probabilities[unsure] = self.full.predict_proba(features.iloc[unsure])
+        self.plays += len(probabilities)
+        self.escalated += len(unsure)
+        return probabilities
+
+    def stats(self) -> dict:
+        return {'threshold': self.threshold, 'plays': self.plays, 'escalated': self.escalated,
+                'escalated_fraction': self.escalated / self.plays if self.plays else None}
+
+
+def build_fast_model(kind: str, train: pd.DataFrame, max_depth=8):
+    if kind == "tree":
+        return ShallowTreeModel(train, max_depth=max_depth)
+    if kind == "knn":
+        from src.models.neighbors.formation_index import FormationIndex, KNNFormationModel
+        return KNNFormationModel(FormationIndex(train), k=15)
+    return load_formation_model(kind)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate and benchmark a fast model -> full model cascade")
+    parser.add_argument("full_model", help="Saved H2O model or portable .npz export, e.g. the stacked ensemble")
+    parser.add_argument("--fast", default="tree", help="'tree', 'knn' or the path of another saved model")
+    parser.add_argument("--max-depth", type=int, default=8, help="Depth of the fast tree")
+    parser.add_argument("--threshold", type=float, default=None, help="Default: calibrated on the val plays")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="Accuracy the answered plays may lose against the full model during calibration")
+    parser.add_argument("--features-path", default=FEATURE_STORE_PATH)
+    parser.add_argument("--split-path", default=SPLIT_PATH)
+    parser.add_argument("--single-queries", type=int, default=500)
+    args = parser.parse_args()
+
+    data = load_features(args.features_path, columns=['uniquePlayId', 'playDirection', 'x', 'y', 'o', 'position',
+                                                      'offenseFormation'])
+    data = play_feature_frame(data, features=('x', 'y', 'o'))
+    splits = apply_split(data, freeze_split(data['uniquePlayId'], args.split_path))
+
+    full = load_formation_model(args.full_model)
+    fast = build_fast_model(args.fast, splits['train'], args.max_depth)
+
+    threshold = args.threshold
+    if threshold is None:
+        full_accuracy = accuracy(full, splits['val'])
+        threshold = calibrate_threshold(fast, splits['val'], full_accuracy - args.tolerance)
+        print(f"Calibrated threshold {threshold:.4f} (full model val accuracy {full_accuracy:.4f})")
+
+    cascade = CascadeModel(fast, full, threshold)
+    test = splits['test']
+    results = [benchmark_model(getattr(model, 'model_id', name), model, test, args.single_queries)
+               for name, model in (('full', full), ('fast', fast))]
+    cascade_result = benchmark_model(cascade.model_id, cascade, test, args.single_queries)
+    results.append(cascade_result)
+    print(pd.DataFrame(results).to_string(index=False))
+
+    # Escalations of the single play queries are counted as well, report the batch call alone
+    cascade.plays = cascade.escalated = 0
+    start = time.perf_counter()
+    cascade.predict_proba(test.drop(columns=KEY_COLUMNS))
+    seconds = time.perf_counter() - start
+    speedup = cascade_result['batch_plays_per_second'] / results[0]['batch_plays_per_second']
+    print(f"Escalated {cascade.stats()['escalated_fraction']:.1%} of {len(test)} test plays to the full model, "
+          f"{len(test) / seconds:,.0f} plays/s, {speedup:.1f}x the full model's throughput")
+
+
+if __name__ == "__main__":
+    main()
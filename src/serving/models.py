@@ -0,0 +1,89 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.instrumentation.spans import span
+
+# Same settings the training script starts its cluster with
+H2O_CONFIG = {
+    "nthreads": -1,
+    "max_mem_size": "16G",
+}
+
+
+class H2OFormationModel:
+    """
+    Wraps a saved H2O model (e.g. the StackedEnsemble_BestOfFamily leader) for serving.
+
+    The cluster is started and the model loaded once, in the constructor. predict_proba() takes the
+    play_feature_frame() columns and returns an (n_plays, n_formations) array ordered like `classes`.
+    """
+
+    def __init__(self, model_path: str, h2o_config=None):
+        import h2o
+
+        self._h2o = h2o
+        h2o.init(**(h2o_config or H2O_CONFIG))
+        self.model = h2o.load_model(model_path)
+        self.model_id = self.model.model_id
+        self.classes = list(self.model._model_json["output"]["domains"][-1])
+        self.feature_columns = [col for col in self.model._model_json["output"]["names"][:-1]]
+
+    def predict_proba(self, features: pd.DataFrame) -> np.ndarray:
+        features = features.reindex(columns=self.feature_columns)
+        # Force numeric columns, otherwise an all-NaN slot (e.g. no FB in the batch) is parsed as a string column
+        with span("h2o.H2OFrame", rows=len(features)):
+            frame = self._h2o.H2OFrame(features, column_types={col: "real" for col in self.feature_columns})
+        with span("h2o.predict", rows=len(features)):
+            predictions = self.model.predict(frame).as_data_frame()
+        return predictions[self.classes].to_numpy(dtype=np.float64)
+
+
+class XGBoostFormationModel:
+    """
+    An XGBoost booster saved by the training orchestrator or xgboost_search.py, whose 'classes' attribute
+    holds the formation of every output column and whose feature names are play_feature_frame() columns.
+    """
+
+    def __init__(self, model_path: str, nthread=None):
+        import xgboost as xgb
+
+        self._xgb = xgb
+        self.booster = xgb.Booster(model_file=model_path)
+        if nthread:
+            self.booster.set_param({'nthread': nthread})
+        classes = self.booster.attr('classes')
+        if classes is None or not self.booster.feature_names:
+            raise ValueError(f"{model_path} has no 'classes' attribute or feature names, it was not saved by the "
+                             f"training orchestrator")
+        self.classes = json.loads(classes)
+        self.feature_columns = list(self.booster.feature_names)
+        # Boosters of every run share the file name, so the run directory is part of the id
+        self.model_id = f"{os.path.basename(os.path.dirname(os.path.abspath(model_path)))}_" \
+                        f"{os.path.splitext(os.path.basename(model_path))[0]}"
+
+    def predict_proba(self, features: pd.DataFrame) -> np.ndarray:
+        missing = [col for col in self.feature_columns if col not in features.columns]
+        if missing:
+            raise ValueError(f"Features are missing {len(missing)} columns of {self.model_id}, e.g. {missing[:5]}")
+        with span("xgboost.predict", rows=len(features)):
+            matrix = self._xgb.DMatrix(features[self.feature_columns])
+            return self.booster.predict(matrix).astype(np.float64)
+
+
+def load_formation_model(model_path: str):
+    """
+    Loads a portable .npz export (NumPy only, no JVM), a .keras formation network, an XGBoost .json
+    booster saved by the training orchestrator or a model saved with h2o.save_model.
+    """
+    if model_path.endswith(".npz"):
+        from src.models.portable.scorer import PortableModel
+        return PortableModel(model_path)
+    if model_path.endswith(".keras"):
+        from src.models.deepsets.formation_net import FormationNetModel
+        return FormationNetModel(model_path)
+    if model_path.endswith(".json"):
+        return XGBoostFormationModel(model_path)
+    return H2OFormationModel(model_path)
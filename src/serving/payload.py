@@ -0,0 +1,54 @@
+import pandas as pd
+
+from src.data_pipeline.play_features import POSITION_CODES, PLAYERS_PER_PLAY, play_feature_frame
+
+PLAYER_FIELDS = ('position', 'x', 'y', 'o')
+
+
+def plays_from_payload(payload: dict) -> pd.DataFrame:
+    """
+    Converts a prediction request body into one row per player.
+
+    Accepts either a single play, {"players": [...]}, or several, {"plays": [{"players": [...]}, ...]}.
+    Every player is an object with position, x, y and o. A play may give its "playDirection",
+    "left" or "right" (the default). Raises ValueError on malformed input.
+    """
+    if "plays" in payload:
+        plays = payload["plays"]
+    elif "players" in payload:
+        plays = [payload]
+    else:
+        raise ValueError("Request body needs a 'plays' or 'players' key")
+    if not plays:
+        raise ValueError("Request contains no plays")
+
+    rows = []
+    for play_number, play in enumerate(plays):
+        players = play.get("players", [])
+        direction = play.get("playDirection", "right")
+        if direction not in ("left", "right"):
+            raise ValueError(f"Play {play_number} has playDirection '{direction}', expected 'left' or 'right'")
+        if not 0 < len(players) <= PLAYERS_PER_PLAY:
+            raise ValueError(f"Play {play_number} has {len(players)} players, expected 1 to {PLAYERS_PER_PLAY}")
+        for player in players:
+            missing = [field for field in PLAYER_FIELDS if field not in player]
+            if missing:
+                raise ValueError(f"Play {play_number} has a player without {missing}")
+            if player["position"] not in POSITION_CODES:
+                raise ValueError(f"Play {play_number} has unknown position '{player['position']}'")
+            rows.append({
+                "uniquePlayId": f"{play_number:08d}",
+                "playDirection": direction,
+                "position": player["position"],
+                "x": float(player["x"]),
+                "y": float(player["y"]),
+                "o": float(player["o"]),
+            })
+    return pd.DataFrame(rows)
+
+
+def features_from_payload(payload: dict) -> pd.DataFrame:
+    """Model input for a request body, one row per play in request order."""
+    players = plays_from_payload(payload)
+    features = play_feature_frame(players, features=('x', 'y', 'o'))
+    return features.drop(columns=['uniquePlayId', 'playDirection'])
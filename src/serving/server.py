@@ -0,0 +1,136 @@
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.serving.batcher import LatencyStats, MicroBatcher
+from src.serving.models import load_formation_model
+from src.serving.payload import features_from_payload
+
+
+class FormationRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /predict  body: {"plays": [{"players": [{"position": "C", "x": .., "y": .., "o": ..}, ...]}, ...]}
+                   returns the formation probabilities of every play, in request order.
+    GET  /metrics  request count, p50/p99 latency and mean batch size.
+    GET  /health   200 once the model is loaded.
+    """
+
+    server_version = "FormationServer/1.0"
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", "model": self.server.model_id})
+        elif self.path == "/metrics":
+            self._send_json(200, self.server.metrics())
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+
+        start = time.perf_counter()
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length))
+            features = features_from_payload(payload)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        try:
+            probabilities = self.server.batcher.predict(features)
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+
+        classes = self.server.classes
+        predictions = []
+        for row in probabilities:
+            best = int(row.argmax())
+            predictions.append({
+                "formation": classes[best],
+                "probabilities": {label: float(p) for label, p in zip(classes, row)},
+            })
+
+        self.server.latency.record(time.perf_counter() - start)
+        self._send_json(200, {"model": self.server.model_id, "predictions": predictions})
+
+    def log_message(self, format, *args):
+        # Per-request access logs dominate the latency at high request rates
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FormationServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server around a formation model loaded once at startup.
+
+    `model` needs a `classes` list and a `predict_proba(features)` method, e.g. H2OFormationModel.
+    Concurrent requests are micro-batched into a single predict_proba call.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, model, host="127.0.0.1", port=8000, max_batch_size=256, max_wait_ms=2.0, verbose=False):
+        super().__init__((host, port), FormationRequestHandler)
+        self.model = model
+        self.model_id = getattr(model, "model_id", type(model).__name__)
+        self.classes = list(model.classes)
+        self.batcher = MicroBatcher(model.predict_proba, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        self.latency = LatencyStats()
+        self.verbose = verbose
+
+    def metrics(self) -> dict:
+        batch_sizes = list(self.batcher.batch_sizes)
+        summary = self.latency.summary()
+        summary["mean_batch_size"] = sum(batch_sizes) / len(batch_sizes) if batch_sizes else None
+        if hasattr(self.model, "stats"):
+            summary["cascade"] = self.model.stats()
+        return summary
+
+    def server_close(self):
+        self.batcher.close()
+        super().server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve formation predictions over HTTP")
+    parser.add_argument("model_path", help="Path of a model saved with h2o.save_model, or a portable .npz export")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-size", type=int, default=256)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--fast-model", default=None,
+                        help="Cheaper saved model that answers confident plays first, see src/serving/cascade.py")
+    parser.add_argument("--threshold", type=float, default=0.9, help="Top probability the fast model must reach")
+    args = parser.parse_args()
+
+    model = load_formation_model(args.model_path)
+    if args.fast_model:
+        from src.serving.cascade import CascadeModel
+        model = CascadeModel(load_formation_model(args.fast_model), model, args.threshold)
+    server = FormationServer(model, host=args.host, port=args.port,
+                             max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+    print(f"Serving {server.model_id} on http://{args.host}:{args.port}/predict")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Latency: {server.metrics()}")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
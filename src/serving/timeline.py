@@ -0,0 +1,125 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.data_pipeline.ingestion import presnap_window, read_presnap_frames, tracking_file_path
+from src.data_pipeline.play_features import POSITIONS, build_play_tensor
+from src.serving.models import load_formation_model
+
+# Integer key packing (gameId, playId, frameId) so every frame groups its 11 players without string keys
+PLAY_SCALE = 10_000
+FRAME_SCALE = 1_000
+
+
+def frame_keys(rows: pd.DataFrame) -> np.ndarray:
+    game = rows['gameId'].to_numpy(dtype=np.int64)
+    play = rows['playId'].to_numpy(dtype=np.int64)
+    frame = rows['frameId'].to_numpy(dtype=np.int64)
+    return (game * PLAY_SCALE + play) * FRAME_SCALE + frame
+
+
+def split_frame_keys(keys: np.ndarray) -> pd.DataFrame:
+    keys = np.asarray(keys, dtype=np.int64)
+    return pd.DataFrame({
+        'gameId': keys // (PLAY_SCALE * FRAME_SCALE),
+        'playId': (keys // FRAME_SCALE) % PLAY_SCALE,
+        'frameId': keys % FRAME_SCALE,
+    })
+
+
+def offensive_rows(frames: pd.DataFrame, plays: pd.DataFrame, players: pd.DataFrame) -> pd.DataFrame:
+    """Keeps the tracking rows of the offensive players, with their position attached."""
+    frames = frames.merge(plays[['gameId', 'playId', 'possessionTeam']], on=['gameId', 'playId'])
+    frames = frames[frames['club'].astype(str) == frames['possessionTeam'].astype(str)]
+    frames = frames.merge(players[['nflId', 'position']], on='nflId')
+    return frames[frames['position'].isin(POSITIONS)]
+
+
+def score_frames(rows: pd.DataFrame, model, batch_size=65_536):
+    """
+    Scores every tracking frame in `rows` (offensive players only) as if it were the snap.
+
+    All frames are turned into one (n_frames, 11, k) tensor in a single vectorized pass, then scored
+    `batch_size` frames at a time. Returns the per-frame timeline, ordered by game, play and frame, with
+    the predicted formation and the probability of every formation, plus timing statistics.
+    """
+    rows = rows.assign(frameKey=frame_keys(rows))
+
+    start = time.perf_counter()
+    tensor = build_play_tensor(rows, features=('x', 'y', 'o'), key='frameKey', canonical=True).fit_slots()
+    features = tensor.to_frame().drop(columns=['uniquePlayId', 'playDirection', 'offenseFormation'], errors='ignore')
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batches = [model.predict_proba(features.iloc[i:i + batch_size]) for i in range(0, len(features), batch_size)]
+    probabilities = np.vstack(batches) if batches else np.empty((0, len(model.classes)))
+    score_seconds = time.perf_counter() - start
+
+    classes = np.asarray(model.classes)
+    timeline = split_frame_keys(tensor.play_ids)
+    timeline['predictedFormation'] = classes[probabilities.argmax(axis=1)]
+    for i, label in enumerate(classes):
+        timeline[f'p_{label}'] = probabilities[:, i]
+
+    n_frames = len(timeline)
+    total = build_seconds + score_seconds
+    stats = {
+        'frames': n_frames,
+        'build_seconds': build_seconds,
+        'score_seconds': score_seconds,
+        'frames_per_second': n_frames / total if total > 0 else None,
+    }
+    return timeline, stats
+
+
+def stream_timelines(data_dir: str, plays: pd.DataFrame, players: pd.DataFrame, model, weeks=range(1, 10),
+                     batch_size=65_536, chunksize=500_000, engine="c"):
+    """
+    Streams the line_set..ball_snap window of every play week by week and yields
+    (week, timeline, stats) so only one week of pre-snap frames is in memory at a time.
+    """
+    for week in weeks:
+        path = tracking_file_path(data_dir, week)
+        if not os.path.exists(path):
+            print(f"Skipping week {week}, {path} does not exist")
+            continue
+
+        start = time.perf_counter()
+        frames = presnap_window(read_presnap_frames(path, chunksize=chunksize, engine=engine))
+        rows = offensive_rows(frames, plays, players)
+        read_seconds = time.perf_counter() - start
+
+        timeline, stats = score_frames(rows, model, batch_size=batch_size)
+        stats['read_seconds'] = read_seconds
+        print(f"Week {week}: {stats['frames']} frames, {stats['frames_per_second']:.0f} frames/s "
+              f"(read {read_seconds:.1f}s, build {stats['build_seconds']:.1f}s, score {stats['score_seconds']:.1f}s)")
+        yield week, timeline, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-frame formation probabilities from line_set to ball_snap")
+    parser.add_argument("model_path", help="Portable .npz export, or a model saved with h2o.save_model")
+    parser.add_argument("data_dir", help="Directory with plays.csv, players.csv and tracking_week_{i}.csv")
+    parser.add_argument("--weeks", type=int, nargs="+", default=list(range(1, 10)))
+    parser.add_argument("--batch-size", type=int, default=65_536)
+    parser.add_argument("--output-dir", default="timelines")
+    args = parser.parse_args()
+
+    model = load_formation_model(args.model_path)
+
+    plays = pd.read_csv(os.path.join(args.data_dir, "plays.csv"))
+    players = pd.read_csv(os.path.join(args.data_dir, "players.csv"))
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    for week, timeline, _ in stream_timelines(args.data_dir, plays, players, model, weeks=args.weeks,
+                                              batch_size=args.batch_size):
+        output_path = os.path.join(args.output_dir, f"timeline_week_{week}.parquet")
+        timeline.to_parquet(output_path, index=False)
+        print(f"Timeline saved to: {output_path}")
+
+
+if __name__ == "__main__":
+    main()